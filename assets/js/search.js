@@ -0,0 +1,262 @@
+/*
+ * Client side of the search page. The index is built by scripts/search_index.py
+ * into assets/search/: a manifest, term shards keyed by prefix and document
+ * shards. Only the shards holding the query's terms, and the documents of the
+ * top results, are downloaded; fetched shards are kept for later queries.
+ */
+(function () {
+  "use strict";
+
+  var BASE64 = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+  var MAX_RESULTS = 20;
+  // The last word is matched as a prefix once it is this long
+  var MIN_PREFIX = 2;
+
+  var input = document.getElementById("search-input");
+  var results = document.getElementById("search-results");
+  if (!input || !results) {
+    return;
+  }
+  var indexUrl = results.getAttribute("data-index");
+  var basePath = results.getAttribute("data-base-path") || "";
+  var manifest = null;
+  var stopWords = {};
+  var cache = {};
+  var query = 0;
+
+  function fetchJson(url) {
+    if (!cache[url]) {
+      cache[url] = fetch(url).then(function (response) {
+        if (!response.ok) {
+          throw new Error(url + ": " + response.status);
+        }
+        return response.json();
+      });
+    }
+    return cache[url];
+  }
+
+  // Same rules as tokenize() in scripts/search_index.py
+  function tokenize(text) {
+    if (text.normalize) {
+      text = text.toLowerCase().normalize("NFKD").replace(/[\u0300-\u036f]/g, "");
+    } else {
+      text = text.toLowerCase();
+    }
+    var words = text.match(/[a-z0-9]+/g) || [];
+    return words.filter(function (word) {
+      return word.length > 1 && !stopWords[word];
+    });
+  }
+
+  function decodePostings(text) {
+    var postings = [];
+    var numbers = [];
+    var number = 0;
+    var shift = 0;
+    for (var i = 0; i < text.length; i++) {
+      var digit = BASE64.indexOf(text.charAt(i));
+      number |= (digit & 31) << shift;
+      if (digit & 32) {
+        shift += 5;
+      } else {
+        numbers.push(number);
+        number = shift = 0;
+      }
+    }
+    var documentId = 0;
+    for (var j = 0; j + 1 < numbers.length; j += 2) {
+      documentId += numbers[j];
+      postings.push([documentId, numbers[j + 1]]);
+    }
+    return postings;
+  }
+
+  // The shard a term is in: the longest listed prefix of it
+  function shardFor(term) {
+    for (var length = term.length; length > 0; length--) {
+      if (manifest.shardSet[term.slice(0, length)]) {
+        return term.slice(0, length);
+      }
+    }
+    return null;
+  }
+
+  // Every shard that can hold a term starting with `prefix`
+  function shardsForPrefix(prefix) {
+    var shards = manifest.shards.filter(function (shard) {
+      return shard.length > prefix.length && shard.slice(0, prefix.length) === prefix;
+    });
+    var own = shardFor(prefix);
+    if (own) {
+      shards.push(own);
+    }
+    return shards;
+  }
+
+  function loadShards(names) {
+    return Promise.all(names.map(function (name) {
+      return fetchJson(indexUrl + "terms/" + name + ".json");
+    })).then(function (shards) {
+      var terms = {};
+      shards.forEach(function (shard) {
+        for (var term in shard) {
+          if (Object.prototype.hasOwnProperty.call(shard, term)) {
+            terms[term] = shard[term];
+          }
+        }
+      });
+      return terms;
+    });
+  }
+
+  // {document id: weight} of the documents matching one query word
+  function matches(terms, word, prefix) {
+    var scores = {};
+    var found = false;
+    for (var term in terms) {
+      if (term === word || (prefix && term.slice(0, word.length) === word)) {
+        var postings = decodePostings(terms[term]);
+        var idf = Math.log(1 + manifest.documents / postings.length);
+        for (var i = 0; i < postings.length; i++) {
+          var id = postings[i][0];
+          scores[id] = Math.max(scores[id] || 0, postings[i][1] * idf);
+        }
+        found = true;
+      }
+    }
+    return found ? scores : null;
+  }
+
+  // Documents matching every word, best first
+  function rank(terms, words) {
+    var total = null;
+    for (var i = 0; i < words.length; i++) {
+      var prefix = i === words.length - 1 && words[i].length >= MIN_PREFIX;
+      var scores = matches(terms, words[i], prefix);
+      if (!scores) {
+        return [];
+      }
+      if (total === null) {
+        total = scores;
+      } else {
+        var next = {};
+        for (var id in total) {
+          if (scores[id] !== undefined) {
+            next[id] = total[id] + scores[id];
+          }
+        }
+        total = next;
+      }
+    }
+    return Object.keys(total || {}).map(Number).sort(function (a, b) {
+      return total[b] - total[a] || a - b;
+    });
+  }
+
+  function loadDocuments(ids) {
+    var perShard = manifest.docsPerShard;
+    return Promise.all(ids.map(function (id) {
+      return fetchJson(indexUrl + "docs/" + Math.floor(id / perShard) + ".json").then(function (entries) {
+        return entries[id % perShard];
+      });
+    }));
+  }
+
+  function element(tag, className, text) {
+    var node = document.createElement(tag);
+    if (className) {
+      node.className = className;
+    }
+    if (text) {
+      node.textContent = text;
+    }
+    return node;
+  }
+
+  function render(documents, count) {
+    results.innerHTML = "";
+    if (!count) {
+      results.appendChild(element("p", null, "No results."));
+      return;
+    }
+    results.appendChild(element("p", "page__meta",
+      count + (count === 1 ? " result" : " results") + (count > MAX_RESULTS ? ", showing the first " + MAX_RESULTS : "")));
+    documents.forEach(function (entry) {
+      if (!entry) {
+        return;
+      }
+      // [path, url, title, collection, date, snippet]
+      var article = element("article", "archive__item");
+      var title = element("h2", "archive__item-title");
+      var link = element("a", null, entry[2] || entry[0]);
+      link.href = basePath + entry[1];
+      title.appendChild(link);
+      article.appendChild(title);
+      article.appendChild(element("p", "page__meta", entry[3] + (entry[4] ? " · " + entry[4] : "")));
+      if (entry[5]) {
+        article.appendChild(element("p", "archive__item-excerpt", entry[5]));
+      }
+      var item = element("div", "list__item");
+      item.appendChild(article);
+      results.appendChild(item);
+    });
+  }
+
+  function search() {
+    var current = ++query;
+    var words = tokenize(input.value);
+    if (!words.length) {
+      results.innerHTML = "";
+      return;
+    }
+    var last = words[words.length - 1];
+    var shards = {};
+    words.forEach(function (word) {
+      var shard = shardFor(word);
+      if (shard) {
+        shards[shard] = true;
+      }
+    });
+    if (last.length >= MIN_PREFIX) {
+      shardsForPrefix(last).forEach(function (shard) {
+        shards[shard] = true;
+      });
+    }
+    loadShards(Object.keys(shards)).then(function (terms) {
+      var ids = rank(terms, words);
+      return loadDocuments(ids.slice(0, MAX_RESULTS)).then(function (documents) {
+        if (current === query) {
+          render(documents, ids.length);
+        }
+      });
+    }).catch(function (error) {
+      if (current === query) {
+        results.textContent = "Search is unavailable: " + error.message;
+      }
+    });
+  }
+
+  fetchJson(indexUrl + "manifest.json").then(function (data) {
+    manifest = data;
+    manifest.shardSet = {};
+    manifest.shards.forEach(function (shard) {
+      manifest.shardSet[shard] = true;
+    });
+    manifest.stopWords.forEach(function (word) {
+      stopWords[word] = true;
+    });
+    var timer = null;
+    input.addEventListener("input", function () {
+      clearTimeout(timer);
+      timer = setTimeout(search, 150);
+    });
+    var params = new URLSearchParams(window.location.search);
+    if (params.get("q")) {
+      input.value = params.get("q");
+    }
+    search();
+  }).catch(function (error) {
+    results.textContent = "Search is unavailable: " + error.message;
+  });
+})();
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Benchmark serial against parallel BibTeX ingestion in pubsFromBib.py
+
+Writes a synthetic bib file (50,000 entries by default) into a temporary
+directory and times a full parse, render and write with --jobs 1 and with a
+process pool.
+
+Usage: python3 benchmarks/bench_bibtex.py [--entries N] [--jobs N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from fixtures import REPO_ROOT, write_synthetic_bib
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "markdown_generator"))
+
+
+def time_run(pubsFromBib, jobs, output_dir):
+    start = time.perf_counter()
+    written = pubsFromBib.generate(jobs=jobs, output_dir=output_dir, quiet=True, cache_file=None)
+    return time.perf_counter() - start, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=50000, help="number of synthetic entries")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="workers for the parallel run")
+    args = parser.parse_args()
+
+    import pubsFromBib
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_synthetic_bib(os.path.join(tmp, "bench.bib"), args.entries)
+        pubsFromBib.publist = {"journal": dict(pubsFromBib.publist["journal"], file="bench.bib")}
+        os.chdir(tmp)
+
+        for label, jobs in (("serial", 1), (f"parallel ({args.jobs} jobs)", args.jobs)):
+            output_dir = os.path.join(tmp, f"out-{jobs}")
+            os.makedirs(output_dir)
+            elapsed, written = time_run(pubsFromBib, jobs, output_dir)
+            print(f"{label:<24} {elapsed:8.2f}s  {written} files  {written / elapsed:,.0f} entries/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark serial, threaded and multi-process collection scanning in
+scripts/cv_markdown_to_json.py
+
+Each run starts from an empty front matter index, so every collection file is
+read and parsed, and checks that the output matches the serial run.
+
+Usage: python3 benchmarks/bench_cv_scan.py [--files N] [--workers N]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from fixtures import REPO_ROOT, write_site_tree
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=2500, help="files per collection")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="pool size")
+    args = parser.parse_args()
+
+    import cv_markdown_to_json
+
+    with tempfile.TemporaryDirectory() as root:
+        write_site_tree(root, args.files)
+        print(f"{4 * args.files} collection files, {args.workers} workers")
+        reference = None
+        baseline = None
+        for executor in ("serial", "thread", "process"):
+            shutil.rmtree(os.path.join(root, ".build-cache"), ignore_errors=True)
+            output = os.path.join(root, f"cv-{executor}.json")
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                cv_markdown_to_json.create_cv_json(os.path.join(root, "_pages", "cv.md"),
+                                                   os.path.join(root, "_config.yml"), root, output,
+                                                   executor=executor, workers=args.workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+
+            with open(output, "rb") as f:
+                content = f.read()
+            reference = reference or content
+            status = "identical" if content == reference else "DIFFERS from serial"
+            print(f"{executor:<8} {elapsed:7.3f}s  {baseline / elapsed:5.1f}x  output {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-to-end runs of scripts/cv_markdown_to_json.py
+
+Builds a synthetic site with thousands of collection entries and times the
+script as a fresh process, the way update_cv_json.sh runs it:
+
+* cold, pure-Python YAML loader (CV_YAML_PURE=1), no front matter index
+* cold, libyaml CSafeLoader, no front matter index
+* warm, front matter index already built
+
+Usage: python3 benchmarks/bench_cv_startup.py [--files N] [--repeat N]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fixtures import REPO_ROOT, write_site_tree
+
+SCRIPT = os.path.join(REPO_ROOT, "scripts", "cv_markdown_to_json.py")
+
+
+def run(root, env_overrides, clear_index):
+    if clear_index:
+        shutil.rmtree(os.path.join(root, ".build-cache"), ignore_errors=True)
+    env = dict(os.environ, **env_overrides)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, SCRIPT,
+                    "--input", os.path.join(root, "_pages", "cv.md"),
+                    "--output", os.path.join(root, "cv.json"),
+                    "--config", os.path.join(root, "_config.yml")],
+                   check=True, env=env, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=2500, help="files per collection")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario (median is reported)")
+    args = parser.parse_args()
+
+    scenarios = (
+        ("cold, pure-Python loader", {"CV_YAML_PURE": "1"}, True),
+        ("cold, CSafeLoader", {"CV_YAML_PURE": "0"}, True),
+        ("warm index", {"CV_YAML_PURE": "0"}, False),
+    )
+    with tempfile.TemporaryDirectory() as root:
+        write_site_tree(root, args.files)
+        print(f"{4 * args.files} collection files")
+        baseline = None
+        for label, env, clear_index in scenarios:
+            elapsed = statistics.median(run(root, env, clear_index) for _ in range(args.repeat))
+            baseline = baseline or elapsed
+            print(f"{label:<28} {elapsed:7.3f}s  {baseline / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
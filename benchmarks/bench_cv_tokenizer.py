@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the markdown CV tokenizer in scripts/cv_markdown_to_json.py
+
+Times tokenize_cv() plus the education, work experience and skills parsers on
+synthetic CVs of increasing size. The time per entry should stay flat as the
+CV grows.
+
+Usage: python3 benchmarks/bench_cv_tokenizer.py [--sizes 100,1000,10000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+from fixtures import REPO_ROOT, sentence
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+
+def synthetic_cv(entries, seed=0):
+    """A CV in the academicpages format with `entries` items per section."""
+    rng = random.Random(seed)
+    lines = ["---", "layout: archive", 'title: "CV"', "---", "", "Education", "======"]
+    for i in range(entries):
+        lines.append(f"* {sentence(rng, 3)}, University {i}, {rng.randint(1980, 2025)}, GPA: 3.{i % 10}")
+    lines += ["", "Work experience", "======"]
+    for i in range(entries):
+        start = rng.randint(1980, 2020)
+        lines.append(f"* {sentence(rng, 2)}, Company {i}, {start} - {start + rng.randint(1, 5)}")
+        lines += [f"  * {sentence(rng, 6)}" for _ in range(3)]
+        lines.append("")
+    lines += ["Skills", "======"]
+    for i in range(entries):
+        lines.append(f"Category{i}: " + ", ".join(sentence(rng, 1) for _ in range(5)))
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated entries per section")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    import cv_markdown_to_json as cv
+
+    def parse(content):
+        sections = cv.tokenize_cv(content)
+        cv.parse_education(sections["Education"])
+        cv.parse_work_experience(sections["Work experience"])
+        cv.parse_skills(sections["Skills"])
+
+    for size in (int(size) for size in args.sizes.split(",")):
+        content = synthetic_cv(size)
+        best = min(timeit.repeat(lambda: parse(content), number=1, repeat=args.repeat))
+        print(f"{size:>7} entries/section  {best * 1000:9.2f} ms  {best / (3 * size) * 1e6:6.2f} us/entry")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark the offline gazetteer used by talkmap.py
+
+Builds the index for a synthetic GeoNames file, then times reopening it (the
+cost every later talkmap run pays), exact name lookups, misspelled names that
+fall through to the trigram index, and "lat, lon" nearest-place queries.
+
+Usage: python3 benchmarks/bench_gazetteer.py [--places N] [--queries N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from fixtures import REPO_ROOT, write_geonames
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+
+def per_query(gazetteer, queries):
+    start = time.perf_counter()
+    resolved = sum(1 for query in queries if gazetteer.geocode(query) is not None)
+    return (time.perf_counter() - start) / len(queries) * 1e6, resolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--places", type=int, default=100000, help="number of synthetic places")
+    parser.add_argument("--queries", type=int, default=2000, help="lookups per measurement")
+    args = parser.parse_args()
+
+    from gazetteer import Gazetteer
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "gazetteer.tsv")
+        index_file = os.path.join(tmp, "gazetteer.idx")
+        places = write_geonames(source, args.places)
+
+        start = time.perf_counter()
+        Gazetteer.open(source, index_file).close()
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        gazetteer = Gazetteer.open(source, index_file)
+        reopen = time.perf_counter() - start
+
+        sample = [rng.choice(places) for _ in range(args.queries)]
+        exact = [f"{name}, {country}" for name, _, country in sample]
+        misspelled = [f"{name[:-2]}{name[-1]}{name[-2]}, {country}" for name, _, country in sample]
+        coordinates = [f"{rng.uniform(-60, 70):.4f}, {rng.uniform(-180, 180):.4f}" for _ in sample]
+
+        print(f"{args.places} places, index {os.path.getsize(index_file) / 1e6:.1f} MB")
+        print(f"build {build:8.2f} s")
+        print(f"reopen {reopen * 1000:7.2f} ms")
+        for label, queries in (("exact", exact), ("misspelled", misspelled), ("nearest", coordinates)):
+            micros, resolved = per_query(gazetteer, queries)
+            print(f"{label:<11} {micros:8.1f} us per query, {resolved}/{len(queries)} resolved")
+        gazetteer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark the related posts computation in scripts/related_posts.py
+
+Writes synthetic posts, then times tokenizing them into the term cache, a
+rebuild served from the cache, and the neighbour search with batched matrix
+products against the pure-Python inverted index. Checks that both searches
+produce the same lists.
+
+Usage: python3 benchmarks/bench_related.py [--posts N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from fixtures import REPO_ROOT, write_posts
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=2000, help="number of synthetic posts")
+    args = parser.parse_args()
+
+    import related_posts
+
+    with tempfile.TemporaryDirectory() as root:
+        write_posts(os.path.join(root, "_posts"), args.posts)
+        cache_file = os.path.join(root, "terms.pickle")
+
+        cache = related_posts.TermCache(cache_file)
+        tokenize_time, documents = timed(lambda: related_posts.collect(root, cache))
+        cache.save()
+        cache = related_posts.TermCache(cache_file)
+        cached_time, _ = timed(lambda: related_posts.collect(root, cache))
+
+        tfidf_time, (terms, rows) = timed(lambda: related_posts.tfidf_rows(documents))
+        matrix_time, batched = timed(lambda: related_posts.neighbours_numpy(rows, terms))
+        python_time, expected = timed(lambda: related_posts.neighbours_python(rows))
+
+    try:
+        import scipy  # noqa: F401
+        backend = "scipy.sparse"
+    except ImportError:
+        backend = "dense numpy"
+    print(f"{len(documents)} posts, {terms} shared terms")
+    print(f"tokenize         {tokenize_time:8.3f} s")
+    print(f"tokenize cached  {cached_time:8.3f} s")
+    print(f"tf-idf rows      {tfidf_time:8.3f} s")
+    print(f"batched          {matrix_time:8.3f} s  ({backend})")
+    print(f"inverted index   {python_time:8.3f} s  ({python_time / matrix_time:.1f}x slower)")
+    if batched != expected:
+        differing = sum(1 for a, b in zip(batched, expected) if a != b)
+        print(f"neighbour lists DIFFER for {differing} posts")
+
+
+if __name__ == "__main__":
+    main()
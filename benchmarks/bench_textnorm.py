@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark markdown_generator/textnorm.py against the code it replaced
+
+Times per-entry HTML escaping, LaTeX stripping and slug building with the old
+generator-expression and chained-replace versions, the new str.translate and
+compiled-regex functions, and the column (batch) API, on synthetic titles and
+abstracts. Checks that all three produce the same strings.
+
+Usage: python3 benchmarks/bench_textnorm.py [--entries N] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+from fixtures import REPO_ROOT, WORDS, sentence
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "markdown_generator"))
+
+# The implementations textnorm replaced, as they were in the generators
+old_escape_table = {"&": "&amp;", '"': "&quot;", "'": "&apos;"}
+
+
+def old_html_escape(text):
+    return "".join(old_escape_table.get(c, c) for c in text)
+
+
+def old_strip_latex(text):
+    return text.replace("{", "").replace("}", "").replace("\\", "")
+
+
+def old_slugify(title):
+    clean_title = title.replace("{", "").replace("}", "").replace("\\", "").replace(" ", "-")
+    url_slug = re.sub("\\[.*\\]|[^a-zA-Z0-9_-]", "", clean_title)
+    return url_slug.replace("--", "-")
+
+
+def synthetic_text(entries, seed=0):
+    """BibTeX-ish titles and abstracts with braces, quotes and ampersands."""
+    rng = random.Random(seed)
+    titles = []
+    abstracts = []
+    for i in range(entries):
+        words = [rng.choice(WORDS).capitalize() for _ in range(rng.randint(4, 12))]
+        if rng.random() < 0.3:
+            words[0] = "{" + words[0] + "}"
+        if rng.random() < 0.1:
+            words.append("[preprint]")
+        titles.append(" ".join(words) + f" {i}")
+        abstracts.append(f"{sentence(rng, 40)} & it's \"{rng.choice(WORDS)}\".")
+    return titles, abstracts
+
+
+def best_of(repeat, function):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100000, help="number of synthetic entries")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the fastest is kept")
+    args = parser.parse_args()
+
+    import textnorm
+
+    titles, abstracts = synthetic_text(args.entries)
+    cases = [
+        ("html_escape", abstracts, old_html_escape, textnorm.html_escape, textnorm.html_escape_many),
+        ("strip_latex", titles, old_strip_latex, textnorm.strip_latex, textnorm.strip_latex_many),
+        ("slugify", titles, old_slugify, textnorm.slugify, textnorm.slugify_many),
+    ]
+    print(f"{args.entries} entries, ns per entry (best of {args.repeat})")
+    print(f"{'':<12} {'old':>8} {'new':>8} {'batch':>8} {'speed-up':>9}")
+    for name, values, old, new, many in cases:
+        old_time, expected = best_of(args.repeat, lambda: [old(value) for value in values])
+        new_time, result = best_of(args.repeat, lambda: [new(value) for value in values])
+        batch_time, batch = best_of(args.repeat, lambda: many(values))
+        if result != expected or batch != expected:
+            print(f"{name}: output DIFFERS from the old implementation")
+        per_entry = [t / len(values) * 1e9 for t in (old_time, new_time, batch_time)]
+        print(f"{name:<12} {per_entry[0]:8.0f} {per_entry[1]:8.0f} {per_entry[2]:8.0f} "
+              f"{old_time / batch_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark the column-wise (--vectorized) mode of the TSV generators
+
+Renders a synthetic talks.tsv and publications.tsv with the default row path
+(csv.DictReader and render_talk / render_publication) and with the pandas
+column path (read_frame and render_talks / render_publications), and checks
+that both produce the same files. The repository's own TSVs are compared too.
+Nothing is written to disk apart from the fixtures. Reports whether pyarrow is
+installed, since the column path is only fast with it.
+
+Usage: python3 benchmarks/bench_tsv_columns.py [--rows N] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from fixtures import REPO_ROOT, write_publications_tsv, write_talks_tsv
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "markdown_generator"))
+
+
+def best_of(repeat, function):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="rows in each synthetic TSV")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the fastest is kept")
+    args = parser.parse_args()
+
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        sys.exit("the column-wise mode needs pandas")
+    try:
+        import pyarrow  # noqa: F401
+        print("pyarrow installed: Arrow string columns")
+    except ImportError:
+        print("pyarrow not installed: Python string columns")
+    import publications
+    import talks
+    from tsvframe import chunks, read_frame
+    from tsvstream import read_rows
+
+    cases = [
+        ("talks", write_talks_tsv, talks.render_talk, talks.render_talks),
+        ("publications", write_publications_tsv, publications.render_publication,
+         publications.render_publications),
+    ]
+    print(f"{args.rows} rows, seconds (best of {args.repeat})")
+    print(f"{'':<13} {'rows':>8} {'columns':>8} {'speed-up':>9}")
+    with tempfile.TemporaryDirectory() as work:
+        for name, write_tsv, render_row, render_columns in cases:
+            path = os.path.join(work, f"{name}.tsv")
+            write_tsv(path, args.rows)
+            for tsv in (path, os.path.join(REPO_ROOT, "markdown_generator", f"{name}.tsv")):
+                expected = [render_row(row) for row in read_rows(tsv)]
+                result = [pair for chunk in chunks(read_frame(tsv)) for pair in render_columns(chunk)]
+                if result != expected:
+                    print(f"{name}: column output DIFFERS from the row output for {tsv}")
+
+            row_time, _ = best_of(args.repeat, lambda: [render_row(row) for row in read_rows(path)])
+            column_time, _ = best_of(args.repeat, lambda: [
+                render_columns(chunk) for chunk in chunks(read_frame(path))])
+            print(f"{name:<13} {row_time:8.2f} {column_time:8.2f} {row_time / column_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Synthetic inputs for the benchmarks
+
+Everything is generated from a seeded random.Random, so a given size always
+produces the same files.
+"""
+
+import os
+import random
+import shutil
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+WORDS = ("learning inference robust sparse graph neural bayesian optimal online "
+         "adaptive scalable causal latent deep models networks analysis").split()
+
+# Front matter fields written for each collection, as read by cv_markdown_to_json.py
+COLLECTION_FIELDS = {
+    "_publications": ("title", "venue", "date", "paperurl", "excerpt"),
+    "_talks": ("title", "venue", "date", "location", "excerpt"),
+    "_teaching": ("title", "venue", "date", "type", "excerpt"),
+    "_portfolio": ("title", "collection", "date", "permalink", "excerpt"),
+}
+
+
+def sentence(rng, words=8):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def write_site_tree(root, files_per_collection, seed=0):
+    """Create a minimal site under `root` with the given number of files in
+    each CV collection, plus _pages/cv.md and _config.yml from this repository."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(root, "_pages"), exist_ok=True)
+    shutil.copy(os.path.join(REPO_ROOT, "_pages", "cv.md"), os.path.join(root, "_pages", "cv.md"))
+    shutil.copy(os.path.join(REPO_ROOT, "_config.yml"), os.path.join(root, "_config.yml"))
+
+    for collection, fields in COLLECTION_FIELDS.items():
+        directory = os.path.join(root, collection)
+        os.makedirs(directory, exist_ok=True)
+        for i in range(files_per_collection):
+            date = f"{rng.randint(1990, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            values = {
+                "title": f'"{sentence(rng, 6)} {i}"',
+                "venue": f'"{sentence(rng, 3)}"',
+                "date": date,
+                "paperurl": f"'https://example.org/{collection[1:]}/{i}.pdf'",
+                "location": f'"{sentence(rng, 2)}, Country"',
+                "type": '"Undergraduate course"',
+                "collection": collection[1:],
+                "permalink": f"/{collection[1:]}/{date}-item-{i}",
+                "excerpt": f"'{sentence(rng, 20)}.'",
+            }
+            lines = ["---"] + [f"{field}: {values[field]}" for field in fields] + ["---", ""]
+            body = "\n\n".join(sentence(rng, 40) + "." for _ in range(rng.randint(3, 12)))
+            with open(os.path.join(directory, f"{date}-item-{i}.md"), "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n" + body + "\n")
+
+
+def random_date(rng):
+    return f"{rng.randint(1990, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def write_talks_tsv(path, rows, seed=0):
+    """Write `rows` talks in the column layout of markdown_generator/talks.tsv."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("title\ttype\turl_slug\tvenue\tdate\tlocation\ttalk_url\tdescription\n")
+        for i in range(rows):
+            f.write("\t".join([
+                f"{sentence(rng, 6)} {i}",
+                rng.choice(["Talk", "Tutorial", "Keynote", ""]),
+                f"talk-{i}",
+                f"University of {sentence(rng, 2)}, Department of {rng.choice(WORDS).capitalize()}",
+                random_date(rng),
+                f"{rng.choice(WORDS).capitalize()} City, Country {rng.randrange(200)}",
+                f"https://example.org/talks/{i}" if rng.random() < 0.5 else "",
+                f"{sentence(rng, 30)} with \"quotes\" & ampersands.",
+            ]) + "\n")
+
+
+def write_publications_tsv(path, rows, seed=0):
+    """Write `rows` publications in the column layout of markdown_generator/publications.tsv."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("pub_date\ttitle\tvenue\texcerpt\tcitation\turl_slug\tpaper_url\tslides_url\n")
+        for i in range(rows):
+            title = f"{sentence(rng, 6)} {i}"
+            venue = f"Journal of {rng.choice(WORDS).capitalize()}"
+            date = random_date(rng)
+            f.write("\t".join([
+                date,
+                title,
+                venue,
+                f"{sentence(rng, 25)}. It's about \"{rng.choice(WORDS)}\" & more.",
+                f'Author, A. ({date[:4]}). "{title}." <i>{venue}</i>. {rng.randrange(1, 40)}(1).',
+                f"paper-{i}",
+                f"https://example.org/paper/{i}.pdf" if rng.random() < 0.7 else "",
+                "",
+            ]) + "\n")
+
+
+def write_synthetic_bib(path, entries, seed=0):
+    """Write `entries` journal articles with unique titles to `path`."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(entries):
+            title = " ".join(rng.choice(WORDS).capitalize() for _ in range(6)) + f" {i}"
+            authors = " and ".join(f"Author{rng.randrange(1000)}, First{rng.randrange(100)}"
+                                   for _ in range(rng.randint(1, 4)))
+            f.write(f"@article{{key{i},\n"
+                    f"  title = {{{{{title}}}}},\n"
+                    f"  author = {{{authors}}},\n"
+                    f"  journal = {{Journal of {rng.choice(WORDS).capitalize()}}},\n"
+                    f"  year = {{{rng.randint(1990, 2025)}}},\n"
+                    f"  month = {{{rng.choice(MONTHS)}}},\n"
+                    f"  note = {{Synthetic entry number {i} for benchmarking}},\n"
+                    f"  url = {{https://example.org/paper/{i}}}\n"
+                    f"}}\n\n")
+
+
+def write_geonames(path, places, seed=0):
+    """Write `places` cities in the GeoNames dump format read by scripts/gazetteer.py.
+
+    Returns the (name, admin1, country) of each place, for building queries.
+    """
+    rng = random.Random(seed)
+    written = []
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(places):
+            name = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}{i}"
+            country = rng.choice(["US", "GB", "DE", "FR", "JP", "BR", "IN", "CA"])
+            admin1 = f"{rng.randrange(1, 60):02d}"
+            alternates = ",".join(f"{rng.choice(WORDS)}{i}" for _ in range(rng.randrange(3)))
+            f.write("\t".join([
+                str(i), name, name, alternates,
+                f"{rng.uniform(-60, 70):.5f}", f"{rng.uniform(-180, 180):.5f}",
+                "P", "PPL", country, "", admin1, "", "", "",
+                str(rng.randrange(15000, 5000000)), "", "0", "UTC", "2024-01-01",
+            ]) + "\n")
+            written.append((name, admin1, country))
+    return written
+
+
+def write_posts(directory, posts, topics=50, seed=0):
+    """Write `posts` blog posts whose bodies mix the vocabulary of a few of
+    `topics` synthetic topics, so that related posts share terms."""
+    rng = random.Random(seed)
+    vocabularies = [[f"{rng.choice(WORDS)[:4]}{topic}x{word}" for word in range(40)] for topic in range(topics)]
+    os.makedirs(directory, exist_ok=True)
+    for i in range(posts):
+        mix = rng.sample(range(topics), 3)
+        words = [rng.choice(vocabularies[rng.choice(mix)] if rng.random() < 0.6 else WORDS)
+                 for _ in range(rng.randint(200, 800))]
+        date = random_date(rng)
+        with open(os.path.join(directory, f"{date}-post-{i}.md"), "w", encoding="utf-8") as f:
+            f.write(f"---\ntitle: \"{sentence(rng, 5)} {i}\"\ndate: {date}\n"
+                    f"tags:\n  - {vocabularies[mix[0]][0]}\n---\n\n{' '.join(words)}\n")
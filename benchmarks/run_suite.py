@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the site data generators
+
+Synthesizes large inputs once (100,000-row talks.tsv and publications.tsv, a
+large bib file and thousands of collection Markdown files), then runs each
+generator in a fresh subprocess and times it per phase. Every case also
+reports the peak RSS of its process, and with --tracemalloc the peak Python
+heap of each phase (which slows the timings down). Geocoding goes through an
+offline stub, so the suite needs no network.
+
+Results are written as JSON and can be compared with an earlier run:
+
+  python3 benchmarks/run_suite.py --output before.json
+  ...
+  python3 benchmarks/run_suite.py --output after.json --compare before.json
+
+Cases whose dependencies are not installed (pybtex for pubsFromBib) are
+recorded as skipped.
+
+Usage: python3 benchmarks/run_suite.py [--rows N] [--entries N] [--files N]
+       [--repeat N] [--cases a,b] [--quick] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fixtures import (REPO_ROOT, write_publications_tsv, write_site_tree, write_synthetic_bib,
+                      write_talks_tsv)
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "markdown_generator"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+RESULTS_VERSION = 1
+CASES = ("talks", "publications", "pubsFromBib", "cv_json", "talkmap")
+
+
+class SkipCase(Exception):
+    """Raised by a case whose dependencies are not available."""
+
+
+class Phases:
+    """Accumulate wall time (and optionally the Python heap peak) per phase."""
+
+    def __init__(self, trace_memory=False):
+        self.seconds = {}
+        self.heap_peak_kb = {}
+        self.trace_memory = trace_memory
+
+    def add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] // 1024
+                self.heap_peak_kb[name] = max(peak, self.heap_peak_kb.get(name, 0))
+
+
+# Cases. Each one takes the fixtures directory, an empty work directory and a
+# Phases object, and returns the number of items it processed.
+
+def _tsv_case(module_name, render_name, tsv_name, fixtures, work, phases):
+    """Stream a TSV through a generator's renderer and IncrementalWriter, as the
+    script does, timing reading, rendering and writing separately."""
+    import importlib
+    from incremental import IncrementalWriter
+    from tsvstream import BATCH_SIZE, read_rows
+
+    render = getattr(importlib.import_module(module_name), render_name)
+    tsv = os.path.join(fixtures, tsv_name)
+
+    def run(output_dir, parse, render_phase, write):
+        count = 0
+        rows = read_rows(tsv)
+        batch = []
+        with IncrementalWriter(output_dir, module_name) as writer:
+            while True:
+                start = time.perf_counter()
+                row = next(rows, None)
+                rendered_at = time.perf_counter()
+                phases.add(parse, rendered_at - start)
+                if row is None:
+                    break
+                batch.append(render(row))
+                written_at = time.perf_counter()
+                phases.add(render_phase, written_at - rendered_at)
+                if len(batch) == BATCH_SIZE:
+                    writer.write_many(batch)
+                    batch = []
+                    phases.add(write, time.perf_counter() - written_at)
+                count += 1
+            start = time.perf_counter()
+            writer.write_many(batch)
+        # Leaving the block wrote the manifest and removed orphans
+        phases.add(write, time.perf_counter() - start)
+        return count
+
+    output_dir = os.path.join(work, module_name)
+    os.makedirs(output_dir)
+    with phases.timed("total"):
+        count = run(output_dir, "parse", "render", "write")
+    # A second run over unchanged output exercises the skip-unchanged path
+    with phases.timed("rerun"):
+        run(output_dir, "rerun_parse", "rerun_render", "rerun_write")
+    return count
+
+
+def case_talks(fixtures, work, phases):
+    return _tsv_case("talks", "render_talk", "talks.tsv", fixtures, work, phases)
+
+
+def case_publications(fixtures, work, phases):
+    return _tsv_case("publications", "render_publication", "publications.tsv", fixtures, work, phases)
+
+
+def case_pubsFromBib(fixtures, work, phases):
+    try:
+        import pybtex  # noqa: F401
+        import pubsFromBib
+    except ImportError as ex:
+        raise SkipCase(f"pubsFromBib is not importable ({ex})")
+    from ingest import READERS, Session
+    from templates import renderer
+
+    os.chdir(fixtures)
+    pubsFromBib.publist = {"journal": dict(pubsFromBib.publist["journal"], file="bench.bib")}
+    source = pubsFromBib.bib_sources()[0]
+    session = Session(cache_file=None, quiet=True)
+    with phases.timed("parse"):
+        records = list(READERS[source.format](source.path, session, **source.options))
+    with phases.timed("render"):
+        render = renderer(source.layout, **source.constants)
+        rendered = [render(record) for record in records]
+    with phases.timed("write"):
+        output_dir = os.path.join(work, "publications")
+        os.makedirs(output_dir)
+        for md_filename, md in rendered:
+            with open(os.path.join(output_dir, md_filename), "w", encoding="utf-8") as f:
+                f.write(md)
+    del rendered
+
+    cache_file = os.path.join(work, "bibcache.pickle")
+    with phases.timed("total"):
+        pubsFromBib.generate(output_dir=output_dir, quiet=True, cache_file=cache_file)
+    with phases.timed("rerun_cached"):
+        pubsFromBib.generate(output_dir=output_dir, quiet=True, cache_file=cache_file)
+    return len(records)
+
+
+def case_cv_json(fixtures, work, phases):
+    import cv_markdown_to_json as cv
+    from frontmatter_index import FrontMatterIndex
+
+    site = os.path.join(fixtures, "site")
+    md_file = os.path.join(site, "_pages", "cv.md")
+    config_file = os.path.join(site, "_config.yml")
+
+    with phases.timed("parse_config"):
+        config = cv.parse_config(config_file)
+    with phases.timed("parse_markdown"):
+        sections = cv.parse_markdown_cv(md_file)
+        cv_json = {"basics": cv.extract_author_info(config)}
+        cv.apply_markdown_sections(cv_json, sections)
+    index = FrontMatterIndex(os.path.join(work, "frontmatter-index.pickle"))
+    with phases.timed("scan"):
+        index.scan([os.path.join(site, name) for name, _, _ in cv.COLLECTION_SECTIONS])
+    with phases.timed("render"):
+        count = 0
+        for name, section, build_entry in cv.COLLECTION_SECTIONS:
+            cv_json[section] = [build_entry(fm) for _, fm in index.collection(os.path.join(site, name))]
+            count += len(cv_json[section])
+    with phases.timed("write"):
+        cv.write_cv_json(cv_json, os.path.join(work, "cv-phases.json"))
+
+    # End to end, first with an empty front matter index and then a warm one
+    output = os.path.join(work, "cv.json")
+    shutil.rmtree(os.path.join(site, ".build-cache"), ignore_errors=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        with phases.timed("total"):
+            cv.create_cv_json(md_file, config_file, site, output)
+        os.remove(output)
+        with phases.timed("rerun_warm_index"):
+            cv.create_cv_json(md_file, config_file, site, output)
+    return count
+
+
+class StubGeocoder:
+    """Offline stand-in for geopy's Nominatim with deterministic coordinates."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def geocode(self, query, timeout=None):
+        from geocoding import CachedLocation
+        if self.latency:
+            time.sleep(self.latency)
+        digest = hashlib.sha1(query.encode("utf-8")).digest()
+        latitude = digest[0] / 255 * 180 - 90
+        longitude = digest[1] / 255 * 360 - 180
+        return CachedLocation(f"{query} (stub)", latitude, longitude)
+
+
+def case_talkmap(fixtures, work, phases):
+    """The talkmap.py pipeline with the geocoder stubbed out. talkmap.py itself
+    reads front matter with python-frontmatter; the front matter index reader
+    is used here so the case has no dependencies beyond PyYAML."""
+    import glob
+    from frontmatter_index import parse_file
+    from geocoding import GeocodeCache, geocode_all
+
+    talks_dir = os.path.join(fixtures, "site", "_talks")
+    with phases.timed("parse"):
+        talks = []
+        for path in glob.glob(os.path.join(talks_dir, "*.md")):
+            data = parse_file(path) or {}
+            if "location" in data:
+                talks.append((f"{data['title'].strip()}<br />{data['venue'].strip()}; {data['location']}",
+                              data["location"].strip()))
+
+    latency = float(os.environ.get("BENCH_GEOCODE_LATENCY", "0"))
+    cache_file = os.path.join(work, "geocode-cache.jsonl")
+    with phases.timed("geocode"):
+        cache = GeocodeCache(StubGeocoder(latency), path=cache_file)
+        results = geocode_all(cache, [location for _, location in talks], rate=0, workers=4)
+    with phases.timed("write_cache"):
+        cache.save()
+    with phases.timed("geocode_cached"):
+        cache = GeocodeCache(StubGeocoder(latency), path=cache_file)
+        geocode_all(cache, [location for _, location in talks], rate=0, workers=4)
+
+    from mapclusters import write_address_points, write_clusters, write_map_page
+    points = [(description, results[location][0].latitude, results[location][0].longitude)
+              for description, location in talks]
+    folder = os.path.join(work, "talkmap")
+    os.makedirs(folder, exist_ok=True)
+    with phases.timed("write_map"):
+        write_address_points(points, folder)
+        write_map_page(folder)
+        write_clusters(points, folder)
+    with phases.timed("write_map_unchanged"):
+        write_clusters(points, folder)
+    return len(talks)
+
+
+def run_case(name, fixtures, work, trace_memory):
+    """Run one case in this process and return its result record."""
+    phases = Phases(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            items = globals()["case_" + name](fixtures, work, phases)
+    except SkipCase as ex:
+        return {"status": "skipped", "reason": str(ex)}
+    record = {
+        "status": "ok",
+        "items": items,
+        "phases": {phase: round(seconds, 6) for phase, seconds in phases.seconds.items()},
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                       // (1024 if sys.platform == "darwin" else 1),
+    }
+    if trace_memory:
+        record["heap_peak_kb"] = phases.heap_peak_kb
+    return record
+
+
+# Driver
+
+def build_fixtures(root, args):
+    start = time.perf_counter()
+    write_talks_tsv(os.path.join(root, "talks.tsv"), args.rows)
+    write_publications_tsv(os.path.join(root, "publications.tsv"), args.rows, seed=1)
+    write_synthetic_bib(os.path.join(root, "bench.bib"), args.entries)
+    write_site_tree(os.path.join(root, "site"), args.files)
+    return time.perf_counter() - start
+
+
+def spawn_case(name, fixtures, work, trace_memory):
+    """Run a case in a fresh interpreter, so imports and peak memory are its own."""
+    result_file = os.path.join(work, "result.json")
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", name,
+               "--fixtures", fixtures, "--work", work, "--result", result_file]
+    if trace_memory:
+        command.append("--tracemalloc")
+    completed = subprocess.run(command, stderr=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        return {"status": "failed", "reason": completed.stderr.strip().splitlines()[-1:]}
+    with open(result_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def merge_repeats(records):
+    """Keep the fastest time of each phase and the largest memory figures."""
+    ok = [record for record in records if record["status"] == "ok"]
+    if not ok:
+        return records[0]
+    merged = dict(ok[0])
+    merged["phases"] = {phase: min(r["phases"][phase] for r in ok) for phase in ok[0]["phases"]}
+    merged["peak_rss_kb"] = max(r["peak_rss_kb"] for r in ok)
+    merged["repeats"] = len(ok)
+    return merged
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip() != ""
+        return revision, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(results, baseline, threshold):
+    """Print each phase against `baseline`; returns the number of regressions."""
+    regressions = 0
+    print(f"\n{'case/phase':<34} {'before':>10} {'after':>10} {'change':>8}")
+    for name, record in results["cases"].items():
+        before = baseline.get("cases", {}).get(name, {})
+        if record.get("status") != "ok" or before.get("status") != "ok":
+            continue
+        rows = [(phase, before["phases"].get(phase), seconds) for phase, seconds in record["phases"].items()]
+        rows.append(("peak_rss_kb", before["peak_rss_kb"], record["peak_rss_kb"]))
+        for phase, old, new in rows:
+            if not old:
+                continue
+            change = new / old - 1
+            flag = ""
+            if change > threshold:
+                flag = "  slower" if phase != "peak_rss_kb" else "  larger"
+                regressions += 1
+            unit = "" if phase == "peak_rss_kb" else "s"
+            print(f"{name + '/' + phase:<34} {old:>9.3f}{unit or ' '} {new:>9.3f}{unit or ' '} "
+                  f"{change:>+7.1%}{flag}")
+    return regressions
+
+
+def print_results(results):
+    for name, record in results["cases"].items():
+        if record["status"] != "ok":
+            print(f"{name:<14} {record['status']}: {record.get('reason')}")
+            continue
+        phases = "  ".join(f"{phase}={seconds:.3f}s" for phase, seconds in record["phases"].items())
+        print(f"{name:<14} {record['items']:>7} items  peak {record['peak_rss_kb'] / 1024:6.1f} MB  {phases}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="rows in each synthetic TSV")
+    parser.add_argument("--entries", type=int, default=20000, help="entries in the synthetic bib file")
+    parser.add_argument("--files", type=int, default=1000, help="Markdown files per collection")
+    parser.add_argument("--quick", action="store_true", help="divide every size by 20")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is kept")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma-separated cases to run")
+    parser.add_argument("--tracemalloc", action="store_true", help="record the Python heap peak per phase")
+    parser.add_argument("--output", "-o", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown reported as a regression (default 0.10)")
+    # Internal: run a single case in this process
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--fixtures", help=argparse.SUPPRESS)
+    parser.add_argument("--work", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        record = run_case(args.run_case, args.fixtures, args.work, args.tracemalloc)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        return 0
+
+    cases = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s) {', '.join(unknown)}; expected some of {', '.join(CASES)}")
+    if args.quick:
+        args.rows, args.entries, args.files = args.rows // 20, args.entries // 20, max(1, args.files // 20)
+
+    revision, dirty = git_revision()
+    results = {
+        "version": RESULTS_VERSION,
+        "revision": revision,
+        "dirty": dirty,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {"rows": args.rows, "entries": args.entries, "files": args.files,
+                   "repeat": args.repeat, "tracemalloc": args.tracemalloc},
+        "cases": {},
+    }
+
+    with tempfile.TemporaryDirectory() as root:
+        fixtures = os.path.join(root, "fixtures")
+        os.makedirs(fixtures)
+        print(f"Fixtures: {args.rows} TSV rows, {args.entries} bib entries, "
+              f"{4 * args.files} collection files ({build_fixtures(fixtures, args):.1f}s to build)")
+        for name in cases:
+            records = []
+            for repeat in range(args.repeat):
+                work = os.path.join(root, f"work-{name}-{repeat}")
+                os.makedirs(work)
+                records.append(spawn_case(name, fixtures, work, args.tracemalloc))
+                shutil.rmtree(work)
+            results["cases"][name] = merge_repeats(records)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != results["params"]:
+            print("Warning: the baseline was run with different parameters")
+        regressions = compare(results, baseline, args.threshold)
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    failed = any(record["status"] == "failed" for record in results["cases"].values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Parsed-BibTeX cache for pubsFromBib.py
+#
+# Parsing with pybtex is the slowest step for large libraries. `BibCache` pickles
+# the parsed entries of every bib file, keyed by the file's size and mtime and
+# the SHA-1 of its contents, so an unchanged file loads without touching pybtex.
+# When a file has changed, it is split at entry boundaries and each entry is
+# looked up by the hash of its raw text, so only new or edited entries are
+# parsed again.
+
+import hashlib
+import os
+import pickle
+import re
+
+# Bump when the shape of the parsed entries changes, to discard old caches
+CACHE_VERSION = 1
+DEFAULT_CACHE_FILE = ".bibcache.pickle"
+
+# Bib files are split into chunks of roughly this many entries for parsing
+CHUNK_ENTRIES = 2000
+
+entry_start = re.compile(r"^@", re.MULTILINE)
+entry_key = re.compile(r"^@\s*\w+\s*[{(]\s*([^,\s]*)", re.MULTILINE)
+shared_block = re.compile(r"^@\s*(string|preamble)\b", re.MULTILINE | re.IGNORECASE)
+
+
+def split_entries(text):
+    """Split bibtex source into raw blocks, each starting at an entry."""
+    starts = [m.start() for m in entry_start.finditer(text)]
+    if not starts:
+        return [text]
+    # Anything before the first entry is kept with it
+    bounds = [0] + starts[1:] + [len(text)]
+    return [text[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+
+def split_bib(text, chunk_entries=CHUNK_ENTRIES):
+    """Split bibtex source into chunks of whole entries for parallel parsing.
+
+    Files that define @string macros or a @preamble are not split, since every
+    chunk would need to see them.
+    """
+    if shared_block.search(text):
+        return [text]
+    blocks = split_entries(text)
+    return ["".join(blocks[i:i + chunk_entries]) for i in range(0, len(blocks), chunk_entries)]
+
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class BibCache:
+    """Pickled cache of parsed bib files with per-entry reuse."""
+
+    def __init__(self, path=DEFAULT_CACHE_FILE):
+        self.path = path
+        self.files = {}
+        self.dirty = False
+        self.files_reused = 0
+        self.entries_reused = 0
+        self.entries_parsed = 0
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self.files = data["files"]
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError):
+                # A corrupt or foreign cache is simply rebuilt
+                self.files = {}
+
+    def entries(self, bib_path, parse_many, chunk_entries=CHUNK_ENTRIES):
+        """Return the parsed entries of `bib_path`, in file order.
+
+        `parse_many` takes a list of bibtex source strings and returns a list
+        with the parsed (bib_id, fields, persons) entries of each one.
+        """
+        key = os.path.abspath(bib_path)
+        stat = os.stat(bib_path)
+        record = self.files.get(key)
+        if record and record["size"] == stat.st_size and record["mtime"] == stat.st_mtime_ns:
+            self.files_reused += 1
+            return record["parsed"]
+
+        with open(bib_path, "rb") as f:
+            raw = f.read()
+        digest = _sha1(raw)
+        if record and record["sha1"] == digest:
+            record["size"], record["mtime"] = stat.st_size, stat.st_mtime_ns
+            self.dirty = True
+            self.files_reused += 1
+            return record["parsed"]
+
+        text = raw.decode("utf-8")
+        if shared_block.search(text):
+            # Macros can change the meaning of any entry, so parse the file whole
+            blocks = {}
+            parsed = [entry for chunk in parse_many([text]) for entry in chunk]
+            self.entries_parsed += len(parsed)
+        else:
+            previous = record["blocks"] if record else {}
+            blocks = {}
+            order = []
+            changed = []
+            for block in split_entries(text):
+                block_hash = _sha1(block.encode("utf-8"))
+                order.append(block_hash)
+                if block_hash in previous:
+                    blocks[block_hash] = previous[block_hash]
+                    self.entries_reused += 1
+                elif block_hash not in blocks:
+                    blocks[block_hash] = None
+                    changed.append(block)
+
+            chunks = ["".join(changed[i:i + chunk_entries]) for i in range(0, len(changed), chunk_entries)]
+            by_key = {}
+            for chunk in parse_many(chunks):
+                for entry in chunk:
+                    by_key.setdefault(entry[0], entry)
+            for block in changed:
+                match = entry_key.search(block)
+                # Comments and other non-entry blocks have no parsed entry
+                blocks[_sha1(block.encode("utf-8"))] = by_key.get(match.group(1)) if match else None
+            self.entries_parsed += len(by_key)
+            parsed = [blocks[h] for h in order if blocks[h] is not None]
+
+        self.files[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha1": digest,
+                           "blocks": blocks, "parsed": parsed}
+        self.dirty = True
+        return parsed
+
+    def save(self):
+        """Write the cache atomically if anything changed."""
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": CACHE_VERSION, "files": self.files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def stats(self):
+        """Counters for the instrumentation layer."""
+        return {"bib_files_reused": self.files_reused, "bib_entries_reused": self.entries_reused,
+                "bib_entries_parsed": self.entries_parsed}
+
+    def summary(self):
+        return (f"{self.files_reused} files unchanged, {self.entries_reused} entries reused, "
+                f"{self.entries_parsed} entries parsed")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Incremental output for the markdown generators
+#
+# Rewriting every `.md` file on each run changes their mtimes and makes Jekyll
+# regenerate the whole collection. `IncrementalWriter` keeps a small manifest of
+# the SHA-1 of every file it generated, skips writes whose content is
+# byte-identical to the last run, and removes files it generated previously
+# whose rows have since been deleted. Files it never wrote (hand-authored pages
+# in the same collection) are left alone.
+#
+# Changed files are not written in place. They are staged in a hidden directory
+# inside the output folder by a small pool of I/O threads, each file with a
+# single buffered write, and only moved into place with `os.replace` once the
+# whole run has succeeded. An interrupted or failed run therefore leaves the
+# collection exactly as it was, with no partially written pages.
+#
+# With `collisions` set, every page is first checked against a
+# `PermalinkIndex` (see `permalinks.py`), so two pages with the same file name
+# or permalink are renamed or stop the run instead of overwriting each other.
+
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from permalinks import PermalinkIndex
+
+MANIFEST_NAME = ".generator-manifest.json"
+
+# Threads writing staged files, and the buffer size used for each file. With a
+# single CPU the threads only compete with rendering, so files are written inline.
+IO_WORKERS = min(4, os.cpu_count() or 1)
+WRITE_BUFFER = 1 << 20
+
+
+def _write_file(path, data):
+    with open(path, "wb", buffering=WRITE_BUFFER) as f:
+        f.write(data)
+
+
+def _same_content(path, data):
+    """True if the file at `path` already holds exactly `data`."""
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+class IncrementalWriter:
+    """Write generated files into `output_dir`, touching only what changed."""
+
+    def __init__(self, output_dir, generator, full=False, manifest_name=MANIFEST_NAME,
+                 io_workers=IO_WORKERS, collisions=None):
+        """`collisions` is None to write pages as named, "rename" to give pages
+        whose file name or permalink is taken a `-N` suffix, or "fail" to raise
+        PermalinkCollision for them."""
+        self.output_dir = output_dir
+        self.generator = generator
+        self.full = full
+        self.manifest_path = os.path.join(output_dir, manifest_name)
+        manifest = self._load_manifest()
+        self.previous = manifest.get(generator, {})
+        self.current = {}
+        self.written = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.bytes_written = 0
+
+        # Leftovers of an interrupted run are discarded
+        self.staging_dir = os.path.join(output_dir, f".staging-{generator}")
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        os.makedirs(self.staging_dir)
+        self.staged = set()
+        self.pool = ThreadPoolExecutor(max_workers=io_workers) if io_workers > 1 else None
+        self.pending = []
+
+        self.permalinks = None
+        if collisions is not None:
+            adoptable = ()
+            if generator not in manifest:
+                # First run with a manifest: a page no other generator claims may
+                # be this generator's earlier output, if it writes the same name
+                others = {name for section in manifest.values() for name in section}
+                adoptable = [name for name in os.listdir(output_dir) if name not in others]
+            site_root = os.path.dirname(os.path.abspath(output_dir))
+            self.permalinks = PermalinkIndex(site_root, output_dir, owned=self.previous,
+                                             adoptable=adoptable, fail=collisions == "fail")
+
+    def _load_manifest(self):
+        """Return the whole manifest. Several generators can share an output
+        directory; each only owns its own section."""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def write(self, filename, content):
+        """Stage `content` for `filename` unless it is unchanged since the last run.
+
+        Returns True if the file will be written.
+        """
+        filename = os.path.basename(filename)
+        if self.permalinks is not None:
+            filename, content = self.permalinks.claim(filename, content)
+        data = content.encode("utf-8")
+        digest = hashlib.sha1(data).hexdigest()
+        self.current[filename] = digest
+        path = os.path.join(self.output_dir, filename)
+        if filename in self.staged:
+            # The same file twice in one run: the last content wins, as with plain writes
+            self._drain()
+            staged_path = os.path.join(self.staging_dir, filename)
+            self.written -= 1
+            self.bytes_written -= os.path.getsize(staged_path)
+            os.remove(staged_path)
+            self.staged.discard(filename)
+        if not self.full:
+            if self.previous.get(filename) == digest and os.path.exists(path):
+                self.unchanged += 1
+                return False
+            # Not in the manifest yet (first run, or a file written by hand or
+            # by an older version): compare with what is on disk
+            if filename not in self.previous and _same_content(path, data):
+                self.unchanged += 1
+                return False
+
+        staged_path = os.path.join(self.staging_dir, filename)
+        if self.pool is None:
+            _write_file(staged_path, data)
+        else:
+            self.pending.append(self.pool.submit(_write_file, staged_path, data))
+        self.staged.add(filename)
+        self.written += 1
+        self.bytes_written += len(data)
+        return True
+
+    def _drain(self):
+        """Wait for the queued writes, raising the first error."""
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
+
+    def write_many(self, items):
+        """Write a batch of (filename, content) pairs.
+
+        The writes of the previous batch are waited for first, so at most two
+        batches are held in memory.
+        """
+        self._drain()
+        for filename, content in items:
+            self.write(filename, content)
+
+    def finish(self):
+        """Move staged files into place, remove orphaned files and save the manifest."""
+        self._drain()
+        if self.pool is not None:
+            self.pool.shutdown()
+        for filename in sorted(self.staged):
+            os.replace(os.path.join(self.staging_dir, filename), os.path.join(self.output_dir, filename))
+        os.rmdir(self.staging_dir)
+
+        for filename in sorted(set(self.previous) - set(self.current)):
+            path = os.path.join(self.output_dir, filename)
+            if os.path.exists(path):
+                os.remove(path)
+                self.removed += 1
+
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        manifest[self.generator] = dict(sorted(self.current.items()))
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def abort(self):
+        """Drop everything staged so far, leaving the output folder untouched."""
+        for future in self.pending:
+            future.cancel()
+        self.pending = []
+        if self.pool is not None:
+            self.pool.shutdown()
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def summary(self):
+        summary = f"{self.written} written, {self.unchanged} unchanged, {self.removed} removed"
+        if self.permalinks is not None and self.permalinks.renamed:
+            summary += f", {self.permalinks.renamed} renamed to avoid collisions"
+        return summary
+
+    def stats(self):
+        """Counters for the instrumentation layer."""
+        stats = {"files_written": self.written, "files_unchanged": self.unchanged,
+                 "files_removed": self.removed, "bytes_written": self.bytes_written}
+        if self.permalinks is not None:
+            stats["pages_renamed"] = self.permalinks.renamed
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Keep the previous files and manifest if the run failed part way through
+        if exc_type is None:
+            self.finish()
+        else:
+            self.abort()
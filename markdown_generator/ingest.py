@@ -0,0 +1,563 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Ingestion engine for the markdown generators
+#
+# `talks.py`, `publications.py` and `pubsFromBib.py` used to have a parsing and
+# rendering loop each, and adding a citation database meant writing another
+# one. Here every input format is a reader: a generator that streams the file
+# and yields compact records (`Talk` or `Publication`, both NamedTuples). The
+# records of every source go through the same loop: they are rendered in
+# batches by the shared template renderer (`templates.py`), on a process pool
+# with `--jobs`, and written through `IncrementalWriter` with the permalink
+# collision checks. Adding a format means adding a reader to `READERS`.
+#
+# Formats:
+# * `talks-tsv`, `publications-tsv`: the TSVs described in talks.py and publications.py
+# * `bibtex`: BibTeX, parsed with pybtex and cached in `.bibcache.pickle` (see bibcache.py)
+# * `csl-json`: CSL-JSON, as exported by Zotero, Mendeley or citeproc tools
+# * `orcid`: the JSON of ORCID's `/works` (or bulk `/works/<put-codes>`) API
+#
+# Run as a script to turn any of these into pages, for example
+# `python ingest.py works.json --output ../_publications/`; the format is
+# guessed from the file unless `--format` is given.
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import strptime
+from typing import NamedTuple
+
+from bibcache import BibCache, split_bib, DEFAULT_CACHE_FILE
+from incremental import IncrementalWriter
+from permalinks import PermalinkCollision
+from templates import renderer
+from textnorm import html_escape, strip_latex, slugify
+from tsvstream import read_rows, batched
+
+# Shared timing and profiling hooks; see scripts/instrumentation.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import instrumentation
+
+# Rendering tasks in flight per worker process; bounds the pages held in memory
+TASKS_AHEAD = 4
+
+
+# ## Records
+#
+# `page` is the file name without `.md`, which is also the last part of the
+# permalink. Optional fields are empty strings rather than None, so layouts can
+# test them with a length check.
+
+class Talk(NamedTuple):
+    page: str
+    title: str
+    type: str
+    venue: str
+    date: str
+    location: str
+    talk_url: str
+    description: str
+
+
+class Publication(NamedTuple):
+    page: str
+    title: str
+    date: str
+    venue: str
+    excerpt: str
+    paper_url: str
+    citation: str
+
+
+def page_name(date, title):
+    """`date-slug` page name for a publication without a `url_slug`."""
+    return (date + "-" + slugify(title)).replace("--", "-")
+
+
+def format_citation(authors, title, venue, year):
+    """Citation in the style pubsFromBib.py has always used: authors, quoted
+    title, venue and year."""
+    citation = "".join(" " + author + ", " for author in authors)
+    citation += "\"" + html_escape(title) + ".\""
+    if venue:
+        citation += " " + html_escape(venue) + ","
+    return citation + " " + year + "."
+
+
+def _author(first, last):
+    return " ".join(name for name in (first, last) if name)
+
+
+def _missing_field(error, key, title):
+    return f'WARNING Missing Expected Field {error} from entry {key}: " {title[:30]} {"..."*(len(title)>30)} "'
+
+
+# ## TSV readers
+
+def talk_record(row):
+    """Talk for one row of talks.tsv; `type` defaults to "Talk"."""
+    return Talk(row["date"] + "-" + row["url_slug"], row["title"],
+                row["type"] if len(row["type"]) > 3 else "Talk", row["venue"], row["date"],
+                row["location"], row["talk_url"], row["description"])
+
+
+def publication_record(row):
+    """Publication for one row of publications.tsv."""
+    return Publication(row["pub_date"] + "-" + row["url_slug"], row["title"], row["pub_date"],
+                       row["venue"], row["excerpt"], row["paper_url"], row["citation"])
+
+
+def talk_columns(frame):
+    """talk_record() for a DataFrame of talks.tsv: a column per record field."""
+    from tsvframe import concat_columns
+
+    return {"page": concat_columns(frame["date"], "-", frame["url_slug"]), "title": frame["title"],
+            "type": frame["type"].where(frame["type"].str.len() > 3, "Talk"), "venue": frame["venue"],
+            "date": frame["date"], "location": frame["location"], "talk_url": frame["talk_url"],
+            "description": frame["description"]}
+
+
+def publication_columns(frame):
+    """publication_record() for a DataFrame of publications.tsv."""
+    from tsvframe import concat_columns
+
+    return {"page": concat_columns(frame["pub_date"], "-", frame["url_slug"]), "title": frame["title"],
+            "date": frame["pub_date"], "venue": frame["venue"], "excerpt": frame["excerpt"],
+            "paper_url": frame["paper_url"], "citation": frame["citation"]}
+
+
+def read_talks_tsv(path, session):
+    for row in read_rows(path):
+        yield talk_record(row)
+
+
+def read_publications_tsv(path, session):
+    for row in read_rows(path):
+        yield publication_record(row)
+
+
+# ## BibTeX reader
+
+def parse_chunk(text):
+    """Parse bibtex source into plain, picklable (bib_id, fields, persons) tuples."""
+    from pybtex.database.input import bibtex
+
+    bibdata = bibtex.Parser().parse_string(text)
+    entries = []
+    for bib_id, entry in bibdata.entries.items():
+        fields = {key.lower(): value for key, value in entry.fields.items()}
+        persons = {role.lower(): [(list(p.first_names), list(p.last_names)) for p in people]
+                   for role, people in entry.persons.items()}
+        entries.append((bib_id, fields, persons))
+    return entries
+
+
+def bibtex_record(b, persons, venuekey="journal", venue_pretext=""):
+    """Publication for one parsed entry; raises KeyError for a missing field."""
+    #reset default date
+    pub_month = "01"
+    pub_day = "01"
+
+    pub_year = f'{b["year"]}'
+
+    #todo: this hack for month and day needs some cleanup
+    if "month" in b.keys():
+        if(len(b["month"])<3):
+            pub_month = "0"+b["month"]
+            pub_month = pub_month[-2:]
+        elif(b["month"] not in range(12)):
+            tmnth = strptime(b["month"][:3],'%b').tm_mon
+            pub_month = "{:02d}".format(tmnth)
+        else:
+            pub_month = str(b["month"])
+    if "day" in b.keys():
+        pub_day = str(b["day"])
+
+    pub_date = pub_year+"-"+pub_month+"-"+pub_day
+
+    #strip out {} as needed (some bibtex entries that maintain formatting)
+    title = strip_latex(b["title"])
+
+    #citation authors - todo - add highlighting for primary author?
+    authors = [_author(first_names[0] if first_names else "", last_names[0] if last_names else "")
+               for first_names, last_names in persons["author"]]
+
+    #add venue logic depending on citation type
+    venue = venue_pretext+strip_latex(b[venuekey])
+
+    return Publication(page_name(pub_date, title), title, pub_date, venue, b.get("note", ""),
+                       b.get("url", ""), format_citation(authors, title, venue, pub_year))
+
+
+def read_bibtex(path, session, venuekey="journal", venue_pretext=""):
+    """Stream the entries of a bib file; parsing runs on the session's pool and
+    goes through the bib cache."""
+    def parse_many(texts):
+        return list(session.map(parse_chunk, texts))
+
+    cache = session.bib_cache
+    if cache is not None:
+        entries = cache.entries(path, parse_many)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = [entry for chunk in parse_many(split_bib(f.read())) for entry in chunk]
+
+    seen = set()
+    for bib_id, b, persons in entries:
+        # A key repeated across chunks would have been rejected by a single parse
+        if bib_id in seen:
+            print(f"WARNING Duplicate entry {bib_id} in {path}, skipping")
+            continue
+        seen.add(bib_id)
+        # field may not exist for a reference
+        try:
+            record = bibtex_record(b, persons, venuekey, venue_pretext)
+        except KeyError as e:
+            if not session.quiet:
+                print(_missing_field(e, bib_id, b.get("title", "")))
+            continue
+        if not session.quiet:
+            print(f'SUCCESSFULLY PARSED {bib_id}: " {b["title"][:60]} {"..."*(len(b["title"])>60)} "')
+        yield record
+
+
+# ## CSL-JSON reader
+
+_whitespace = re.compile(r"\s*")
+
+
+def _json_items(path):
+    """Yield the items of a top-level JSON array one at a time, so only one
+    decoded item is held at once; a top-level object is a single item."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    position = _whitespace.match(text).end()
+    if not text.startswith("[", position):
+        yield json.loads(text)
+        return
+    position = _whitespace.match(text, position + 1).end()
+    while not text.startswith("]", position):
+        item, position = decoder.raw_decode(text, position)
+        yield item
+        position = _whitespace.match(text, position).end()
+        if text.startswith(",", position):
+            position = _whitespace.match(text, position + 1).end()
+
+
+def csl_record(item, venue_pretext=""):
+    """Publication for one CSL-JSON item; raises KeyError for a missing field."""
+    title = item["title"]
+    parts = item["issued"]["date-parts"][0]
+    year = str(parts[0])
+    month = f"{int(parts[1]):02d}" if len(parts) > 1 else "01"
+    day = f"{int(parts[2]):02d}" if len(parts) > 2 else "01"
+    date = f"{year}-{month}-{day}"
+
+    venue = item.get("container-title") or item.get("collection-title") or item.get("publisher") or ""
+    if isinstance(venue, list):
+        venue = venue[0] if venue else ""
+    if venue:
+        venue = venue_pretext + venue
+
+    authors = []
+    for author in item.get("author", []):
+        given = (author.get("given") or "").split()
+        authors.append(author.get("literal") or _author(given[0] if given else "", author.get("family", "")))
+    url = item.get("URL") or ("https://doi.org/" + item["DOI"] if item.get("DOI") else "")
+
+    return Publication(page_name(date, title), title, date, venue, item.get("note", ""), url,
+                       format_citation(authors, title, venue, year))
+
+
+def read_csl_json(path, session, venue_pretext=""):
+    for item in _json_items(path):
+        try:
+            yield csl_record(item, venue_pretext)
+        except (KeyError, IndexError) as e:
+            if not session.quiet:
+                print(_missing_field(e, item.get("id", "?"), str(item.get("title", ""))))
+
+
+# ## ORCID reader
+#
+# ORCID returns `null` for anything that is not set, so fields are looked up
+# with `_orcid_value`. The `/works` summaries have no contributors; the full
+# records from `/works/<put-codes>` (as fetched by OrcidToBib.ipynb) do.
+
+def _orcid_value(work, *keys):
+    for key in keys:
+        if not isinstance(work, dict) or work.get(key) is None:
+            return ""
+        work = work[key]
+    return str(work)
+
+
+def _orcid_works(data):
+    if isinstance(data, list):
+        works = data
+    elif "bulk" in data:
+        works = [item.get("work") for item in data["bulk"]]
+    elif "group" in data:
+        works = [group["work-summary"][0] for group in data["group"] if group.get("work-summary")]
+    else:
+        works = [data]
+    return [work for work in works if work]
+
+
+def orcid_record(work, venue_pretext=""):
+    """Publication for one ORCID work; raises KeyError for a missing field."""
+    title = _orcid_value(work, "title", "title", "value")
+    if not title:
+        raise KeyError("title")
+    year = _orcid_value(work, "publication-date", "year", "value")
+    if not year:
+        raise KeyError("publication-date")
+    month = _orcid_value(work, "publication-date", "month", "value") or "01"
+    day = _orcid_value(work, "publication-date", "day", "value") or "01"
+    date = f"{year}-{month}-{day}"
+
+    venue = _orcid_value(work, "journal-title", "value")
+    if venue:
+        venue = venue_pretext + venue
+
+    authors = []
+    for contributor in (work.get("contributors") or {}).get("contributor") or []:
+        name = _orcid_value(contributor, "credit-name", "value").split()
+        role = _orcid_value(contributor, "contributor-attributes", "contributor-role")
+        if name and role.lower() in ("", "author"):
+            authors.append(_author(name[0], name[-1] if len(name) > 1 else ""))
+
+    url = _orcid_value(work, "url", "value")
+    for external_id in (work.get("external-ids") or {}).get("external-id") or []:
+        if not url and _orcid_value(external_id, "external-id-type") == "doi":
+            url = "https://doi.org/" + _orcid_value(external_id, "external-id-value")
+
+    return Publication(page_name(date, title), title, date, venue,
+                       _orcid_value(work, "short-description"), url,
+                       format_citation(authors, title, venue, year))
+
+
+def read_orcid(path, session, venue_pretext=""):
+    with open(path, "r", encoding="utf-8") as f:
+        works = _orcid_works(json.load(f))
+    for work in works:
+        try:
+            yield orcid_record(work, venue_pretext)
+        except KeyError as e:
+            if not session.quiet:
+                print(_missing_field(e, work.get("put-code", "?"),
+                                     _orcid_value(work, "title", "title", "value")))
+
+
+# ## Sources
+
+# Reader for each format, and the layout its pages use by default
+READERS = {
+    "talks-tsv": read_talks_tsv,
+    "publications-tsv": read_publications_tsv,
+    "bibtex": read_bibtex,
+    "csl-json": read_csl_json,
+    "orcid": read_orcid,
+}
+DEFAULT_LAYOUTS = {
+    "talks-tsv": "talk",
+    "publications-tsv": "manuscript",
+    "bibtex": "publication",
+    "csl-json": "publication",
+    "orcid": "publication",
+}
+
+# Formats that --vectorized reads into a DataFrame, and their record columns
+FRAME_COLUMNS = {
+    "talks-tsv": talk_columns,
+    "publications-tsv": publication_columns,
+}
+
+
+def detect_format(path):
+    """Guess the format of an input file from its extension and first bytes."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".bib":
+        return "bibtex"
+    if extension == ".tsv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            header = next(csv.reader(f, delimiter="\t"), [])
+        if "pub_date" in header:
+            return "publications-tsv"
+        if "talk_url" in header or "location" in header:
+            return "talks-tsv"
+    if extension == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            head = f.read(65536)
+        if '"put-code"' in head or '"work-summary"' in head:
+            return "orcid"
+        return "csl-json"
+    raise ValueError(f"cannot tell the format of {path}; pass one of {', '.join(READERS)}")
+
+
+class Source:
+    """One input file, with its format, the layout of its pages and reader options."""
+
+    def __init__(self, path, format=None, layout=None, collection=None, permalink=None, **options):
+        """`collection` and `permalink` override the layout's defaults; other
+        keywords go to the reader (`venuekey` and `venue_pretext` for bibtex)."""
+        self.path = path
+        self.format = format or detect_format(path)
+        if self.format not in READERS:
+            raise ValueError(f"unknown format {self.format!r}; use one of {', '.join(READERS)}")
+        self.layout = layout or DEFAULT_LAYOUTS[self.format]
+        self.constants = {name: value for name, value in (("collection", collection), ("permalink", permalink))
+                          if value is not None}
+        self.options = options
+
+
+class Session:
+    """What the readers of one run share: the process pool and the bib cache."""
+
+    def __init__(self, jobs=1, cache_file=DEFAULT_CACHE_FILE, quiet=False, vectorized=False):
+        # Resolved here rather than read back from the executor, which keeps it private
+        self.workers = jobs or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers) if jobs != 1 else None
+        self.cache_file = cache_file
+        self.quiet = quiet
+        self.vectorized = vectorized
+        self._bib_cache = None
+
+    @property
+    def bib_cache(self):
+        """The BibCache, loaded on first use; None when caching is off."""
+        if self._bib_cache is None and self.cache_file:
+            self._bib_cache = BibCache(self.cache_file)
+        return self._bib_cache
+
+    def map(self, function, items):
+        """Lazy map() over the pool, in order, with a bounded number of tasks in flight."""
+        if self.pool is None:
+            yield from map(function, items)
+            return
+        pending = deque()
+        for item in items:
+            pending.append(self.pool.submit(function, item))
+            if len(pending) >= self.workers * TASKS_AHEAD:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        if self._bib_cache is not None:
+            with instrumentation.phase("save_cache"):
+                self._bib_cache.save()
+            instrumentation.record(self._bib_cache.stats())
+            if not self.quiet:
+                print("bib cache: " + self._bib_cache.summary())
+        if self.pool:
+            self.pool.shutdown()
+
+
+def _render_batch(task):
+    layout, constants, records = task
+    render = renderer(layout, **constants)
+    return [render(record) for record in records]
+
+
+def pages(source, session):
+    """Yield the rendered (filename, markdown) pages of a source in batches, in input order."""
+    columns = FRAME_COLUMNS.get(source.format) if session.vectorized else None
+    if columns is not None:
+        from tsvframe import read_frame, chunks, render_frame
+
+        for chunk in chunks(read_frame(source.path)):
+            yield render_frame(columns(chunk), source.layout, **source.constants)
+        return
+    records = READERS[source.format](source.path, session, **source.options)
+    yield from session.map(_render_batch, ((source.layout, source.constants, batch)
+                                          for batch in batched(records)))
+
+
+def generate(sources, output_dir, generator, jobs=1, full=False, collisions="rename", quiet=False,
+             vectorized=False, cache_file=DEFAULT_CACHE_FILE):
+    """Read, render and write the pages of every source; returns the number of pages.
+
+    All sources share one IncrementalWriter, so pages of a source that was
+    dropped are removed. `jobs` worker processes parse and render (0 = one per
+    CPU); `collisions` is passed on to IncrementalWriter; `vectorized` renders
+    TSV sources column-wise with pandas (see tsvframe.py).
+    """
+    session = Session(jobs, cache_file, quiet, vectorized)
+    generated = 0
+    try:
+        with instrumentation.phase("generate"), \
+                IncrementalWriter(output_dir, generator, full=full, collisions=collisions) as writer:
+            for source in sources:
+                for batch in pages(source, session):
+                    with instrumentation.phase("write", files=len(batch)):
+                        writer.write_many(batch)
+                    instrumentation.count("records", len(batch))
+                    generated += len(batch)
+    finally:
+        session.close()
+    instrumentation.record(writer.stats())
+    if not quiet:
+        print(f"{generator}: {writer.summary()}")
+    return generated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate pages from TSV, BibTeX, CSL-JSON or ORCID files")
+    parser.add_argument("sources", nargs="+", metavar="FILE", help="input files, rendered in this order")
+    parser.add_argument("--format", choices=sorted(READERS), help="format of every input (default: guessed)")
+    parser.add_argument("--layout", help="page layout (default: talk, manuscript or publication by format)")
+    parser.add_argument("--output", help="output folder (default: ../_talks/ for talks, else ../_publications/)")
+    parser.add_argument("--generator", help="name of the pages in the output manifest (default: from the inputs)")
+    parser.add_argument("--collection", help="collection name written into the pages")
+    parser.add_argument("--permalink", help="permalink prefix, for example /publication/")
+    parser.add_argument("--venuekey", default="journal", help="BibTeX field holding the venue")
+    parser.add_argument("--venue-pretext", default="", help='text put before the venue, e.g. "In the proceedings of "')
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="worker processes for parsing and rendering (0 = one per CPU)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="parse every bib file from scratch instead of using " + DEFAULT_CACHE_FILE)
+    parser.add_argument("--full", action="store_true",
+                        help="rewrite every file, even if its content is unchanged")
+    parser.add_argument("--fail-on-collision", action="store_true",
+                        help="stop if two pages would share a file name or permalink, instead of renaming")
+    parser.add_argument("--vectorized", action="store_true", help="render TSV inputs column-wise with pandas")
+    args = parser.parse_args()
+
+    try:
+        sources = []
+        for path in args.sources:
+            format = args.format or detect_format(path)
+            options = {}
+            if format != "talks-tsv" and format != "publications-tsv":
+                options["venue_pretext"] = args.venue_pretext
+            if format == "bibtex":
+                options["venuekey"] = args.venuekey
+            sources.append(Source(path, format, args.layout, args.collection, args.permalink, **options))
+    except (OSError, ValueError) as error:
+        sys.exit(f"ingest: {error}")
+    generator = args.generator or "ingest-" + "-".join(
+        os.path.splitext(os.path.basename(path))[0] for path in args.sources)
+    output_dir = args.output or ("../_talks/" if all(source.layout == "talk" for source in sources)
+                                 else "../_publications/")
+
+    if args.vectorized:
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            sys.exit(f"{generator}: --vectorized needs pandas; install it or run without the flag")
+
+    instrumentation.start(generator)
+    try:
+        generate(sources, output_dir, generator, jobs=args.jobs, full=args.full,
+                 collisions="fail" if args.fail_on_collision else "rename",
+                 vectorized=args.vectorized, cache_file=None if args.no_cache else DEFAULT_CACHE_FILE)
+    except PermalinkCollision as error:
+        sys.exit(f"{generator}: {error}; nothing was written")
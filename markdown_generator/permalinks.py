@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Permalink collision index for the markdown generators
+#
+# Pages are named `date-url_slug`, so two rows of a TSV, or two BibTeX entries
+# with the same date and a similar title, can map to the same file and
+# permalink, and the second page silently replaces the first. `PermalinkIndex`
+# keeps every permalink served by the site collections, and every file name in
+# the output folder, in two dicts built once per run from the front matter of
+# the existing pages. Each generated page is checked and added as it is
+# written, so a collision costs one lookup instead of a scan of the output
+# folders afterwards.
+#
+# A colliding page is renamed deterministically: `-2`, `-3`, ... is appended to
+# its file name and permalink, in input order. With `fail=True` the run stops
+# with `PermalinkCollision` instead, before any file is moved into place.
+# Names are compared case-insensitively, since the site is often built on
+# case-insensitive file systems.
+
+import os
+
+# Collections whose permalinks generated pages must not reuse
+COLLECTIONS = ("_publications", "_talks", "_teaching", "_portfolio")
+
+
+class PermalinkCollision(Exception):
+    """A generated page would reuse a file name or permalink that is already taken."""
+
+
+def read_permalink(path):
+    """Return the permalink set in the front matter of a Markdown file, or None.
+
+    Only the front matter lines are read; the value is not YAML-parsed beyond
+    stripping quotes, which is all a permalink needs.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if f.readline().rstrip() != "---":
+            return None
+        for line in f:
+            if line.rstrip() == "---":
+                return None
+            if line.startswith("permalink:"):
+                return line[len("permalink:"):].strip().strip("'\"") or None
+    return None
+
+
+def page_permalink(content):
+    """Return (permalink, start, end) for the permalink line of a rendered page,
+    where content[start:end] is the value, or None if the page has none."""
+    marker = "\npermalink: "
+    start = content.find(marker)
+    end_of_front_matter = content.find("\n---", 3)
+    if start < 0 or (0 <= end_of_front_matter < start):
+        return None
+    start += len(marker)
+    end = content.find("\n", start)
+    if end < 0:
+        end = len(content)
+    return content[start:end], start, end
+
+
+def _key(permalink):
+    return "/" + permalink.strip("/").casefold()
+
+
+def _with_suffix(permalink, suffix):
+    if permalink.endswith("/"):
+        return f"{permalink[:-1]}-{suffix}/"
+    return f"{permalink}-{suffix}"
+
+
+class PermalinkIndex:
+    """Permalinks and output file names in use, and the page that claimed each."""
+
+    def __init__(self, site_root, output_dir, owned=(), adoptable=(), fail=False,
+                 collections=COLLECTIONS):
+        """Index the pages of `collections` under `site_root`, and of `output_dir`.
+
+        Files in `output_dir` named in `owned` are left out: they belong to the
+        generator being run, which is about to rewrite or remove them. Files
+        named in `adoptable` may be overwritten by a generated page of the same
+        name, but still hold their permalink against any other page.
+        """
+        self.fail = fail
+        self.permalinks = {}
+        self.filenames = {}
+        self.adoptable = {}
+        self.renamed = 0
+
+        output_dir = os.path.abspath(output_dir)
+        directories = [os.path.abspath(os.path.join(site_root, name)) for name in collections]
+        if output_dir not in directories:
+            directories.append(output_dir)
+        owned = set(owned)
+        adoptable = set(adoptable)
+        for directory in directories:
+            if not os.path.isdir(directory):
+                continue
+            in_output = directory == output_dir
+            collection = os.path.basename(directory).lstrip("_")
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith(".md") or (in_output and name in owned):
+                    continue
+                owner = os.path.join(os.path.basename(directory), name)
+                # Jekyll's default for the collections is /:collection/:path/
+                permalink = read_permalink(os.path.join(directory, name)) or f"/{collection}/{name[:-3]}/"
+                self.permalinks.setdefault(_key(permalink), owner)
+                if in_output:
+                    self.filenames[name.casefold()] = owner
+                    if name in adoptable:
+                        self.adoptable[name.casefold()] = owner
+
+    def _owner(self, filename, permalink):
+        """The page holding `filename` or `permalink`, other than an adoptable
+        file of the same name; None if both are free."""
+        replaced = self.adoptable.get(filename.casefold())
+        owner = self.filenames.get(filename.casefold())
+        if owner is not None and owner != replaced:
+            return owner
+        owner = self.permalinks.get(_key(permalink)) if permalink is not None else None
+        if owner is not None and owner != replaced:
+            return owner
+        return None
+
+    def claim(self, filename, content):
+        """Register a generated page and return its (filename, content).
+
+        If the file name or permalink is taken, returns the page renamed to the
+        first free `-N` suffix, or raises PermalinkCollision when failing fast.
+        """
+        found = page_permalink(content)
+        permalink = found[0] if found else None
+        owner = self._owner(filename, permalink)
+        if owner is not None:
+            if self.fail:
+                raise PermalinkCollision(
+                    f"{filename} ({permalink}) collides with {owner}")
+            stem = filename[:-3] if filename.endswith(".md") else filename
+            suffix = 2
+            while self._owner(f"{stem}-{suffix}.md",
+                              permalink and _with_suffix(permalink, suffix)) is not None:
+                suffix += 1
+            renamed = f"{stem}-{suffix}.md"
+            print(f"WARNING {filename} collides with {owner}; writing it as {renamed}")
+            if found:
+                permalink = _with_suffix(permalink, suffix)
+                content = content[:found[1]] + permalink + content[found[2]:]
+            filename = renamed
+            self.renamed += 1
+
+        owner = f"{filename} (generated in this run)"
+        self.adoptable.pop(filename.casefold(), None)
+        self.filenames[filename.casefold()] = owner
+        if permalink is not None:
+            self.permalinks[_key(permalink)] = owner
+        return filename, content
@@ -5,7 +5,7 @@
 # 
 # Takes a TSV of publications with metadata and converts them for use with [academicpages.github.io](academicpages.github.io). This is an interactive Jupyter notebook, with the core python code in publications.py. Run either from the `markdown_generator` folder after replacing `publications.tsv` with one that fits your format.
 # 
-# TODO: Make this work with BibTex and other databases of citations, rather than Stuart's non-standard TSV format and citation style.
+# The TSV is one of the sources of the shared ingestion engine in `ingest.py`; BibTeX, CSL-JSON and ORCID exports go through the same engine (see `pubsFromBib.py` and the readme).
 # 
 
 # ## Data format
@@ -17,93 +17,84 @@
 # - `url_slug` will be the descriptive part of the .md file and the permalink URL for the page about the paper. The .md file will be `YYYY-MM-DD-[url_slug].md` and the permalink will be `https://[yourdomain]/publications/YYYY-MM-DD-[url_slug]`
 
 
-# ## Import pandas
+# ## Imports
 # 
-# We are using the very handy pandas library for dataframes.
+# The TSV is streamed with the standard `csv` module by the ingestion engine, so there is no need for pandas. The optional `--vectorized` mode below reads it with pandas instead.
 
 # In[2]:
 
-import pandas as pd
+import os
+import sys
+from ingest import Source, generate, publication_record, publication_columns
+from permalinks import PermalinkCollision
+from templates import render
+
+# Shared timing and profiling hooks; see scripts/instrumentation.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import instrumentation
 
 
 # ## Import TSV
 # 
-# Pandas makes this easy with the read_csv function. We are using a TSV, so we specify the separator as a tab, or `\t`.
+# The rows are streamed from the TSV one at a time, so only the row being rendered is held in memory. Each row becomes a compact `Publication` record (see `ingest.py`). We are using a TSV, so the separator is a tab, or `\t`.
 # 
-# I found it important to put this data in a tab-separated values format, because there are a lot of commas in this kind of data and comma-separated values can get messed up. However, you can modify the import statement, as pandas also has read_excel(), read_json(), and others.
+# I found it important to put this data in a tab-separated values format, because there are a lot of commas in this kind of data and comma-separated values can get messed up.
 
 # In[3]:
 
-publications = pd.read_csv("publications.tsv", sep="\t", header=0)
-publications
+publications = Source("publications.tsv", "publications-tsv")
 
 
 # ## Escape special characters
 # 
 # YAML is very picky about how it takes a valid string, so we are replacing single and double quotes (and ampersands) with their HTML encoded equivilents. This makes them look not so readable in raw format, but they are parsed and rendered nicely.
+# 
+# The title and paper URL are not escaped, so they are quoted with `yaml_quote` and `yaml_single_quote` instead, which leaves ordinary values unchanged. All three helpers live in `textnorm.py` and are shared with the other generators; the `manuscript` layout in `templates.py` says which field gets which.
 
-# In[4]:
 
-html_escape_table = {
-    "&": "&amp;",
-    '"': "&quot;",
-    "'": "&apos;"
-    }
+# ## Creating the markdown files
+# 
+# This is where the heavy lifting is done. Each record is rendered from the `manuscript` layout in `templates.py`: the YAML metadata first, then the description for the individual page. The layout is compiled once into `str.format` templates, and parts for blank fields are left out. If you don't want something to appear (like the "Recommended citation") remove it from the layout. Rendered files are handed to the writer in batches.
+# 
+# Files whose content has not changed since the last run are not rewritten, and files for rows that were removed from the TSV are deleted. Pass `--full` to rewrite everything.
+# 
+# Two rows with the same date and `url_slug`, or a page whose permalink is already used by another collection, no longer overwrite each other: the later page gets a `-2` (`-3`, ...) suffix and a warning is printed. Pass `--fail-on-collision` to stop with an error instead.
 
-def html_escape(text):
-    """Produce entities within text."""
-    return "".join(html_escape_table.get(c,c) for c in text)
+# In[5]:
 
+def render_publication(item):
+    """Return the (filename, markdown) pair for one row of the TSV."""
+    return render(publication_record(item), "manuscript")
 
-# ## Creating the markdown files
+
+# ## Column-wise mode
 # 
-# This is where the heavy lifting is done. This loops through all the rows in the TSV dataframe, then starts to concatentate a big string (```md```) that contains the markdown for each type. It does the YAML metadata first, then does the description for the individual page. If you don't want something to appear (like the "Recommended citation")
+# With `--vectorized` the TSV is read into a pandas DataFrame, and each field is rendered for a whole chunk of rows at once with the helpers in `tsvframe.py`: filenames and permalinks, the masks for the optional fields, the escaped columns and the concatenation of the page, from the same `manuscript` layout. Only the writes are per row. The output is byte-for-byte the same as `render_publication`; install pyarrow as well to make it fast.
 
-# In[5]:
+# In[6]:
 
-import os
-for row, item in publications.iterrows():
-    
-    md_filename = str(item.pub_date) + "-" + item.url_slug + ".md"
-    html_filename = str(item.pub_date) + "-" + item.url_slug
-    year = item.pub_date[:4]
-    
-    ## YAML variables
-    
-    md = "---\ntitle: \""   + item.title + '"\n'
-
-    # TODO Update to use the category assigned in the TSV file
-    md += """collection: manuscripts"""
-    
-    md += """\npermalink: /publication/""" + html_filename
-    
-    if len(str(item.excerpt)) > 5:
-        md += "\nexcerpt: '" + html_escape(item.excerpt) + "'"
-    
-    md += "\ndate: " + str(item.pub_date) 
-    
-    md += "\nvenue: '" + html_escape(item.venue) + "'"
-    
-    if len(str(item.paper_url)) > 5:
-        md += "\npaperurl: '" + item.paper_url + "'"
-    
-    md += "\ncitation: '" + html_escape(item.citation) + "'"
-    
-    md += "\n---"
-    
-    ## Markdown description for individual page
-    
-    if len(str(item.paper_url)) > 5:
-        md += "\n\n<a href='" + item.paper_url + "'>Download paper here</a>\n" 
-        
-    if len(str(item.excerpt)) > 5:
-        md += "\n" + html_escape(item.excerpt) + "\n"
-        
-    md += "\nRecommended citation: " + item.citation
-    
-    md_filename = os.path.basename(md_filename)
-       
-    with open("../_publications/" + md_filename, 'w') as f:
-        f.write(md)
+def render_publications(frame):
+    """Return the (filename, markdown) pairs for a chunk of the TSV read into a DataFrame."""
+    from tsvframe import render_frame
+
+    return render_frame(publication_columns(frame), "manuscript")
+
+
+# The files are only written when this is run as a script, so the functions above
+# can be imported (for example by the benchmarks) without side effects.
 
+if __name__ == "__main__":
+    instrumentation.start("publications")
+    vectorized = "--vectorized" in sys.argv
+    if vectorized:
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            sys.exit("publications: --vectorized needs pandas; install it or run without the flag")
 
+    collisions = "fail" if "--fail-on-collision" in sys.argv else "rename"
+    try:
+        generate([publications], "../_publications/", "publications", full="--full" in sys.argv,
+                 collisions=collisions, vectorized=vectorized)
+    except PermalinkCollision as error:
+        sys.exit(f"publications: {error}; nothing was written")
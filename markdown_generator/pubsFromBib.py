@@ -12,17 +12,38 @@
 # * any specific pre-text for specific files
 # * Collection Name (future feature)
 # 
-# TODO: Make this work with other databases of citations, 
-# TODO: Merge this with the existing TSV parsing solution
-
-
-from pybtex.database.input import bibtex
-import pybtex.database.input.bibtex 
-from time import strptime
-import string
-import html
+# Each bib file is a `bibtex` source of the ingestion engine in `ingest.py`, which
+# the TSV generators use too; CSL-JSON and ORCID exports can be turned into the
+# same pages with `python ingest.py FILE` (see the readme).
+#
+# Pass `--jobs N` to parse the bib files and render the entries on a pool of N
+# worker processes (`--jobs 0` uses one per CPU). Output files and log lines are
+# produced in the same order as a serial run.
+#
+# Parsed entries are cached in `.bibcache.pickle`, so unchanged bib files are not
+# parsed again and only new or edited entries of a changed file are. Pass
+# `--no-cache` to parse everything from scratch.
+#
+# Pages are written through the same `IncrementalWriter` as `publications.py`:
+# unchanged files are skipped, changed ones are staged and moved into place only
+# when the run succeeds. Pass `--full` to rewrite every file.
+#
+# Entries with the same date and a similar title map to the same page. The
+# later one is written with a `-2` (`-3`, ...) suffix on its file name and
+# permalink, and a warning is printed; pass `--fail-on-collision` to stop
+# instead. Permalinks of the other collections are checked as well.
+
+
+import argparse
 import os
-import re
+import sys
+from bibcache import DEFAULT_CACHE_FILE
+import ingest
+from permalinks import PermalinkCollision
+
+# Shared timing and profiling hooks; see scripts/instrumentation.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import instrumentation
 
 #todo: incorporate different collection types rather than a catch all publications, requires other changes to template
 publist = {
@@ -43,118 +64,40 @@ publist = {
     } 
 }
 
-html_escape_table = {
-    "&": "&amp;",
-    '"': "&quot;",
-    "'": "&apos;"
-    }
-
-def html_escape(text):
-    """Produce entities within text."""
-    return "".join(html_escape_table.get(c,c) for c in text)
-
-
-for pubsource in publist:
-    parser = bibtex.Parser()
-    bibdata = parser.parse_file(publist[pubsource]["file"])
-
-    #loop through the individual references in a given bibtex file
-    for bib_id in bibdata.entries:
-        #reset default date
-        pub_year = "1900"
-        pub_month = "01"
-        pub_day = "01"
-        
-        b = bibdata.entries[bib_id].fields
-        
-        try:
-            pub_year = f'{b["year"]}'
-
-            #todo: this hack for month and day needs some cleanup
-            if "month" in b.keys(): 
-                if(len(b["month"])<3):
-                    pub_month = "0"+b["month"]
-                    pub_month = pub_month[-2:]
-                elif(b["month"] not in range(12)):
-                    tmnth = strptime(b["month"][:3],'%b').tm_mon   
-                    pub_month = "{:02d}".format(tmnth) 
-                else:
-                    pub_month = str(b["month"])
-            if "day" in b.keys(): 
-                pub_day = str(b["day"])
-
-                
-            pub_date = pub_year+"-"+pub_month+"-"+pub_day
-            
-            #strip out {} as needed (some bibtex entries that maintain formatting)
-            clean_title = b["title"].replace("{", "").replace("}","").replace("\\","").replace(" ","-")    
-
-            url_slug = re.sub("\\[.*\\]|[^a-zA-Z0-9_-]", "", clean_title)
-            url_slug = url_slug.replace("--","-")
-
-            md_filename = (str(pub_date) + "-" + url_slug + ".md").replace("--","-")
-            html_filename = (str(pub_date) + "-" + url_slug).replace("--","-")
-
-            #Build Citation from text
-            citation = ""
-
-            #citation authors - todo - add highlighting for primary author?
-            for author in bibdata.entries[bib_id].persons["author"]:
-                citation = citation+" "+author.first_names[0]+" "+author.last_names[0]+", "
-
-            #citation title
-            citation = citation + "\"" + html_escape(b["title"].replace("{", "").replace("}","").replace("\\","")) + ".\""
-
-            #add venue logic depending on citation type
-            venue = publist[pubsource]["venue-pretext"]+b[publist[pubsource]["venuekey"]].replace("{", "").replace("}","").replace("\\","")
-
-            citation = citation + " " + html_escape(venue)
-            citation = citation + ", " + pub_year + "."
-
-            
-            ## YAML variables
-            md = "---\ntitle: \""   + html_escape(b["title"].replace("{", "").replace("}","").replace("\\","")) + '"\n'
-            
-            md += """collection: """ +  publist[pubsource]["collection"]["name"]
-
-            md += """\npermalink: """ + publist[pubsource]["collection"]["permalink"]  + html_filename
-            
-            note = False
-            if "note" in b.keys():
-                if len(str(b["note"])) > 5:
-                    md += "\nexcerpt: '" + html_escape(b["note"]) + "'"
-                    note = True
-
-            md += "\ndate: " + str(pub_date) 
-
-            md += "\nvenue: '" + html_escape(venue) + "'"
-            
-            url = False
-            if "url" in b.keys():
-                if len(str(b["url"])) > 5:
-                    md += "\npaperurl: '" + b["url"] + "'"
-                    url = True
-
-            md += "\ncitation: '" + html_escape(citation) + "'"
-
-            md += "\n---"
-
-            
-            ## Markdown description for individual page
-            if note:
-                md += "\n" + html_escape(b["note"]) + "\n"
-
-            if url:
-                md += "\n[Access paper here](" + b["url"] + "){:target=\"_blank\"}\n" 
-            else:
-                md += "\nUse [Google Scholar](https://scholar.google.com/scholar?q="+html.escape(clean_title.replace("-","+"))+"){:target=\"_blank\"} for full citation"
-
-            md_filename = os.path.basename(md_filename)
-
-            with open("../_publications/" + md_filename, 'w', encoding="utf-8") as f:
-                f.write(md)
-            print(f'SUCCESSFULLY PARSED {bib_id}: \"', b["title"][:60],"..."*(len(b['title'])>60),"\"")
-        # field may not exist for a reference
-        except KeyError as e:
-            print(f'WARNING Missing Expected Field {e} from entry {bib_id}: \"', b["title"][:30],"..."*(len(b['title'])>30),"\"")
-            continue
+def bib_sources():
+    """One ingestion source per entry of publist, in order."""
+    return [ingest.Source(source["file"], "bibtex", "publication", source["collection"]["name"],
+                          source["collection"]["permalink"], venuekey=source["venuekey"],
+                          venue_pretext=source["venue-pretext"])
+            for source in publist.values()]
+
+
+def generate(jobs=1, output_dir="../_publications/", quiet=False, cache_file=DEFAULT_CACHE_FILE,
+             full=False, collisions="rename"):
+    """Parse, render and write every publication; returns the number of files generated.
+
+    Set `cache_file` to None to parse every bib file from scratch. Files whose
+    content is unchanged are not rewritten unless `full` is set. `collisions`
+    is passed on to IncrementalWriter.
+    """
+    return ingest.generate(bib_sources(), output_dir, "pubsFromBib", jobs=jobs, full=full,
+                           collisions=collisions, quiet=quiet, cache_file=cache_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate publication pages from bibtex files")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="worker processes for parsing and rendering (0 = one per CPU)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="parse every bib file from scratch instead of using " + DEFAULT_CACHE_FILE)
+    parser.add_argument("--full", action="store_true",
+                        help="rewrite every file, even if its content is unchanged")
+    parser.add_argument("--fail-on-collision", action="store_true",
+                        help="stop if two pages would share a file name or permalink, instead of renaming")
+    args = parser.parse_args()
+    instrumentation.start("pubsFromBib")
+    try:
+        generate(jobs=args.jobs, cache_file=None if args.no_cache else DEFAULT_CACHE_FILE, full=args.full,
+                 collisions="fail" if args.fail_on_collision else "rename")
+    except PermalinkCollision as error:
+        sys.exit(f"pubsFromBib: {error}; nothing was written")
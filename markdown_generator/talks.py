@@ -5,12 +5,19 @@
 # 
 # Takes a TSV of talks with metadata and converts them for use with [academicpages.github.io](academicpages.github.io). This is an interactive Jupyter notebook ([see more info here](http://jupyter-notebook-beginner-guide.readthedocs.io/en/latest/what_is_jupyter.html)). The core python code is also in `talks.py`. Run either from the `markdown_generator` folder after replacing `talks.tsv` with one containing your data.
 # 
-# TODO: Make this work with BibTex and other databases, rather than Stuart's non-standard TSV format and citation style.
+# The TSV is one of the sources of the shared ingestion engine in `ingest.py`, which also reads BibTeX, CSL-JSON and ORCID exports (see `pubsFromBib.py` and the readme).
 
 # In[1]:
 
-import pandas as pd
 import os
+import sys
+from ingest import Source, generate, talk_record, talk_columns
+from permalinks import PermalinkCollision
+from templates import render
+
+# Shared timing and profiling hooks; see scripts/instrumentation.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import instrumentation
 
 
 # ## Data format
@@ -27,84 +34,68 @@ import os
 
 # ## Import TSV
 # 
-# Pandas makes this easy with the read_csv function. We are using a TSV, so we specify the separator as a tab, or `\t`.
+# The rows are streamed from the TSV one at a time with the `csv` module, so only the row being rendered is held in memory. Each row becomes a compact `Talk` record (see `ingest.py`). We are using a TSV, so the separator is a tab, or `\t`.
 # 
-# I found it important to put this data in a tab-separated values format, because there are a lot of commas in this kind of data and comma-separated values can get messed up. However, you can modify the import statement, as pandas also has read_excel(), read_json(), and others.
+# I found it important to put this data in a tab-separated values format, because there are a lot of commas in this kind of data and comma-separated values can get messed up.
 
 # In[3]:
 
-talks = pd.read_csv("talks.tsv", sep="\t", header=0)
-talks
+talks = Source("talks.tsv", "talks-tsv")
 
 
 # ## Escape special characters
 # 
 # YAML is very picky about how it takes a valid string, so we are replacing single and double quotes (and ampersands) with their HTML encoded equivilents. This makes them look not so readable in raw format, but they are parsed and rendered nicely.
+# 
+# Fields that go into double-quoted front matter values (title, type, venue, location) are quoted with `yaml_quote`, so a quote or backslash in a title no longer breaks the YAML. Both helpers live in `textnorm.py` and are shared with the other generators; the `talk` layout in `templates.py` says which field gets which.
 
-# In[4]:
 
-html_escape_table = {
-    "&": "&amp;",
-    '"': "&quot;",
-    "'": "&apos;"
-    }
+# ## Creating the markdown files
+# 
+# This is where the heavy lifting is done. Each record is rendered from the `talk` layout in `templates.py`: the YAML metadata first, then the description for the individual page. The layout is compiled once into `str.format` templates, and parts for blank fields are left out. Rendered files are handed to the writer in batches.
+# 
+# Files whose content has not changed since the last run are not rewritten, and files for rows that were removed from the TSV are deleted. Pass `--full` to rewrite everything.
+# 
+# Two rows with the same date and `url_slug`, or a page whose permalink is already used by another collection, no longer overwrite each other: the later page gets a `-2` (`-3`, ...) suffix and a warning is printed. Pass `--fail-on-collision` to stop with an error instead.
 
-def html_escape(text):
-    if type(text) is str:
-        return "".join(html_escape_table.get(c,c) for c in text)
-    else:
-        return "False"
+# In[5]:
 
+def render_talk(item):
+    """Return the (filename, markdown) pair for one row of the TSV."""
+    return render(talk_record(item), "talk")
 
-# ## Creating the markdown files
+
+# ## Column-wise mode
 # 
-# This is where the heavy lifting is done. This loops through all the rows in the TSV dataframe, then starts to concatentate a big string (```md```) that contains the markdown for each type. It does the YAML metadata first, then does the description for the individual page.
+# With `--vectorized` the TSV is read into a pandas DataFrame, and each field is rendered for a whole chunk of rows at once with the helpers in `tsvframe.py`: filenames and permalinks, the masks for the optional fields, the escaped columns and the concatenation of the page, from the same `talk` layout. Only the writes are per row. The output is byte-for-byte the same as `render_talk`; install pyarrow as well to make it fast.
 
-# In[5]:
+# In[6]:
+
+def render_talks(frame):
+    """Return the (filename, markdown) pairs for a chunk of the TSV read into a DataFrame."""
+    from tsvframe import render_frame
+
+    return render_frame(talk_columns(frame), "talk")
+
+
+# The files are only written when this is run as a script, so the functions above
+# can be imported (for example by the benchmarks) without side effects.
+
+if __name__ == "__main__":
+    instrumentation.start("talks")
+    vectorized = "--vectorized" in sys.argv
+    if vectorized:
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            sys.exit("talks: --vectorized needs pandas; install it or run without the flag")
 
-loc_dict = {}
-
-for row, item in talks.iterrows():
-    
-    md_filename = str(item.date) + "-" + item.url_slug + ".md"
-    html_filename = str(item.date) + "-" + item.url_slug 
-    year = item.date[:4]
-    
-    md = "---\ntitle: \""   + item.title + '"\n'
-    md += "collection: talks" + "\n"
-    
-    if len(str(item.type)) > 3:
-        md += 'type: "' + item.type + '"\n'
-    else:
-        md += 'type: "Talk"\n'
-    
-    md += "permalink: /talks/" + html_filename + "\n"
-    
-    if len(str(item.venue)) > 3:
-        md += 'venue: "' + item.venue + '"\n'
-        
-    if len(str(item.date)) > 3:
-        md += "date: " + str(item.date) + "\n"
-    
-    if len(str(item.location)) > 3:
-        md += 'location: "' + str(item.location) + '"\n'
-           
-    md += "---\n"
-    
-    
-    if len(str(item.talk_url)) > 3:
-        md += "\n[More information here](" + item.talk_url + ")\n" 
-        
-    
-    if len(str(item.description)) > 3:
-        md += "\n" + html_escape(item.description) + "\n"
-        
-        
-    md_filename = os.path.basename(md_filename)
-    #print(md)
-    
-    with open("../_talks/" + md_filename, 'w') as f:
-        f.write(md)
+    collisions = "fail" if "--fail-on-collision" in sys.argv else "rename"
+    try:
+        generate([talks], "../_talks/", "talks", full="--full" in sys.argv, collisions=collisions,
+                 vectorized=vectorized)
+    except PermalinkCollision as error:
+        sys.exit(f"talks: {error}; nothing was written")
 
 
 # These files are in the talks directory, one directory below where we're working from.
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Page layouts and the shared template renderer
+#
+# Every generated page is rendered from a layout: a tuple of parts, each a
+# `str.format`-style template whose fields name attributes of the record being
+# rendered (see `ingest.py`). A field may name a filter after a bar, for
+# example `{title|yaml}`, and a part may be optional:
+#
+# * `"text {field}"` is always rendered;
+# * `("field", n, "text")` is rendered when `field` is longer than `n`;
+# * `("field", n, "text", "other text")` renders the second template otherwise.
+#
+# `{collection}` and `{permalink}` (or any other keyword given to
+# `compile_layout`) are constants for the whole run rather than record fields.
+# A layout is compiled once per set of constants into bound `str.format`
+# methods with positional fields and the filter functions to apply (see
+# `renderer`), so rendering a record is one `format` call per part and one join. The layouts below reproduce the pages
+# the generators always wrote, byte for byte.
+
+import html
+import os
+from functools import lru_cache
+from operator import attrgetter
+from string import Formatter
+from typing import NamedTuple
+
+from textnorm import html_escape, yaml_quote, yaml_single_quote
+
+
+def scholar_query(title):
+    """Google Scholar query for a title, as pubsFromBib.py has always built it."""
+    return html.escape(title.replace(" ", "-").replace("-", "+"))
+
+
+# Filters usable in a template field, by name; "" is the value unchanged
+FILTERS = {
+    "": str,
+    "html": html_escape,
+    "yaml": yaml_quote,
+    "yaml_single": yaml_single_quote,
+    "scholar": scholar_query,
+}
+
+# Talk pages, from talks.tsv
+TALK = (
+    "---\ntitle: {title|yaml}\ncollection: {collection}\ntype: {type|yaml}\npermalink: {permalink}{page}\n",
+    ("venue", 3, "venue: {venue|yaml}\n"),
+    ("date", 3, "date: {date}\n"),
+    ("location", 3, "location: {location|yaml}\n"),
+    "---\n",
+    ("talk_url", 3, "\n[More information here]({talk_url})\n"),
+    ("description", 3, "\n{description|html}\n"),
+)
+
+# Publication pages from publications.tsv, with a download link and the
+# recommended citation. TODO Update to use the category assigned in the TSV file
+MANUSCRIPT = (
+    "---\ntitle: {title|yaml}\ncollection: {collection}\npermalink: {permalink}{page}",
+    ("excerpt", 5, "\nexcerpt: '{excerpt|html}'"),
+    "\ndate: {date}\nvenue: '{venue|html}'",
+    ("paper_url", 5, "\npaperurl: {paper_url|yaml_single}"),
+    "\ncitation: '{citation|html}'\n---",
+    ("paper_url", 5, "\n\n<a href='{paper_url}'>Download paper here</a>\n"),
+    ("excerpt", 5, "\n{excerpt|html}\n"),
+    "\nRecommended citation: {citation}",
+)
+
+# Publication pages from citation databases (BibTeX, CSL-JSON, ORCID), with a
+# link to the paper or to a Google Scholar search for it
+PUBLICATION = (
+    '---\ntitle: "{title|html}"\ncollection: {collection}\npermalink: {permalink}{page}',
+    ("excerpt", 5, "\nexcerpt: '{excerpt|html}'"),
+    "\ndate: {date}\nvenue: '{venue|html}'",
+    ("paper_url", 5, "\npaperurl: {paper_url|yaml_single}"),
+    "\ncitation: '{citation|html}'\n---",
+    ("excerpt", 5, "\n{excerpt|html}\n"),
+    ("paper_url", 5, '\n[Access paper here]({paper_url}){{:target="_blank"}}\n',
+     "\nUse [Google Scholar](https://scholar.google.com/scholar?q={title|scholar})"
+     '{{:target="_blank"}} for full citation'),
+)
+
+# Layouts by name, with the default value of each constant
+LAYOUTS = {
+    "talk": (TALK, {"collection": "talks", "permalink": "/talks/"}),
+    "manuscript": (MANUSCRIPT, {"collection": "manuscripts", "permalink": "/publication/"}),
+    "publication": (PUBLICATION, {"collection": "publications", "permalink": "/publication/"}),
+}
+
+
+class Template(NamedTuple):
+    format: object  # bound str.format of the template, with positional fields
+    fields: tuple   # (record field, filter name, filter function) per positional field
+
+
+class Part(NamedTuple):
+    field: object   # None if the part is always rendered
+    minimum: int
+    then: object    # Template rendered when the field is long enough
+    otherwise: object  # Template rendered when it is not, or None
+
+
+def _compile_template(text, constants):
+    pieces = []
+    fields = []
+    for literal, name, spec, conversion in Formatter().parse(text):
+        if spec or conversion:
+            raise ValueError(f"templates do not support format specs: {text!r}")
+        pieces.append(literal.replace("{", "{{").replace("}", "}}"))
+        if name is None:
+            continue
+        field, _, filter_name = name.partition("|")
+        if filter_name not in FILTERS:
+            raise ValueError(f"unknown filter {filter_name!r} in {text!r}")
+        if field in constants:
+            value = FILTERS[filter_name](constants[field])
+            pieces.append(value.replace("{", "{{").replace("}", "}}"))
+        else:
+            pieces.append("{}")
+            fields.append((field, filter_name, FILTERS[filter_name]))
+    return Template("".join(pieces).format, tuple(fields))
+
+
+@lru_cache(maxsize=None)
+def compile_layout(layout, **constants):
+    """Return the compiled parts of the layout named `layout`.
+
+    `constants` override the layout's defaults for `{collection}`,
+    `{permalink}` and the like. Compiled layouts are cached per process.
+    """
+    parts, defaults = LAYOUTS[layout]
+    constants = dict(defaults, **constants)
+    compiled = []
+    for part in parts:
+        if isinstance(part, str):
+            compiled.append(Part(None, 0, _compile_template(part, constants), None))
+        else:
+            field, minimum, then, *otherwise = part
+            compiled.append(Part(field, minimum, _compile_template(then, constants),
+                                 _compile_template(otherwise[0], constants) if otherwise else None))
+    return tuple(compiled)
+
+
+def _bind(template):
+    """Function formatting a compiled template with the fields of a record."""
+    format = template.format
+    getters = tuple(_getter(field, function if filter_name else None)
+                    for field, filter_name, function in template.fields)
+    if not getters:
+        text = format()
+        return lambda record: text
+    if len(getters) == 1:
+        get = getters[0]
+        return lambda record: format(get(record))
+    return lambda record: format(*[get(record) for get in getters])
+
+
+def _getter(field, function):
+    """Function returning a record's `field`, passed through `function` if any."""
+    get = attrgetter(field)
+    if function is None:
+        return get
+    return lambda record: function(get(record))
+
+
+@lru_cache(maxsize=None)
+def renderer(layout, **constants):
+    """Return a function that renders one record with the layout named `layout`.
+
+    Each compiled part is bound once to attribute getters and its `format`
+    method, so rendering a page costs a length check per optional part, one
+    format call per part and one join.
+    """
+    steps = tuple((part.field and attrgetter(part.field), part.minimum, _bind(part.then),
+                   part.otherwise and _bind(part.otherwise))
+                  for part in compile_layout(layout, **constants))
+
+    def render(record):
+        md = []
+        for field, minimum, then, otherwise in steps:
+            if field is None or len(field(record)) > minimum:
+                md.append(then(record))
+            elif otherwise is not None:
+                md.append(otherwise(record))
+        return os.path.basename(record.page + ".md"), "".join(md)
+
+    return render
+
+
+def render(record, layout, **constants):
+    """Return the (filename, markdown) pair for one record.
+
+    The file is named after the record's `page`, which is also the last part
+    of its permalink. To render many records, call renderer() once instead.
+    """
+    return renderer(layout, **constants)(record)
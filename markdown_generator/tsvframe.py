@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Column-wise rendering for the TSV generators (optional, needs pandas)
+#
+# By default the generators stream the TSV with the `csv` module and render one
+# row at a time (see `tsvstream.py`). With `--vectorized`, `talks.py` and
+# `publications.py` read the TSV into a DataFrame instead and render each field
+# for a whole chunk of rows at once with pandas string methods: filenames and
+# permalinks, the masks for optional fields, the escaped columns and the
+# concatenation of the page. Only the conversion back to Python strings and the
+# writes are per row.
+#
+# Pages are filled from the same compiled layouts the row renderer uses (see
+# `templates.py`), so both paths produce byte-identical files (benchmarks/bench_tsv_columns.py
+# checks this). The speed-up comes from pyarrow: when it is installed the TSV is
+# parsed by pyarrow and the columns are Arrow strings, whose methods run in
+# C++. Without it pandas loops over the values in Python, and the mode is
+# correct but slower than the default path.
+
+import csv
+import os
+import sys
+from string import Formatter
+
+from templates import compile_layout
+from textnorm import HTML_ESCAPES, YAML_DOUBLE_QUOTED_ESCAPES
+
+# Rows rendered at a time, which bounds the memory held by rendered pages
+FRAME_ROWS = 32768
+
+
+def read_frame(path):
+    """Read a TSV with a header line into a DataFrame of strings.
+
+    Empty and missing trailing cells are empty strings, as with read_rows().
+    Raises ImportError if pandas is not installed.
+    """
+    import pandas
+
+    options = dict(sep="\t", na_filter=False, keep_default_na=False, encoding="utf-8")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        header = next(csv.reader(f, delimiter="\t"), [])
+    # Cells beyond the header are ignored, as csv.DictReader does, instead of failing
+    c_options = dict(options, usecols=range(len(header)))
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("pyarrow is not installed; the column-wise mode will be slower than the default",
+              file=sys.stderr)
+        return pandas.read_csv(path, dtype=str, **c_options)
+    try:
+        return pandas.read_csv(path, engine="pyarrow", dtype="string[pyarrow]", **options)
+    except pandas.errors.ParserError:
+        # pyarrow's parser rejects short or long rows and line breaks in quoted cells
+        return pandas.read_csv(path, dtype="string[pyarrow]", **c_options)
+
+
+def chunks(frame, size=FRAME_ROWS):
+    """Yield consecutive slices of `frame` with up to `size` rows."""
+    for start in range(0, len(frame), size):
+        yield frame.iloc[start:start + size]
+
+
+def concat_columns(*pieces):
+    """Concatenate string columns and plain strings row by row.
+
+    Arrow-backed columns are joined by a single pyarrow kernel, rather than one
+    pass and one intermediate column per `+`.
+    """
+    columns = [piece for piece in pieces if not isinstance(piece, str)]
+    if not columns:
+        return "".join(pieces)
+    if all(getattr(column.dtype, "storage", None) == "pyarrow" for column in columns):
+        import pandas
+        import pyarrow
+        import pyarrow.compute
+
+        large_string = pyarrow.large_string()
+        arrays = [pyarrow.scalar(piece, large_string) if isinstance(piece, str)
+                  else pyarrow.array(piece.array).cast(large_string) for piece in pieces]
+        joined = pyarrow.compute.binary_join_element_wise(*arrays, pyarrow.scalar("", large_string))
+        return pandas.Series(pandas.arrays.ArrowStringArray(joined), index=columns[0].index)
+    result = pieces[0]
+    for piece in pieces[1:]:
+        result = result + piece
+    return result
+
+
+def format_column(template, *args, **kwargs):
+    """Column-wise `template(*args, **kwargs)`.
+
+    `template` is the bound `format` method of a string, as used by the
+    generators; the arguments are string columns of the same frame. Format
+    specs and conversions are not supported.
+    """
+    text = template.__self__
+    pieces = []
+    position = 0
+    for literal, field, spec, conversion in Formatter().parse(text):
+        if spec or conversion:
+            raise ValueError(f"format_column() does not support format specs: {text!r}")
+        if literal:
+            pieces.append(literal)
+        if field == "":
+            pieces.append(args[position])
+            position += 1
+        elif field is not None:
+            pieces.append(args[int(field)] if field.isdigit() else kwargs[field])
+    return concat_columns(*pieces)
+
+
+def basename_column(column):
+    """os.path.basename() for a string column."""
+    for separator in (os.sep, os.altsep):
+        # Slugs rarely contain a separator, and the check is much cheaper than the split
+        if separator and column.str.contains(separator, regex=False).any():
+            column = column.str.rpartition(separator)[2]
+    return column
+
+
+def _replace_column(column, pairs):
+    for old, new in pairs:
+        column = column.str.replace(old, new, regex=False)
+    return column
+
+
+def html_escape_column(column):
+    """html_escape() for a string column."""
+    return _replace_column(column, HTML_ESCAPES)
+
+
+def yaml_quote_column(column):
+    """yaml_quote() for a string column."""
+    return concat_columns('"', _replace_column(column, YAML_DOUBLE_QUOTED_ESCAPES), '"')
+
+
+def yaml_single_quote_column(column):
+    """yaml_single_quote() for a string column."""
+    return concat_columns("'", column.str.replace("'", "''", regex=False), "'")
+
+
+# Column versions of the template filters, by name (see templates.FILTERS)
+COLUMN_FILTERS = {
+    "": lambda column: column,
+    "html": html_escape_column,
+    "yaml": yaml_quote_column,
+    "yaml_single": yaml_single_quote_column,
+}
+
+
+def render_frame(columns, layout, **constants):
+    """Column-wise templates.render(): the (filename, markdown) pairs for a chunk.
+
+    `columns` maps each record field to a string column of the same frame.
+    """
+    filtered = {}
+
+    def fill(template):
+        args = []
+        for field, filter_name, _ in template.fields:
+            if (field, filter_name) not in filtered:
+                filtered[field, filter_name] = COLUMN_FILTERS[filter_name](columns[field])
+            args.append(filtered[field, filter_name])
+        return format_column(template.format, *args)
+
+    pieces = []
+    for part in compile_layout(layout, **constants):
+        text = fill(part.then)
+        if part.field is not None:
+            values = columns[part.field]
+            if isinstance(text, str):
+                text = concat_columns(values.str.slice(0, 0), text)
+            text = text.where(values.str.len() > part.minimum,
+                              fill(part.otherwise) if part.otherwise is not None else "")
+        pieces.append(text)
+
+    md = concat_columns(*pieces)
+    return list(zip(basename_column(concat_columns(columns["page"], ".md")).tolist(), md.tolist()))
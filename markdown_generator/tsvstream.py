@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Streaming TSV helpers for the markdown generators
+#
+# The generators used to load the whole TSV into a pandas DataFrame and walk it
+# with `iterrows()`, which boxes every row into a Series. These helpers read
+# rows lazily with the standard `csv` module instead, so memory stays flat no
+# matter how long the TSV is, and importing pandas is no longer part of the
+# startup cost.
+
+import csv
+from itertools import islice
+
+# Number of rendered files handed to the writer at a time
+BATCH_SIZE = 512
+
+
+def read_rows(path):
+    """Yield each row of a TSV with a header line as a dict of strings.
+
+    Missing trailing cells come back as empty strings, so callers can test
+    optional fields with a simple length check.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f, delimiter="\t", restval="")
+        for row in reader:
+            yield row
+
+
+def batched(iterable, size=BATCH_SIZE):
+    """Yield lists of up to `size` items from `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Precomputed tag, category and year archives for the blog posts
+
+The archive pages used to regroup site.posts on every Jekyll build with the
+group-by-array include, which walks every post once per tag. This script reads
+the front matter of _posts once, through the shared front matter index (so only
+new or changed posts are parsed), and writes the groupings to
+_data/archives.json:
+
+  {"posts": 27,
+   "tags": [{"name": "EDA", "posts": [[3, "_posts/2026-01-12-seatdata.io-eda.md"], ...]}, ...],
+   "categories": [...],
+   "years": [{"name": "2026", "posts": [...]}, ...]}
+
+Each post is given as its position in site.posts (newest first, as Jekyll sorts
+them) and its path. The archive pages look the post up by position and fall
+back to a lookup by path if the two disagree, and they regroup site.posts
+themselves if `posts` does not match the number of posts Jekyll has, for
+example when the file is stale or drafts are being previewed. The output file
+is only rewritten when the groupings change.
+"""
+
+import argparse
+import os
+import re
+from datetime import date, datetime, timezone
+
+import instrumentation
+import yaml_loader
+from frontmatter_index import FrontMatterIndex, DEFAULT_INDEX_FILE
+from json_writer import write_json
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join("_data", "archives.json")
+
+# Jekyll's pattern for post file names: the date, then the slug
+POST_NAME = re.compile(r"^(\d{2,4})-(\d{1,2})-(\d{1,2})-(.*)\.[^.]+$")
+# Characters Jekyll's "pretty" slugify replaces with a hyphen
+_pretty_slug = re.compile(r"(?:[^\w.~!$&'()+,;=@]|_)+")
+
+
+def _site_timezone(config):
+    name = config.get("timezone")
+    if not name:
+        return None
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except (ImportError, ValueError, KeyError):
+        return None
+
+
+def post_date(path, front_matter, site_timezone=None):
+    """The date Jekyll gives a post: its `date` field, else the one in its
+    file name. Returns a naive datetime in the site's time zone, or None."""
+    value = front_matter.get("date")
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace(" +", "+").replace("Z", "+00:00"))
+        except ValueError:
+            value = None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(site_timezone or timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    match = POST_NAME.match(os.path.basename(path))
+    if match:
+        try:
+            return datetime(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            pass
+    return None
+
+
+def _values(value):
+    """A tags or categories field as a list of strings; Jekyll splits a plain
+    string on whitespace."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return value.split()
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value if item is not None]
+    return [str(value)]
+
+
+def _unique(values):
+    return list(dict.fromkeys(values))
+
+
+def post_tags(front_matter):
+    """Tags as Jekyll reads them from `tag` or `tags`."""
+    if "tag" in front_matter:
+        return _unique(_values(front_matter["tag"]))
+    return _unique(_values(front_matter.get("tags")))
+
+
+def post_categories(front_matter, path, root):
+    """Categories from the directories above _posts and `category` or `categories`."""
+    relative = os.path.relpath(path, root).replace(os.sep, "/")
+    categories = [part for part in relative.split("/_posts/")[0].split("/") if part] if "/_posts/" in relative else []
+    if "category" in front_matter:
+        categories += _values(front_matter["category"])
+    else:
+        categories += _values(front_matter.get("categories"))
+    return _unique(categories)
+
+
+def front_matter_defaults(config, path, collection):
+    """The `defaults:` values of _config.yml that apply to the document at
+    `path` (relative to the site root) in `collection` ("_posts", ...).
+
+    As in Jekyll, a scope matches on its path prefix and its type, and more
+    specific scopes, with the longer path, override less specific ones.
+    """
+    matching = []
+    for number, default in enumerate(config.get("defaults") or []):
+        if not isinstance(default, dict) or not isinstance(default.get("values"), dict):
+            continue
+        scope = default.get("scope") or {}
+        scope_path = str(scope.get("path") or "").strip("/")
+        if scope_path and path != scope_path and not path.startswith(scope_path + "/"):
+            continue
+        if scope.get("type") and scope["type"] != collection[1:]:
+            continue
+        matching.append((len(scope_path), bool(scope.get("type")), number, default["values"]))
+    values = {}
+    for *_, scope_values in sorted(matching, key=lambda item: item[:3]):
+        values.update(scope_values)
+    return values
+
+
+def document_url(root, collection, path, front_matter, config):
+    """The URL Jekyll gives a document, for the permalink styles the site uses."""
+    if front_matter.get("permalink"):
+        return str(front_matter["permalink"])
+    name = os.path.splitext(os.path.basename(path))[0]
+    if collection == "_posts":
+        match = POST_NAME.match(os.path.basename(path))
+        slug = str(front_matter.get("slug") or (match.group(4) if match else name))
+        year, month, day = (match.group(1), match.group(2).zfill(2), match.group(3).zfill(2)) if match else ("", "", "")
+        values = {
+            "categories": "/".join(category.lower() for category in post_categories(front_matter, path, root)),
+            "title": _pretty_slug.sub("-", slug).strip("-"),
+            "year": year, "month": month, "day": day,
+        }
+        pattern = config.get("permalink") or "/:categories/:year/:month/:day/:title:output_ext"
+    else:
+        settings = (config.get("collections") or {}).get(collection[1:]) or {}
+        values = {"collection": collection[1:], "path": name, "name": name, "title": name}
+        pattern = settings.get("permalink") if isinstance(settings, dict) else None
+        pattern = pattern or "/:collection/:path:output_ext"
+    pattern = pattern.replace(":output_ext", ".html")
+    url = re.sub(r":(\w+)", lambda match: values.get(match.group(1), match.group(0)), pattern)
+    return re.sub(r"/{2,}", "/", url)
+
+
+def site_posts(index, root, config):
+    """(path, front matter, date) of every post Jekyll publishes, in
+    site.posts order: newest first, then by path descending."""
+    site_timezone = _site_timezone(config)
+    now = datetime.now(site_timezone or timezone.utc).replace(tzinfo=None)
+    posts = []
+    for path, front_matter in index.collection(os.path.join(root, "_posts")):
+        if not isinstance(front_matter, dict) or front_matter.get("published") is False:
+            continue
+        if not POST_NAME.match(os.path.basename(path)):
+            continue
+        when = post_date(path, front_matter, site_timezone)
+        if when is None or (not config.get("future", False) and when > now):
+            continue
+        posts.append((os.path.relpath(path, root).replace(os.sep, "/"), front_matter, when))
+    posts.sort(key=lambda post: (post[2], post[0]), reverse=True)
+    return posts
+
+
+def _groups(posts, keys):
+    groups = {}
+    for number, (path, front_matter, when) in enumerate(posts):
+        for key in keys(path, front_matter, when):
+            groups.setdefault(key, []).append([number, path])
+    return groups
+
+
+def build_archives(posts, root):
+    """The tag, category and year groupings of `posts`, as written to _data."""
+    tags = _groups(posts, lambda path, front_matter, when: post_tags(front_matter))
+    categories = _groups(posts, lambda path, front_matter, when:
+                         post_categories(front_matter, os.path.join(root, path), root))
+    years = _groups(posts, lambda path, front_matter, when: [f"{when.year:04d}"])
+    return {
+        "posts": len(posts),
+        # Sorted as Liquid's sort filter sorts strings, like the group-by-array include
+        "tags": [{"name": name, "posts": tags[name]} for name in sorted(tags)],
+        "categories": [{"name": name, "posts": categories[name]} for name in sorted(categories)],
+        # Newest first, as the posts are
+        "years": [{"name": name, "posts": years[name]} for name in years],
+    }
+
+
+def write_archives(root=REPO_ROOT, output=None, config_file=None, index=None):
+    """Rebuild the archive groupings; returns True if the output changed."""
+    output = output or os.path.join(root, DEFAULT_OUTPUT)
+    config_file = config_file or os.path.join(root, "_config.yml")
+    config = {}
+    if os.path.exists(config_file):
+        with open(config_file, "r", encoding="utf-8") as f:
+            config = yaml_loader.load(f.read()) or {}
+    index = index or FrontMatterIndex(os.path.join(root, DEFAULT_INDEX_FILE))
+    with instrumentation.phase("scan"):
+        index.scan([os.path.join(root, "_posts")])
+        posts = site_posts(index, root, config)
+    with instrumentation.phase("group"):
+        archives = build_archives(posts, root)
+    with instrumentation.phase("write"):
+        changed = write_json(archives, output)
+    index.prune()
+    index.save()
+    instrumentation.record({"posts": len(posts), "frontmatter_hits": index.hits,
+                            "frontmatter_parsed": index.misses})
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the tag, category and year archives of the posts')
+    parser.add_argument('--root', '-r', default=REPO_ROOT, help='Repository root')
+    parser.add_argument('--output', '-o', help=f'Output JSON file (default: ROOT/{DEFAULT_OUTPUT})')
+    parser.add_argument('--config', '-c', help='Jekyll _config.yml file (default: ROOT/_config.yml)')
+    args = parser.parse_args()
+
+    instrumentation.start("archive_index")
+    index = FrontMatterIndex(os.path.join(args.root, DEFAULT_INDEX_FILE))
+    changed = write_archives(args.root, args.output, args.config, index)
+    output = args.output or os.path.join(args.root, DEFAULT_OUTPUT)
+    print(f"{output} {'updated' if changed else 'is already up to date'} "
+          f"({index.hits} posts unchanged, {index.misses} parsed)")
+
+
+if __name__ == '__main__':
+    main()
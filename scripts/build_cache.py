@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Content-addressed build cache for the site data generators
+
+A Stage declares the files it reads (as glob patterns relative to the
+repository root), the files it writes and the command that produces them.
+Its key is the SHA-1 of the command and of the path and content hash of
+every input, so a stage only has to run again when something it reads has
+actually changed, regardless of mtimes. File hashes are remembered by
+(mtime, size), which keeps a no-op check down to a stat() per input.
+
+Stages run in the order given; a stage that reads another stage's outputs
+must come after it, and is then checked against the files that stage just
+wrote.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import time
+
+import instrumentation
+
+# Bump when the shape of the stored state changes, to discard old state files
+STATE_VERSION = 1
+DEFAULT_STATE_FILE = os.path.join(".build-cache", "build-state.json")
+
+
+class Stage:
+    """One generator: its inputs, outputs and command."""
+
+    def __init__(self, name, command, inputs, outputs=(), cwd=".", requires=()):
+        self.name = name
+        self.command = list(command)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.cwd = cwd
+        # Inputs the command cannot run without; the stage is skipped if one is missing
+        self.requires = list(requires)
+
+
+class BuildCache:
+    """Stage keys and file hashes of the last successful build, kept on disk."""
+
+    def __init__(self, root, state_file=DEFAULT_STATE_FILE):
+        self.root = os.path.abspath(root)
+        self.state_file = os.path.join(self.root, state_file)
+        self.stages = {}
+        self.files = {}
+        self.dirty = False
+        self.hashed = 0
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                if data.get('version') == STATE_VERSION:
+                    self.stages = data['stages']
+                    self.files = data['files']
+            except (OSError, ValueError, KeyError):
+                self.stages, self.files = {}, {}
+
+    def file_hash(self, relpath):
+        """Return the SHA-1 of a file, reusing the stored one if its mtime and size match."""
+        stat = os.stat(os.path.join(self.root, relpath))
+        signature = [stat.st_mtime_ns, stat.st_size]
+        cached = self.files.get(relpath)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        digest = hashlib.sha1()
+        with open(os.path.join(self.root, relpath), 'rb') as file:
+            for block in iter(lambda: file.read(1 << 16), b''):
+                digest.update(block)
+        self.files[relpath] = [signature, digest.hexdigest()]
+        self.dirty = True
+        self.hashed += 1
+        return digest.hexdigest()
+
+    def expand(self, patterns):
+        """Return the sorted relative paths of existing files matching `patterns`."""
+        paths = set()
+        for pattern in patterns:
+            for path in glob.glob(os.path.join(self.root, pattern)):
+                if os.path.isfile(path):
+                    paths.add(os.path.relpath(path, self.root))
+        return sorted(paths)
+
+    def stage_key(self, stage):
+        """Hash the command and the path and content of every input of `stage`."""
+        digest = hashlib.sha1()
+        digest.update(json.dumps([stage.command, stage.cwd]).encode('utf-8'))
+        for relpath in self.expand(stage.inputs):
+            digest.update(f"\0{relpath}\0{self.file_hash(relpath)}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def missing(self, stage):
+        """Return the required inputs of `stage` that do not exist."""
+        return [path for path in stage.requires if not os.path.exists(os.path.join(self.root, path))]
+
+    def is_fresh(self, stage, key):
+        """A stage is fresh if its key is unchanged and its plain (non-glob) outputs exist."""
+        if self.stages.get(stage.name, {}).get('key') != key:
+            return False
+        return all(os.path.exists(os.path.join(self.root, path))
+                   for path in stage.outputs if not glob.has_magic(path))
+
+    def record(self, stage, key, elapsed):
+        self.stages[stage.name] = {'key': key, 'seconds': round(elapsed, 3)}
+        self.dirty = True
+
+    def forget(self, name):
+        if self.stages.pop(name, None) is not None:
+            self.dirty = True
+
+    def prune(self):
+        """Forget the hashes of files that no longer exist."""
+        for relpath in [path for path in self.files if not os.path.exists(os.path.join(self.root, path))]:
+            del self.files[relpath]
+            self.dirty = True
+
+    def save(self):
+        """Write the state atomically if anything changed."""
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        tmp_path = self.state_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': STATE_VERSION, 'stages': self.stages, 'files': self.files}, file)
+        os.replace(tmp_path, self.state_file)
+        self.dirty = False
+
+
+def run_stages(cache, stages, force=False, dry_run=False, log=print):
+    """Run every stale stage in order.
+
+    Returns a list of (stage name, status) pairs, where status is one of
+    'fresh', 'ran', 'stale' (dry run), 'missing-input' or 'failed'. Stops at the
+    first failure, since later stages may read its outputs.
+    """
+    results = []
+    for stage in stages:
+        missing = cache.missing(stage)
+        if missing:
+            log(f"{stage.name}: skipped, missing {', '.join(missing)}")
+            results.append((stage.name, 'missing-input'))
+            continue
+
+        key = cache.stage_key(stage)
+        if not force and cache.is_fresh(stage, key):
+            log(f"{stage.name}: up to date")
+            results.append((stage.name, 'fresh'))
+            continue
+        if dry_run:
+            log(f"{stage.name}: stale")
+            results.append((stage.name, 'stale'))
+            continue
+
+        log(f"{stage.name}: running {' '.join(stage.command)}")
+        start = time.perf_counter()
+        with instrumentation.phase(stage.name):
+            completed = subprocess.run(stage.command, cwd=os.path.join(cache.root, stage.cwd))
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            log(f"{stage.name}: failed with exit code {completed.returncode}")
+            cache.forget(stage.name)
+            results.append((stage.name, 'failed'))
+            break
+        log(f"{stage.name}: done in {elapsed:.2f} s")
+        cache.record(stage, key, elapsed)
+        results.append((stage.name, 'ran'))
+    return results
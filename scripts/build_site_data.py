@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Rebuild the generated site data, running only the stages whose inputs changed
+
+Stages, in dependency order:
+  talks         markdown_generator/talks.tsv         -> _talks/*.md
+  publications  markdown_generator/publications.tsv  -> _publications/*.md
+  pubsFromBib   markdown_generator/*.bib             -> _publications/*.md
+  cv-json       _pages/cv.md, _config.yml, collections -> _data/cv.json
+  archives      _posts/*.md, _config.yml              -> _data/archives.json
+  related       _posts, _portfolio, _publications      -> _data/related.json
+  search        all collections, _config.yml           -> assets/search/
+  talkmap       _talks/*.md                          -> talkmap/
+
+Each stage is keyed by the content of its inputs, including the generator's
+own source, in .build-cache/build-state.json. Usage:
+
+  python3 scripts/build_site_data.py              # run stale stages
+  python3 scripts/build_site_data.py --dry-run    # list stale stages
+  python3 scripts/build_site_data.py cv-json -f   # force one stage
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import instrumentation
+from build_cache import BuildCache, Stage, run_stages
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PYTHON = sys.executable or "python3"
+
+# The collections markdown_generator/permalinks.py checks generated pages against
+COLLECTION_FILES = ["_publications/*.md", "_talks/*.md", "_teaching/*.md", "_portfolio/*.md"]
+
+
+def other_collections(output):
+    """COLLECTION_FILES except the generator's own output, which would make
+    its stage stale again after every run."""
+    return [pattern for pattern in COLLECTION_FILES if pattern != output]
+
+
+STAGES = [
+    Stage("talks", [PYTHON, "talks.py"], cwd="markdown_generator",
+          inputs=["markdown_generator/talks.py", "markdown_generator/talks.tsv",
+                  "markdown_generator/ingest.py", "markdown_generator/templates.py",
+                  "markdown_generator/incremental.py", "markdown_generator/permalinks.py",
+                  "markdown_generator/tsvstream.py", "markdown_generator/tsvframe.py",
+                  "markdown_generator/textnorm.py",
+                  "scripts/instrumentation.py"] + other_collections("_talks/*.md"),
+          outputs=["_talks/*.md"],
+          requires=["markdown_generator/talks.tsv"]),
+    Stage("publications", [PYTHON, "publications.py"], cwd="markdown_generator",
+          inputs=["markdown_generator/publications.py", "markdown_generator/publications.tsv",
+                  "markdown_generator/ingest.py", "markdown_generator/templates.py",
+                  "markdown_generator/incremental.py", "markdown_generator/permalinks.py",
+                  "markdown_generator/tsvstream.py", "markdown_generator/tsvframe.py",
+                  "markdown_generator/textnorm.py",
+                  "scripts/instrumentation.py"] + other_collections("_publications/*.md"),
+          outputs=["_publications/*.md"],
+          requires=["markdown_generator/publications.tsv"]),
+    Stage("pubsFromBib", [PYTHON, "pubsFromBib.py"], cwd="markdown_generator",
+          inputs=["markdown_generator/pubsFromBib.py", "markdown_generator/bibcache.py",
+                  "markdown_generator/ingest.py", "markdown_generator/templates.py",
+                  "markdown_generator/incremental.py", "markdown_generator/permalinks.py",
+                  "markdown_generator/tsvstream.py", "markdown_generator/textnorm.py",
+                  "scripts/instrumentation.py",
+                  "markdown_generator/*.bib"] + other_collections("_publications/*.md"),
+          outputs=["_publications/*.md"],
+          requires=["markdown_generator/proceedings.bib", "markdown_generator/pubs.bib"]),
+    Stage("cv-json", [PYTHON, "scripts/cv_markdown_to_json.py", "--input", "_pages/cv.md",
+                      "--output", "_data/cv.json", "--config", "_config.yml"],
+          inputs=["scripts/cv_markdown_to_json.py", "scripts/frontmatter_index.py",
+                  "scripts/yaml_loader.py", "scripts/json_writer.py", "scripts/instrumentation.py",
+                  "_pages/cv.md", "_config.yml"] + COLLECTION_FILES,
+          outputs=["_data/cv.json"],
+          requires=["_pages/cv.md"]),
+    Stage("archives", [PYTHON, "scripts/archive_index.py"],
+          inputs=["scripts/archive_index.py", "scripts/frontmatter_index.py", "scripts/yaml_loader.py",
+                  "scripts/json_writer.py", "scripts/instrumentation.py", "_posts/*.md", "_config.yml"],
+          outputs=["_data/archives.json"],
+          requires=["_posts"]),
+    Stage("related", [PYTHON, "scripts/related_posts.py"],
+          inputs=["scripts/related_posts.py", "scripts/archive_index.py", "scripts/frontmatter_index.py",
+                  "scripts/yaml_loader.py", "scripts/json_writer.py", "scripts/instrumentation.py",
+                  "_config.yml", "_posts/*.md", "_portfolio/*.md", "_publications/*.md"],
+          outputs=["_data/related.json"],
+          requires=["_posts"]),
+    Stage("search", [PYTHON, "scripts/search_index.py"],
+          inputs=["scripts/search_index.py", "scripts/related_posts.py", "scripts/archive_index.py",
+                  "scripts/frontmatter_index.py", "scripts/yaml_loader.py", "scripts/json_writer.py",
+                  "scripts/instrumentation.py", "_config.yml", "_posts/*.md"] + COLLECTION_FILES,
+          outputs=["assets/search/manifest.json"],
+          requires=["_config.yml"]),
+    Stage("talkmap", [PYTHON, "talkmap.py"],
+          inputs=["talkmap.py", "scripts/geocoding.py", "scripts/gazetteer.py",
+                  "scripts/mapclusters.py", "scripts/instrumentation.py",
+                  "talkmap/gazetteer.tsv", "_talks/*.md"],
+          outputs=["talkmap/org-locations.js", "talkmap/map.html", "talkmap/clusters/index.json"],
+          requires=["talkmap.py"]),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the generated site data, running only stale stages')
+    parser.add_argument('stages', nargs='*', metavar='STAGE',
+                        help='Stages to consider (default: all); one of ' + ', '.join(s.name for s in STAGES))
+    parser.add_argument('--force', '-f', action='store_true', help='Run the selected stages even if up to date')
+    parser.add_argument('--dry-run', '-n', action='store_true', help='Only report which stages are stale')
+    parser.add_argument('--root', '-r', default=REPO_ROOT, help='Repository root')
+    args = parser.parse_args()
+
+    names = [stage.name for stage in STAGES]
+    unknown = [name for name in args.stages if name not in names]
+    if unknown:
+        parser.error(f"unknown stage(s) {', '.join(unknown)}; expected one of {', '.join(names)}")
+    selected = [stage for stage in STAGES if not args.stages or stage.name in args.stages]
+
+    instrumentation.start("build_site_data")
+    start = time.perf_counter()
+    cache = BuildCache(args.root)
+    results = run_stages(cache, selected, force=args.force, dry_run=args.dry_run)
+    cache.prune()
+    cache.save()
+    instrumentation.count("files_hashed", cache.hashed)
+
+    ran = sum(1 for _, status in results if status == 'ran')
+    print(f"{ran} of {len(results)} stages run, {cache.hashed} files hashed "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return 1 if any(status == 'failed' for _, status in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,59 +6,140 @@ Author: Yuan Chen
 
 import os
 import re
-import json
-import yaml
-import argparse
-from datetime import datetime, date
-from pathlib import Path
-import glob
-
-# Custom JSON encoder to handle date objects
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        return super().default(obj)
+import time
 
-def parse_markdown_cv(md_file):
-    """Parse the markdown CV file and extract sections."""
-    with open(md_file, 'r', encoding='utf-8') as file:
-        content = file.read()
-    
-    # Remove YAML front matter
-    content = re.sub(r'^---.*?---\s*', '', content, flags=re.DOTALL)
+# PyYAML is imported lazily by yaml_loader, and only if something needs parsing
+import yaml_loader
+import instrumentation
+from frontmatter_index import FrontMatterIndex, DEFAULT_INDEX_FILE, make_executor
+from json_writer import StreamingJSONWriter, write_json, backend_name, COMPRESSIONS
+
+# Patterns for the CV tokenizer and section parsers, compiled once
+FRONT_MATTER_PATTERN = re.compile(r'^---.*?---\s*', re.DOTALL)
+RULE_PATTERN = re.compile(r'=+')
+HEADING_PATTERN = re.compile(r'[A-Za-z\s]+')
+CATEGORY_PATTERN = re.compile(r'(\w+.*?):\s*(.*)')
+EDUCATION_PATTERN = re.compile(r'([^,]+), ([^,]+), (\d{4})(.*)')
+GPA_PATTERN = re.compile(r'GPA: ([\d\.]+)')
+POSITION_PATTERN = re.compile(r'(.*?), (.*?)(?:, |$)')
+DATE_RANGE_PATTERN = re.compile(r'(\d{4})\s*-\s*(\d{4}|present)', re.IGNORECASE)
+SKILL_SPLIT_PATTERN = re.compile(r',|\n')
+
+# Parsed _config.yml, reused while the file is unchanged
+CONFIG_CACHE_FILE = os.path.join(".build-cache", "config.pickle")
+
+class CVSection:
+    """One section of the markdown CV, split into entries while it is scanned.
+
+    `entries` holds the lines of each top-level `* ` bullet together with the
+    lines that follow it, and `categories` holds `Name: values` groups.
+    """
+    __slots__ = ('name', 'lines', 'entries', 'categories')
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = []
+        self.entries = []
+        self.categories = []
+
+    @property
+    def text(self):
+        return '\n'.join(self.lines).strip()
+
+    def __bool__(self):
+        return bool(self.lines)
+
+def tokenize_section_lines(section, lines):
+    """Add lines to a section, classifying each one exactly once."""
+    entry = None
+    category = None
+    for line in lines:
+        # Leading whitespace of the section is not significant
+        if not section.lines and not line.strip():
+            continue
+        if not section.lines:
+            line = line.lstrip()
+        section.lines.append(line)
+
+        if line.startswith('* '):
+            entry = [line[2:]]
+            section.entries.append(entry)
+        elif line.startswith('*'):
+            entry = None
+        elif entry is not None:
+            entry.append(line)
+
+        category_match = CATEGORY_PATTERN.match(line)
+        if category_match:
+            category = [category_match.group(1), [category_match.group(2)]]
+            section.categories.append(category)
+        elif category is not None:
+            category[1].append(line)
+
+    # Trailing blank lines belong to no entry, and a bare `* ` left with
+    # nothing else is not an entry at all
+    for entry in section.entries[-1:]:
+        while entry and not entry[-1].strip():
+            entry.pop()
+        if not entry:
+            section.entries.pop()
+    return section
+
+def tokenize_cv(content):
+    """Split markdown CV content into CVSection objects in a single scan.
+
+    A section starts at any line made only of letters and spaces, and rules of
+    `=` are skipped.
+    """
+    content = FRONT_MATTER_PATTERN.sub('', content, count=1)
     
-    # Extract sections
     sections = {}
-    current_section = None
-    section_content = []
-    
+    current = None
+    pending = []
     for line in content.split('\n'):
-        if re.match(r'^=+$', line):
+        if RULE_PATTERN.fullmatch(line):
             continue
         
-        section_match = re.match(r'^([A-Za-z\s]+)$', line.strip())
-        if section_match and len(line.strip()) > 0:
-            if current_section:
-                sections[current_section] = '\n'.join(section_content).strip()
-                section_content = []
-            current_section = section_match.group(1).strip()
-        elif current_section:
-            section_content.append(line)
+        stripped = line.strip()
+        if stripped and HEADING_PATTERN.fullmatch(stripped):
+            if current is not None:
+                sections[current.name] = tokenize_section_lines(current, pending)
+                pending = []
+            current = CVSection(stripped)
+        elif current is not None:
+            pending.append(line)
     
     # Add the last section
-    if current_section and section_content:
-        sections[current_section] = '\n'.join(section_content).strip()
+    if current is not None and pending:
+        sections[current.name] = tokenize_section_lines(current, pending)
     
     return sections
 
-def parse_config(config_file):
-    """Parse the Jekyll _config.yml file for additional information."""
-    if not os.path.exists(config_file):
+def as_section(section):
+    """Accept either a CVSection or raw section text."""
+    if isinstance(section, CVSection):
+        return section
+    return tokenize_section_lines(CVSection(''), (section or '').split('\n'))
+
+def parse_markdown_cv(md_file):
+    """Parse the markdown CV file and extract sections."""
+    with open(md_file, 'r', encoding='utf-8') as file:
+        content = file.read()
+    
+    return tokenize_cv(content)
+
+def parse_config(config_file, cache_file=None):
+    """Parse the Jekyll _config.yml file for additional information.
+
+    With a `cache_file`, the parsed config is reused while the file is unchanged.
+    """
+    if not config_file or not os.path.exists(config_file):
         return {}
     
-    with open(config_file, 'r', encoding='utf-8') as file:
-        config = yaml.safe_load(file)
+    if cache_file:
+        config = yaml_loader.load_file_cached(config_file, cache_file)
+    else:
+        config = yaml_loader.load_file(config_file)
     
     return config
 
@@ -158,21 +239,18 @@ def extract_author_info(config):
     
     return author_info
 
-def parse_education(education_text):
+def parse_education(education):
     """Parse education section from markdown."""
     education_entries = []
     
-    # Extract education entries
-    entries = re.findall(r'\* (.*?)(?=\n\*|\Z)', education_text, re.DOTALL)
-    
-    for entry in entries:
+    for lines in as_section(education).entries:
         # Parse degree, institution, and year
-        match = re.match(r'([^,]+), ([^,]+), (\d{4})(.*)', entry.strip())
+        match = EDUCATION_PATTERN.match('\n'.join(lines).strip())
         if match:
             degree, institution, year, additional = match.groups()
             
             # Extract GPA if available
-            gpa_match = re.search(r'GPA: ([\d\.]+)', additional)
+            gpa_match = GPA_PATTERN.search(additional)
             gpa = gpa_match.group(1) if gpa_match else None
             
             education_entries.append({
@@ -187,35 +265,29 @@ def parse_education(education_text):
     
     return education_entries
 
-def parse_work_experience(work_text):
+def parse_work_experience(work):
     """Parse work experience section from markdown."""
     work_entries = []
     
-    # Extract work entries
-    entries = re.findall(r'\* (.*?)(?=\n\*|\Z)', work_text, re.DOTALL)
-    
-    for entry in entries:
-        lines = entry.strip().split('\n')
-        if not lines:
-            continue
-            
+    for lines in as_section(work).entries:
         # Parse position and company
         first_line = lines[0].strip()
-        position_match = re.match(r'(.*?), (.*?)(?:, |$)', first_line)
+        position_match = POSITION_PATTERN.match(first_line)
         
         if position_match:
             position, company = position_match.groups()
             
             # Extract dates if available
-            date_match = re.search(r'(\d{4})\s*-\s*(\d{4}|present)', entry, re.IGNORECASE)
+            date_match = DATE_RANGE_PATTERN.search('\n'.join(lines))
             start_date = date_match.group(1) if date_match else ""
             end_date = date_match.group(2) if date_match else ""
             
             # Extract highlights
             highlights = []
             for line in lines[1:]:
-                if line.strip().startswith('*') or line.strip().startswith('-'):
-                    highlights.append(line.strip()[1:].strip())
+                line = line.strip()
+                if line.startswith('*') or line.startswith('-'):
+                    highlights.append(line[1:].strip())
             
             work_entries.append({
                 "company": company.strip(),
@@ -229,16 +301,13 @@ def parse_work_experience(work_text):
     
     return work_entries
 
-def parse_skills(skills_text):
+def parse_skills(skills):
     """Parse skills section from markdown."""
     skills_entries = []
     
-    # Extract skill categories
-    categories = re.findall(r'(?:^|\n)(\w+.*?):\s*(.*?)(?=\n\w+.*?:|\Z)', skills_text, re.DOTALL)
-    
-    for category, skills in categories:
+    for category, lines in as_section(skills).categories:
         # Extract individual skills
-        skill_list = [s.strip() for s in re.split(r',|\n', skills) if s.strip()]
+        skill_list = [s.strip() for s in SKILL_SPLIT_PATTERN.split('\n'.join(lines).strip()) if s.strip()]
         
         skills_entries.append({
             "name": category.strip(),
@@ -248,182 +317,218 @@ def parse_skills(skills_text):
     
     return skills_entries
 
-def parse_publications(pub_dir):
+def publication_entry(front_matter):
+    """Build a CV publication entry from a file's front matter."""
+    return {
+        "name": front_matter.get('title', ''),
+        "publisher": front_matter.get('venue', ''),
+        "releaseDate": front_matter.get('date', ''),
+        "website": front_matter.get('paperurl', ''),
+        "summary": front_matter.get('excerpt', '')
+    }
+
+def talk_entry(front_matter):
+    """Build a CV presentation entry from a file's front matter."""
+    return {
+        "name": front_matter.get('title', ''),
+        "event": front_matter.get('venue', ''),
+        "date": front_matter.get('date', ''),
+        "location": front_matter.get('location', ''),
+        "description": front_matter.get('excerpt', '')
+    }
+
+def teaching_entry(front_matter):
+    """Build a CV teaching entry from a file's front matter."""
+    return {
+        "course": front_matter.get('title', ''),
+        "institution": front_matter.get('venue', ''),
+        "date": front_matter.get('date', ''),
+        "role": front_matter.get('type', ''),
+        "description": front_matter.get('excerpt', '')
+    }
+
+def portfolio_entry(front_matter):
+    """Build a CV portfolio entry from a file's front matter."""
+    return {
+        "name": front_matter.get('title', ''),
+        "category": front_matter.get('collection', 'portfolio'),
+        "date": front_matter.get('date', ''),
+        "url": front_matter.get('permalink', ''),
+        "description": front_matter.get('excerpt', '')
+    }
+
+# Collection directory, CV section and entry builder for each collection
+COLLECTION_SECTIONS = [
+    ("_publications", "publications", publication_entry),
+    ("_talks", "presentations", talk_entry),
+    ("_teaching", "teaching", teaching_entry),
+    ("_portfolio", "portfolio", portfolio_entry),
+]
+
+def parse_publications(pub_dir, index=None):
     """Parse publications from the _publications directory."""
-    publications = []
-    
-    if not os.path.exists(pub_dir):
-        return publications
-    
-    for pub_file in sorted(glob.glob(os.path.join(pub_dir, "*.md"))):
-        with open(pub_file, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        # Extract front matter
-        front_matter_match = re.match(r'^---\s*(.*?)\s*---', content, re.DOTALL)
-        if front_matter_match:
-            front_matter = yaml.safe_load(front_matter_match.group(1))
-            
-            # Extract publication details
-            pub_entry = {
-                "name": front_matter.get('title', ''),
-                "publisher": front_matter.get('venue', ''),
-                "releaseDate": front_matter.get('date', ''),
-                "website": front_matter.get('paperurl', ''),
-                "summary": front_matter.get('excerpt', '')
-            }
-            
-            publications.append(pub_entry)
-    
-    return publications
+    return [publication_entry(front_matter)
+            for pub_file, front_matter in (index or FrontMatterIndex()).collection(pub_dir)]
 
-def parse_talks(talks_dir):
+def parse_talks(talks_dir, index=None):
     """Parse talks from the _talks directory."""
-    talks = []
-    
-    if not os.path.exists(talks_dir):
-        return talks
-    
-    for talk_file in sorted(glob.glob(os.path.join(talks_dir, "*.md"))):
-        with open(talk_file, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        # Extract front matter
-        front_matter_match = re.match(r'^---\s*(.*?)\s*---', content, re.DOTALL)
-        if front_matter_match:
-            front_matter = yaml.safe_load(front_matter_match.group(1))
-            
-            # Extract talk details
-            talk_entry = {
-                "name": front_matter.get('title', ''),
-                "event": front_matter.get('venue', ''),
-                "date": front_matter.get('date', ''),
-                "location": front_matter.get('location', ''),
-                "description": front_matter.get('excerpt', '')
-            }
-            
-            talks.append(talk_entry)
-    
-    return talks
+    return [talk_entry(front_matter)
+            for talk_file, front_matter in (index or FrontMatterIndex()).collection(talks_dir)]
 
-def parse_teaching(teaching_dir):
+def parse_teaching(teaching_dir, index=None):
     """Parse teaching from the _teaching directory."""
-    teaching = []
-    
-    if not os.path.exists(teaching_dir):
-        return teaching
-    
-    for teaching_file in sorted(glob.glob(os.path.join(teaching_dir, "*.md"))):
-        with open(teaching_file, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        # Extract front matter
-        front_matter_match = re.match(r'^---\s*(.*?)\s*---', content, re.DOTALL)
-        if front_matter_match:
-            front_matter = yaml.safe_load(front_matter_match.group(1))
-            
-            # Extract teaching details
-            teaching_entry = {
-                "course": front_matter.get('title', ''),
-                "institution": front_matter.get('venue', ''),
-                "date": front_matter.get('date', ''),
-                "role": front_matter.get('type', ''),
-                "description": front_matter.get('excerpt', '')
-            }
-            
-            teaching.append(teaching_entry)
-    
-    return teaching
+    return [teaching_entry(front_matter)
+            for teaching_file, front_matter in (index or FrontMatterIndex()).collection(teaching_dir)]
 
-def parse_portfolio(portfolio_dir):
+def parse_portfolio(portfolio_dir, index=None):
     """Parse portfolio items from the _portfolio directory."""
-    portfolio = []
-    
-    if not os.path.exists(portfolio_dir):
-        return portfolio
-    
-    for portfolio_file in sorted(glob.glob(os.path.join(portfolio_dir, "*.md"))):
-        with open(portfolio_file, 'r', encoding='utf-8') as file:
-            content = file.read()
+    return [portfolio_entry(front_matter)
+            for portfolio_file, front_matter in (index or FrontMatterIndex()).collection(portfolio_dir)]
+
+def apply_config(cv_json, config):
+    """Set the parts of the CV that come from _config.yml."""
+    cv_json["basics"] = extract_author_info(config)
+    cv_json["languages"] = config.get('languages', [])
+    cv_json["interests"] = config.get('interests', [])
+
+def apply_markdown_sections(cv_json, sections):
+    """Set the parts of the CV that come from the markdown CV."""
+    cv_json["work"] = parse_work_experience(sections.get('Work experience', ''))
+    cv_json["education"] = parse_education(sections.get('Education', ''))
+    cv_json["skills"] = parse_skills(sections.get('Skills', ''))
+
+def output_compressions(output_file, compress):
+    """Drop pre-compression for outputs inside _data.
+
+    Jekyll tries to load every file in _data as data, so a cv.json.gz there
+    would break the build; pre-compressed copies only make sense for files
+    that are served as static assets.
+    """
+    if compress and os.path.basename(os.path.dirname(os.path.abspath(output_file))) == '_data':
+        print(f"Not pre-compressing {output_file}: Jekyll would try to load the compressed copy as data")
+        return ()
+    return tuple(compress or ())
+
+def write_cv_json(cv_json, output_file, compact=False, compress=()):
+    """Write the CV atomically, leaving the file untouched if nothing changed.
+
+    Returns True if the file was written.
+    """
+    return write_json(cv_json, output_file, compact=compact, compress=output_compressions(output_file, compress))
+
+def create_cv_json(md_file, config_file, repo_root, output_file, timings=False,
+                   executor='serial', workers=None, compact=False, compress=()):
+    """Create a JSON CV from markdown and other repository data.
+
+    Each section is streamed to disk as soon as it is built; the output file
+    is only replaced if the result differs from what is already there.
+    """
+    start = time.perf_counter()
+    writer = StreamingJSONWriter(output_file, compact=compact,
+                                 compress=output_compressions(output_file, compress))
+    with writer:
+        # Parse config file
+        with instrumentation.phase("config"):
+            config = parse_config(config_file, os.path.join(repo_root, CONFIG_CACHE_FILE))
+            writer.write_section("basics", extract_author_info(config))
+        
+        # Parse the markdown CV
+        with instrumentation.phase("markdown"):
+            sections = parse_markdown_cv(md_file)
+            writer.write_section("work", parse_work_experience(sections.get('Work experience', '')))
+            writer.write_section("education", parse_education(sections.get('Education', '')))
+            writer.write_section("skills", parse_skills(sections.get('Skills', '')))
+        
+        # Extract languages and interests from config if available
+        writer.write_section("languages", config.get('languages', []))
+        writer.write_section("interests", config.get('interests', []))
+        writer.write_section("references", [])
         
-        # Extract front matter
-        front_matter_match = re.match(r'^---\s*(.*?)\s*---', content, re.DOTALL)
-        if front_matter_match:
-            front_matter = yaml.safe_load(front_matter_match.group(1))
+        # Collection front matter is read through a shared index that is kept on
+        # disk, so files that have not changed since the last build are not re-read
+        index = FrontMatterIndex(os.path.join(repo_root, DEFAULT_INDEX_FILE))
+        
+        # Parse new and changed files of all four collections up front, optionally
+        # on a thread or process pool; the sections below then read from the index
+        collection_dirs = [os.path.join(repo_root, name) for name, _, _ in COLLECTION_SECTIONS]
+        scan_start = time.perf_counter()
+        pool = make_executor(executor, workers)
+        try:
+            with instrumentation.phase("scan", executor=executor):
+                index.scan(collection_dirs, pool, workers)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        scan_time = time.perf_counter() - scan_start
+        
+        with instrumentation.phase("collections"):
+            # Add publications
+            writer.write_section("publications", parse_publications(os.path.join(repo_root, "_publications"), index))
             
-            # Extract portfolio details
-            portfolio_entry = {
-                "name": front_matter.get('title', ''),
-                "category": front_matter.get('collection', 'portfolio'),
-                "date": front_matter.get('date', ''),
-                "url": front_matter.get('permalink', ''),
-                "description": front_matter.get('excerpt', '')
-            }
+            # Add talks
+            writer.write_section("presentations", parse_talks(os.path.join(repo_root, "_talks"), index))
             
-            portfolio.append(portfolio_entry)
-    
-    return portfolio
-
-def create_cv_json(md_file, config_file, repo_root, output_file):
-    """Create a JSON CV from markdown and other repository data."""
-    # Parse the markdown CV
-    sections = parse_markdown_cv(md_file)
-    
-    # Parse config file
-    config = parse_config(config_file)
-    
-    # Extract author information
-    author_info = extract_author_info(config)
-    
-    # Create the JSON structure
-    cv_json = {
-        "basics": author_info,
-        "work": parse_work_experience(sections.get('Work experience', '')),
-        "education": parse_education(sections.get('Education', '')),
-        "skills": parse_skills(sections.get('Skills', '')),
-        "languages": [],
-        "interests": [],
-        "references": []
-    }
-    
-    # Add publications
-    cv_json["publications"] = parse_publications(os.path.join(repo_root, "_publications"))
-    
-    # Add talks
-    cv_json["presentations"] = parse_talks(os.path.join(repo_root, "_talks"))
-    
-    # Add teaching
-    cv_json["teaching"] = parse_teaching(os.path.join(repo_root, "_teaching"))
-    
-    # Add portfolio
-    cv_json["portfolio"] = parse_portfolio(os.path.join(repo_root, "_portfolio"))
-    
-    # Extract languages and interests from config if available
-    if 'languages' in config:
-        cv_json["languages"] = config.get('languages', [])
-    
-    if 'interests' in config:
-        cv_json["interests"] = config.get('interests', [])
-    
-    # Write the JSON to a file
-    with open(output_file, 'w', encoding='utf-8') as file:
-        json.dump(cv_json, file, indent=2, cls=DateTimeEncoder)
-    
-    print(f"Successfully converted {md_file} to {output_file}")
+            # Add teaching
+            writer.write_section("teaching", parse_teaching(os.path.join(repo_root, "_teaching"), index))
+            
+            # Add portfolio
+            writer.write_section("portfolio", parse_portfolio(os.path.join(repo_root, "_portfolio"), index))
+    
+    with instrumentation.phase("save_index"):
+        index.prune()
+        index.save()
+    instrumentation.record({"frontmatter_hits": index.hits, "frontmatter_parsed": index.misses,
+                            "yaml_documents": yaml_loader.stats["documents"],
+                            "bytes_written": os.path.getsize(output_file) if writer.changed else 0})
+    
+    if timings:
+        print(yaml_loader.report())
+        print(f"Front matter index: {index.hits} unchanged, {index.misses} parsed")
+        print(f"Collection scan ({executor}): {scan_time * 1000:.1f} ms")
+        print(f"Total ({backend_name()} encoder): {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    if writer.changed:
+        print(f"Successfully converted {md_file} to {output_file}")
+    else:
+        print(f"{output_file} is already up to date")
 
 def main():
     """Main function to parse arguments and run the conversion."""
+    import argparse
+    from pathlib import Path
+    
     parser = argparse.ArgumentParser(description='Convert markdown CV to JSON format')
     parser.add_argument('--input', '-i', required=True, help='Input markdown CV file')
     parser.add_argument('--output', '-o', required=True, help='Output JSON file')
     parser.add_argument('--config', '-c', help='Jekyll _config.yml file')
+    parser.add_argument('--timings', action='store_true', help='Report time spent on YAML parsing and file I/O')
+    parser.add_argument('--executor', choices=['serial', 'thread', 'process'], default='serial',
+                        help='How to scan the collection directories')
+    parser.add_argument('--workers', '-j', type=int, help='Worker count for --executor thread/process')
+    parser.add_argument('--watch', '-w', action='store_true',
+                        help='Keep running and update the output whenever an input changes')
+    parser.add_argument('--poll', action='store_true',
+                        help='In watch mode, poll for changes even if watchdog is installed')
+    parser.add_argument('--interval', type=float, default=0.5, help='Polling interval in seconds')
+    parser.add_argument('--compact', action='store_true', help='Write minified JSON without indentation')
+    parser.add_argument('--compress', action='append', choices=COMPRESSIONS,
+                        help='Also write a pre-compressed copy next to the output (repeatable)')
     
     args = parser.parse_args()
     
     # Get repository root (parent directory of the input file's directory)
     repo_root = str(Path(args.input).parent.parent)
     
-    create_cv_json(args.input, args.config, repo_root, args.output)
+    instrumentation.start("cv_markdown_to_json")
+    if args.watch:
+        from cv_watch import watch
+        watch(args.input, args.config, repo_root, args.output, poll=args.poll, interval=args.interval,
+              compact=args.compact, compress=args.compress)
+        return
+    
+    create_cv_json(args.input, args.config, repo_root, args.output, timings=args.timings,
+                   executor=args.executor, workers=args.workers, compact=args.compact,
+                   compress=args.compress)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Watch mode for cv_markdown_to_json.py
+
+Keeps the CV document in memory and listens for changes to the markdown CV,
+_config.yml and the collection directories. Only the changed file is parsed
+again, only the matching section of the document is patched, and the output
+is rewritten atomically when its content actually differs.
+
+Uses watchdog for filesystem events when it is installed, and otherwise polls
+file modification times.
+"""
+
+import os
+import threading
+import time
+
+import cv_markdown_to_json as cv
+import instrumentation
+from frontmatter_index import FrontMatterIndex, DEFAULT_INDEX_FILE
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class PollingBackend:
+    """Detect changes by comparing (mtime, size) snapshots."""
+
+    def __init__(self, files, directories, interval=0.5, sleep=time.sleep):
+        self.files = [os.path.abspath(path) for path in files]
+        self.directories = [os.path.abspath(path) for path in directories]
+        self.interval = interval
+        self.sleep = sleep
+        self.state = self.snapshot()
+
+    def snapshot(self):
+        state = {path: _signature(path) for path in self.files}
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.name.endswith('.md'):
+                    stat = entry.stat()
+                    state[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def poll(self):
+        """Return the set of paths created, modified or deleted since the last poll."""
+        state = self.snapshot()
+        changed = {path for path in state.keys() | self.state.keys()
+                   if state.get(path) != self.state.get(path)}
+        self.state = state
+        return changed
+
+    def wait(self):
+        """Block until something changes, then return the changed paths."""
+        while True:
+            changed = self.poll()
+            if changed:
+                return changed
+            self.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class WatchdogBackend:
+    """Collect filesystem events from watchdog, batching bursts of events."""
+
+    def __init__(self, files, directories, debounce=0.05):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        self.files = {os.path.abspath(path) for path in files}
+        self.directories = {os.path.abspath(path) for path in directories}
+        self.debounce = debounce
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+
+        backend = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for path in (event.src_path, getattr(event, 'dest_path', '')):
+                    if path and backend.relevant(os.path.abspath(path)):
+                        with backend.lock:
+                            backend.pending.add(os.path.abspath(path))
+                        backend.event.set()
+
+        self.observer = Observer()
+        for directory in self.directories | {os.path.dirname(path) for path in self.files}:
+            if os.path.isdir(directory):
+                self.observer.schedule(Handler(), directory, recursive=False)
+        self.observer.start()
+
+    def relevant(self, path):
+        return path in self.files or (path.endswith('.md') and os.path.dirname(path) in self.directories)
+
+    def wait(self):
+        while True:
+            self.event.wait()
+            # Editors often save in several steps; let the burst settle
+            time.sleep(self.debounce)
+            with self.lock:
+                changed, self.pending = self.pending, set()
+                self.event.clear()
+            if changed:
+                return changed
+
+    def close(self):
+        self.observer.stop()
+        self.observer.join()
+
+
+def make_backend(files, directories, poll=False, interval=0.5):
+    """Return a watchdog backend when available (and not disabled), else a polling one."""
+    if not poll:
+        try:
+            return WatchdogBackend(files, directories)
+        except ImportError:
+            pass
+    return PollingBackend(files, directories, interval)
+
+
+class CVWatcher:
+    """The CV document kept in memory and patched one file at a time."""
+
+    def __init__(self, md_file, config_file, repo_root, output_file, index=None,
+                 compact=False, compress=()):
+        self.compact = compact
+        self.compress = compress
+        self.md_file = os.path.abspath(md_file)
+        self.config_file = os.path.abspath(config_file) if config_file else None
+        self.output_file = output_file
+        self.index = index or FrontMatterIndex(os.path.join(repo_root, DEFAULT_INDEX_FILE))
+
+        self.cv_json = {
+            "basics": {},
+            "work": [],
+            "education": [],
+            "skills": [],
+            "languages": [],
+            "interests": [],
+            "references": []
+        }
+        cv.apply_config(self.cv_json, cv.parse_config(self.config_file))
+        cv.apply_markdown_sections(self.cv_json, cv.parse_markdown_cv(self.md_file))
+
+        # Collection directory -> (section name, entry builder, {path: entry})
+        self.collections = {}
+        for name, section, build_entry in cv.COLLECTION_SECTIONS:
+            directory = os.path.abspath(os.path.join(repo_root, name))
+            entries = {os.path.abspath(path): build_entry(front_matter)
+                       for path, front_matter in self.index.collection(directory)}
+            self.collections[directory] = (section, build_entry, entries)
+            self.cv_json[section] = [entries[path] for path in sorted(entries)]
+
+    @property
+    def directories(self):
+        return list(self.collections)
+
+    @property
+    def files(self):
+        return [path for path in (self.md_file, self.config_file) if path]
+
+    def apply(self, paths):
+        """Patch the document for a set of changed paths.
+
+        Returns the names of the sections that were updated.
+        """
+        updated = []
+        for path in sorted(os.path.abspath(path) for path in paths):
+            if path == self.md_file:
+                if os.path.exists(path):
+                    cv.apply_markdown_sections(self.cv_json, cv.parse_markdown_cv(path))
+                    updated.append('work/education/skills')
+            elif path == self.config_file:
+                cv.apply_config(self.cv_json, cv.parse_config(path))
+                updated.append('basics')
+            elif os.path.dirname(path) in self.collections and path.endswith('.md'):
+                section, build_entry, entries = self.collections[os.path.dirname(path)]
+                front_matter = self.index.metadata(path) if os.path.exists(path) else None
+                if front_matter is None:
+                    entries.pop(path, None)
+                    self.index.entries.pop(path, None)
+                else:
+                    entries[path] = build_entry(front_matter)
+                self.cv_json[section] = [entries[key] for key in sorted(entries)]
+                updated.append(section)
+        return updated
+
+    def write(self):
+        """Write the output if it differs from what is on disk; save the index."""
+        self.index.save()
+        return cv.write_cv_json(self.cv_json, self.output_file, compact=self.compact, compress=self.compress)
+
+
+def watch(md_file, config_file, repo_root, output_file, poll=False, interval=0.5,
+          compact=False, compress=()):
+    """Run until interrupted, keeping `output_file` in sync with its inputs."""
+    watcher = CVWatcher(md_file, config_file, repo_root, output_file, compact=compact, compress=compress)
+    watcher.write()
+    backend = make_backend(watcher.files, watcher.directories, poll=poll, interval=interval)
+    print(f"Watching {md_file}, {config_file} and {len(watcher.directories)} collections "
+          f"({type(backend).__name__}); press Ctrl-C to stop")
+    try:
+        while True:
+            changed = backend.wait()
+            start = time.perf_counter()
+            with instrumentation.phase("apply", files=len(changed)):
+                updated = watcher.apply(changed)
+            with instrumentation.phase("write"):
+                written = watcher.write() if updated else False
+            instrumentation.count("updates")
+            elapsed = (time.perf_counter() - start) * 1000
+            status = f"wrote {output_file}" if written else "output unchanged"
+            print(f"Updated {', '.join(sorted(set(updated))) or 'nothing'} in {elapsed:.1f} ms, {status}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.close()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Shared front matter index for the site collections
+
+Reads only the YAML front matter block of each Markdown file, parses it once,
+and persists the result keyed by (path, mtime, size), so later builds skip
+files that have not changed. Files that do need parsing can be spread over a
+thread or process pool with FrontMatterIndex.scan().
+"""
+
+import argparse
+import glob
+import os
+import pickle
+import time
+
+import yaml_loader
+
+# Collections served from the index
+COLLECTIONS = ("_publications", "_talks", "_teaching", "_portfolio", "_posts")
+
+# Bump when the shape of the stored records changes, to discard old indexes
+INDEX_VERSION = 1
+DEFAULT_INDEX_FILE = os.path.join(".build-cache", "frontmatter-index.pickle")
+
+
+def read_front_matter(path):
+    """Return the raw front matter block of a Markdown file, or None.
+
+    Stops reading at the closing delimiter, so the body is never loaded.
+    """
+    start = time.perf_counter()
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            first = file.readline()
+            if first.rstrip() != '---':
+                return None
+            lines = []
+            for line in file:
+                if line.rstrip() == '---':
+                    return ''.join(lines)
+                lines.append(line)
+        return None
+    finally:
+        yaml_loader.stats['io'] += time.perf_counter() - start
+
+
+def parse_file(path):
+    """Read and parse the front matter of one file."""
+    block = read_front_matter(path)
+    return yaml_loader.load(block) if block is not None else None
+
+
+def _parse_file_in_worker(path):
+    """parse_file for a process pool; also returns the worker's timing deltas,
+    which would otherwise be lost with the worker process."""
+    before = dict(yaml_loader.stats)
+    front_matter = parse_file(path)
+    return front_matter, {key: yaml_loader.stats[key] - before[key] for key in before}
+
+
+def is_process_pool(executor):
+    from concurrent.futures import ProcessPoolExecutor
+    return isinstance(executor, ProcessPoolExecutor)
+
+
+def pool_size(workers=None):
+    """The number of workers make_executor() starts for `workers`."""
+    return workers or os.cpu_count() or 1
+
+
+def make_executor(kind, workers=None):
+    """Return a thread or process pool executor, or None for 'serial'."""
+    if kind == 'thread':
+        from concurrent.futures import ThreadPoolExecutor
+        return ThreadPoolExecutor(max_workers=pool_size(workers))
+    if kind == 'process':
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=pool_size(workers))
+    return None
+
+
+class FrontMatterIndex:
+    """Parsed front matter for collection files, cached on disk."""
+
+    def __init__(self, index_file=None):
+        self.index_file = index_file
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.scanned = set()
+        if index_file and os.path.exists(index_file):
+            try:
+                with open(index_file, 'rb') as file:
+                    data = pickle.load(file)
+                if data.get('version') == INDEX_VERSION:
+                    self.entries = data['entries']
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError):
+                self.entries = {}
+
+    def metadata(self, path):
+        """Return the parsed front matter of `path` (None if it has none)."""
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self.entries.get(key)
+        if cached is not None and cached[0] == signature:
+            # Files parsed by scan() in this run were already counted as misses
+            if key not in self.scanned:
+                self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        front_matter = parse_file(path)
+        self.entries[key] = (signature, front_matter)
+        self.dirty = True
+        return front_matter
+
+    def scan(self, directories, executor=None, workers=None):
+        """Parse every new or changed file in `directories` on `executor`,
+        made by make_executor() with the same `workers`.
+
+        Results are stored in the index, so the collection() calls that follow
+        are served from memory in their usual sorted order.
+        """
+        stale = []
+        for directory in directories:
+            for path in sorted(glob.glob(os.path.join(directory, "*.md"))):
+                stat = os.stat(path)
+                key = os.path.abspath(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                cached = self.entries.get(key)
+                if cached is None or cached[0] != signature:
+                    stale.append((key, signature))
+
+        paths = [key for key, _ in stale]
+        if executor is None:
+            results = [parse_file(path) for path in paths]
+        elif is_process_pool(executor):
+            results = []
+            chunksize = max(1, len(paths) // (4 * pool_size(workers)))
+            for front_matter, deltas in executor.map(_parse_file_in_worker, paths, chunksize=chunksize):
+                for name, delta in deltas.items():
+                    yaml_loader.stats[name] += delta
+                results.append(front_matter)
+        else:
+            # map() returns results in submission order, keeping the output deterministic
+            results = list(executor.map(parse_file, paths))
+
+        for (key, signature), front_matter in zip(stale, results):
+            self.entries[key] = (signature, front_matter)
+            self.scanned.add(key)
+        self.misses += len(stale)
+        if stale:
+            self.dirty = True
+
+    def collection(self, directory):
+        """Return (path, front_matter) pairs for every Markdown file in `directory`,
+        sorted by path. Files without front matter are skipped."""
+        if not os.path.exists(directory):
+            return []
+        items = []
+        for path in sorted(glob.glob(os.path.join(directory, "*.md"))):
+            front_matter = self.metadata(path)
+            if front_matter is not None:
+                items.append((path, front_matter))
+        return items
+
+    def prune(self):
+        """Forget files that no longer exist."""
+        for key in [key for key in self.entries if not os.path.exists(key)]:
+            del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        """Write the index atomically if anything changed."""
+        if not self.index_file or not self.dirty:
+            return
+        directory = os.path.dirname(self.index_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.index_file + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump({'version': INDEX_VERSION, 'entries': self.entries}, file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_file)
+        self.dirty = False
+
+
+def main():
+    """Refresh the index for every collection in the repository."""
+    parser = argparse.ArgumentParser(description='Refresh the front matter index of the site collections')
+    parser.add_argument('--root', '-r', default=str(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                        help='Repository root')
+    args = parser.parse_args()
+
+    index = FrontMatterIndex(os.path.join(args.root, DEFAULT_INDEX_FILE))
+    for name in COLLECTIONS:
+        print(f"{name}: {len(index.collection(os.path.join(args.root, name)))} files")
+    index.prune()
+    index.save()
+    print(f"Index: {index.hits} unchanged, {index.misses} parsed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Offline gazetteer: the first geocoding tier for the talk map
+
+Most talk locations are a city with a state or country ("Berkeley, CA, USA",
+"London, UK"), which a local place-name file resolves without a network call.
+The gazetteer reads a GeoNames-style TSV (for example cities15000.txt from
+https://download.geonames.org/export/dump/, licensed CC BY 4.0) and builds:
+
+* a sorted index of normalized place names (primary, ASCII and Latin-script
+  alternate names) for exact and prefix lookups;
+* a trigram index of the primary names for fuzzy matching of misspellings;
+* a k-d tree over the places' unit vectors, for "lat, lon" locations and
+  nearest-place queries.
+
+The index is written once to a single binary file and memory-mapped on later
+runs, so loading it costs an mmap() and a small JSON header regardless of the
+size of the gazetteer. It is rebuilt when the source file changes. Exact
+lookups binary-search the mapped arrays and take microseconds. Fuzzy lookups
+read at most FUZZY_SCAN_POSTINGS trigram postings, rarest first, and take
+about a millisecond or two on 100,000 places. Only locations the gazetteer
+cannot resolve confidently go on to Nominatim.
+"""
+
+import array
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter
+
+from geocoding import CachedLocation
+
+DEFAULT_SOURCE = os.environ.get("TALKMAP_GAZETTEER", os.path.join("talkmap", "gazetteer.tsv"))
+DEFAULT_INDEX_FILE = os.path.join(".build-cache", "gazetteer.idx")
+
+# Bump when the layout of the index file changes
+INDEX_VERSION = 2
+MAGIC = b"GAZ1"
+
+# Minimum trigram (Dice) similarity for a fuzzy match, and the shortest query
+# worth matching fuzzily
+FUZZY_THRESHOLD = 0.7
+FUZZY_MIN_LENGTH = 4
+# Prefix matches scanned per query, e.g. "san fran" -> "san francisco"
+PREFIX_LIMIT = 64
+# Trigram postings read per fuzzy query, rarest first, and the names sharing
+# the most trigrams with the query that are then scored
+FUZZY_SCAN_POSTINGS = 16384
+FUZZY_CANDIDATES = 64
+
+# GeoNames columns
+_NAME, _ASCIINAME, _ALTERNATES, _LATITUDE, _LONGITUDE = 1, 2, 3, 4, 5
+_COUNTRY, _ADMIN1, _POPULATION = 8, 10, 14
+
+_separators = re.compile(r"[^\w]+")
+_latin_name = re.compile(r"[a-z0-9 ]+")
+_coordinates = re.compile(r"\s*(-?\d{1,2}(?:\.\d+)?)\s*[,;]\s*(-?\d{1,3}(?:\.\d+)?)\s*")
+
+# Two-letter US state codes; GeoNames uses them as the admin1 code of US places
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "district of columbia": "DC",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID", "illinois": "IL",
+    "indiana": "IN", "iowa": "IA", "kansas": "KS", "kentucky": "KY", "louisiana": "LA",
+    "maine": "ME", "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
+    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK", "oregon": "OR",
+    "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC", "south dakota": "SD",
+    "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT", "virginia": "VA",
+    "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+    "puerto rico": "PR",
+}
+_STATE_CODES = {code.lower(): code for code in US_STATES.values()}
+
+# Country names and common spellings, by ISO 3166 code. Two-letter codes that
+# appear in the gazetteer are recognized as well, after US state codes.
+COUNTRIES = {
+    "usa": "US", "us": "US", "u s a": "US", "u s": "US", "united states": "US",
+    "united states of america": "US", "america": "US",
+    "uk": "GB", "u k": "GB", "united kingdom": "GB", "great britain": "GB", "britain": "GB",
+    "england": "GB", "scotland": "GB", "wales": "GB", "northern ireland": "GB",
+    "canada": "CA", "mexico": "MX", "brazil": "BR", "argentina": "AR", "chile": "CL",
+    "colombia": "CO", "peru": "PE", "ireland": "IE", "france": "FR", "germany": "DE",
+    "deutschland": "DE", "netherlands": "NL", "the netherlands": "NL", "holland": "NL",
+    "belgium": "BE", "luxembourg": "LU", "switzerland": "CH", "austria": "AT", "italy": "IT",
+    "spain": "ES", "portugal": "PT", "denmark": "DK", "norway": "NO", "sweden": "SE",
+    "finland": "FI", "iceland": "IS", "poland": "PL", "czech republic": "CZ", "czechia": "CZ",
+    "slovakia": "SK", "hungary": "HU", "romania": "RO", "bulgaria": "BG", "greece": "GR",
+    "croatia": "HR", "serbia": "RS", "slovenia": "SI", "estonia": "EE", "latvia": "LV",
+    "lithuania": "LT", "ukraine": "UA", "russia": "RU", "russian federation": "RU",
+    "turkey": "TR", "turkiye": "TR", "israel": "IL", "egypt": "EG", "morocco": "MA",
+    "south africa": "ZA", "nigeria": "NG", "kenya": "KE", "ethiopia": "ET", "ghana": "GH",
+    "saudi arabia": "SA", "united arab emirates": "AE", "uae": "AE", "qatar": "QA",
+    "iran": "IR", "india": "IN", "pakistan": "PK", "bangladesh": "BD", "sri lanka": "LK",
+    "nepal": "NP", "china": "CN", "prc": "CN", "people s republic of china": "CN",
+    "hong kong": "HK", "taiwan": "TW", "japan": "JP", "south korea": "KR", "korea": "KR",
+    "republic of korea": "KR", "singapore": "SG", "malaysia": "MY", "thailand": "TH",
+    "vietnam": "VN", "viet nam": "VN", "indonesia": "ID", "philippines": "PH",
+    "australia": "AU", "new zealand": "NZ",
+}
+
+
+def normalize_name(text):
+    """Casefold, strip accents and collapse punctuation and spaces, so
+    "São Paulo" and "sao paulo" share a key."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _separators.sub(" ", text).replace("_", " ").strip()
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _unit_vector(latitude, longitude):
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def _kd_order(points):
+    """Permutation of `points` laid out as an implicit k-d tree: the root of
+    rows [lo, hi) is row (lo + hi) // 2, split on axis depth % 3."""
+    order = list(range(len(points)))
+    stack = [(0, len(order), 0)]
+    while stack:
+        lo, hi, depth = stack.pop()
+        if hi - lo <= 1:
+            continue
+        axis = depth % 3
+        order[lo:hi] = sorted(order[lo:hi], key=lambda i: points[i][axis])
+        mid = (lo + hi) // 2
+        stack.append((lo, mid, depth + 1))
+        stack.append((mid + 1, hi, depth + 1))
+    return order
+
+
+def _read_places(path):
+    """Yield (names, latitude, longitude, country, admin1, population) per row."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            row = line.rstrip("\n").split("\t")
+            if len(row) <= _POPULATION:
+                continue
+            try:
+                latitude, longitude = float(row[_LATITUDE]), float(row[_LONGITUDE])
+                population = int(row[_POPULATION] or 0)
+            except ValueError:
+                continue
+            names = [row[_NAME], row[_ASCIINAME]] + row[_ALTERNATES].split(",")
+            yield names, latitude, longitude, row[_COUNTRY], row[_ADMIN1], population
+
+
+def _string_table(strings):
+    """Concatenated UTF-8 blob and the offsets of each string in it."""
+    offsets = array.array("I", [0])
+    blob = bytearray()
+    for text in strings:
+        blob += text.encode("utf-8")
+        offsets.append(len(blob))
+    return blob, offsets
+
+
+def _postings(keys, mapping):
+    """Offsets and ids of the posting list of each key, in key order."""
+    offsets = array.array("I", [0])
+    ids = array.array("I")
+    for key in keys:
+        ids.extend(sorted(mapping[key]))
+        offsets.append(len(ids))
+    return offsets, ids
+
+
+def build_index(source, index_file=DEFAULT_INDEX_FILE):
+    """Build the index file for the gazetteer at `source`."""
+    rows = list(_read_places(source))
+    vectors = [_unit_vector(latitude, longitude) for _, latitude, longitude, *_ in rows]
+    order = _kd_order(vectors)
+
+    names = {}
+    primary = {}
+    labels = []
+    coordinates = {name: array.array("d") for name in ("x", "y", "z", "latitude", "longitude")}
+    population = array.array("I")
+    countries = set()
+    for place, row_number in enumerate(order):
+        row_names, latitude, longitude, country, admin1, people = rows[row_number]
+        for column, value in zip(("x", "y", "z", "latitude", "longitude"),
+                                 vectors[row_number] + (latitude, longitude)):
+            coordinates[column].append(value)
+        population.append(min(people, 0xFFFFFFFF))
+        labels.append(f"{row_names[0]}\t{country}\t{admin1}")
+        countries.add(country)
+        for position, name in enumerate(row_names):
+            key = normalize_name(name)
+            # Scripts other than Latin would never match a talk location written in it
+            if not key or len(key) > 60 or not _latin_name.fullmatch(key):
+                continue
+            names.setdefault(key, set()).add(place)
+            if position < 2:
+                primary.setdefault(key, set()).add(place)
+
+    name_keys = sorted(names)
+    key_ids = {key: number for number, key in enumerate(name_keys)}
+    trigrams = {}
+    for key in primary:
+        for trigram in _trigrams(key):
+            trigrams.setdefault(trigram, set()).add(key_ids[key])
+    trigram_keys = sorted(trigrams)
+
+    sections = dict(coordinates, population=population)
+    sections["labels"], sections["label_offsets"] = _string_table(labels)
+    sections["names"], sections["name_offsets"] = _string_table(name_keys)
+    sections["name_post_offsets"], sections["name_posts"] = _postings(name_keys, names)
+    sections["trigrams"], sections["trigram_offsets"] = _string_table(trigram_keys)
+    sections["trigram_post_offsets"], sections["trigram_posts"] = _postings(trigram_keys, trigrams)
+
+    stat = os.stat(source)
+    header = {"version": INDEX_VERSION, "source": os.path.abspath(source), "size": stat.st_size,
+              "mtime": stat.st_mtime_ns, "byteorder": sys.byteorder, "places": len(labels),
+              "countries": sorted(countries), "sections": {}}
+    # Sections are laid out after the header, each aligned to 8 bytes
+    payload = []
+    offset = 0
+    for name, data in sections.items():
+        raw = bytes(data) if isinstance(data, bytearray) else data.tobytes()
+        typecode = "B" if isinstance(data, bytearray) else data.typecode
+        header["sections"][name] = [offset, typecode, len(raw)]
+        payload.append(raw + b"\0" * (-len(raw) % 8))
+        offset += len(payload[-1])
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-(len(header_bytes) + 8) % 8)
+
+    directory = os.path.dirname(index_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = index_file + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + len(header_bytes).to_bytes(4, "little") + header_bytes)
+        for raw in payload:
+            f.write(raw)
+    os.replace(tmp_path, index_file)
+
+
+class Gazetteer:
+    """Memory-mapped place-name index with exact, prefix, fuzzy and nearest lookups."""
+
+    def __init__(self, index_file):
+        with open(index_file, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:4] != MAGIC:
+            raise ValueError(f"{index_file} is not a gazetteer index")
+        length = int.from_bytes(self._map[4:8], "little")
+        self.header = json.loads(self._map[8:8 + length])
+        base = 8 + length
+        view = memoryview(self._map)
+        for name, (offset, typecode, size) in self.header["sections"].items():
+            setattr(self, name, view[base + offset:base + offset + size].cast(typecode))
+        self.countries = set(self.header["countries"])
+        self.hits = 0
+        self.fuzzy_hits = 0
+
+    @classmethod
+    def open(cls, source=DEFAULT_SOURCE, index_file=DEFAULT_INDEX_FILE):
+        """Map the index for `source`, building it first if it is missing or
+        stale. Returns None if there is no gazetteer file."""
+        if not os.path.exists(source):
+            return None
+        stat = os.stat(source)
+        try:
+            gazetteer = cls(index_file)
+            header = gazetteer.header
+            if (header.get("version") == INDEX_VERSION and header.get("byteorder") == sys.byteorder
+                    and header.get("source") == os.path.abspath(source)
+                    and header.get("size") == stat.st_size and header.get("mtime") == stat.st_mtime_ns):
+                return gazetteer
+            gazetteer.close()
+        except (OSError, ValueError, KeyError):
+            pass
+        build_index(source, index_file)
+        return cls(index_file)
+
+    def close(self):
+        for name in self.header["sections"]:
+            getattr(self, name).release()
+        self._map.close()
+
+    def __len__(self):
+        return self.header["places"]
+
+    # ## Lookups
+
+    def _string(self, blob, offsets, number):
+        return bytes(blob[offsets[number]:offsets[number + 1]]).decode("utf-8")
+
+    def _find(self, blob, offsets, key, prefix=False):
+        """Index of `key` in a sorted string table (or of the first string
+        starting with it), and whether it was found."""
+        lo, hi = 0, len(offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string(blob, offsets, mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = lo < len(offsets) - 1 and (self._string(blob, offsets, lo).startswith(key) if prefix
+                                            else self._string(blob, offsets, lo) == key)
+        return lo, found
+
+    def _places(self, key_id):
+        return self.name_posts[self.name_post_offsets[key_id]:self.name_post_offsets[key_id + 1]]
+
+    def place(self, number):
+        """(name, country, admin1, latitude, longitude, population) of a place."""
+        name, country, admin1 = self._string(self.labels, self.label_offsets, number).split("\t")
+        return name, country, admin1, self.latitude[number], self.longitude[number], self.population[number]
+
+    def _best(self, places, country, admin1):
+        """The most populous of `places` in `country` and `admin1`, if given."""
+        best = None
+        for number in places:
+            if country or admin1:
+                _, place_country, place_admin1 = self._string(self.labels, self.label_offsets, number).split("\t")
+                if (country and place_country != country) or (admin1 and place_admin1 != admin1):
+                    continue
+            if best is None or self.population[number] > self.population[best]:
+                best = number
+        return best
+
+    def exact(self, key, country=None, admin1=None):
+        """Place number for a normalized name, or None."""
+        key_id, found = self._find(self.names, self.name_offsets, key)
+        return self._best(self._places(key_id), country, admin1) if found else None
+
+    def fuzzy(self, key, country=None, admin1=None):
+        """(similarity, place number) of the closest name by prefix or trigram
+        similarity, or (0, None)."""
+        if len(key) < FUZZY_MIN_LENGTH:
+            return 0.0, None
+        scores = {}
+        first, found = self._find(self.names, self.name_offsets, key, prefix=True)
+        if found:
+            for key_id in range(first, min(first + PREFIX_LIMIT, len(self.name_offsets) - 1)):
+                candidate = self._string(self.names, self.name_offsets, key_id)
+                if not candidate.startswith(key):
+                    break
+                scores[key_id] = len(key) / len(candidate)
+        query = _trigrams(key)
+        postings = []
+        for trigram in query:
+            number, found = self._find(self.trigrams, self.trigram_offsets, trigram)
+            if found:
+                start, end = self.trigram_post_offsets[number], self.trigram_post_offsets[number + 1]
+                postings.append(self.trigram_posts[start:end])
+        # A name sharing c of the query's q trigrams scores at most 2c / (q + c),
+        # so it needs this many to reach the threshold at all, and is then in
+        # at least one of the q - needed + 1 rarest posting lists (trigrams
+        # missing from the index count as empty lists)
+        needed = math.ceil(FUZZY_THRESHOLD * len(query) / (2 - FUZZY_THRESHOLD) - 1e-9)
+        enough = len(postings) - needed + 1
+        # Candidates come from the rarest lists only, up to FUZZY_SCAN_POSTINGS
+        # ids, so common trigrams like "  s" are never walked; the names found
+        # in most of them are then scored against their own trigrams
+        postings.sort(key=len)
+        shared = Counter()
+        scanned = 0
+        for number, posting in enumerate(postings[:max(enough, 0)]):
+            if number and scanned + len(posting) > FUZZY_SCAN_POSTINGS:
+                break
+            shared.update(posting)
+            scanned += len(posting)
+        for key_id, _ in shared.most_common(FUZZY_CANDIDATES):
+            candidate = _trigrams(self._string(self.names, self.name_offsets, key_id))
+            similarity = 2 * len(query & candidate) / (len(query) + len(candidate))
+            if similarity > scores.get(key_id, 0.0):
+                scores[key_id] = similarity
+
+        best = (0.0, None)
+        for key_id, score in sorted(scores.items(), key=lambda item: -item[1]):
+            if score < FUZZY_THRESHOLD or score < best[0]:
+                break
+            place = self._best(self._places(key_id), country, admin1)
+            if place is not None and (best[1] is None or self.population[place] > self.population[best[1]]):
+                best = (score, place)
+        return best
+
+    def nearest(self, latitude, longitude):
+        """Number of the place closest to a coordinate, or None if empty."""
+        target = _unit_vector(latitude, longitude)
+        axes = (self.x, self.y, self.z)
+        best, best_distance = None, float("inf")
+        stack = [(0, len(self), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            distance = sum((axis[mid] - value) ** 2 for axis, value in zip(axes, target))
+            if distance < best_distance:
+                best, best_distance = mid, distance
+            difference = target[depth % 3] - axes[depth % 3][mid]
+            near, far = ((mid + 1, hi), (lo, mid)) if difference > 0 else ((lo, mid), (mid + 1, hi))
+            # Push the far side first so the near side is searched first
+            if difference * difference < best_distance:
+                stack.append((far[0], far[1], depth + 1))
+            stack.append((near[0], near[1], depth + 1))
+        return best
+
+    # ## Geocoding
+
+    def _parse(self, location):
+        """Split a location into normalized candidate names, most specific
+        last, the country and US state it names, if any, and the country a
+        trailing two-letter code names if it is not a state ("Berlin, DE")."""
+        parts = [normalize_name(part) for part in location.split(",")]
+        parts = [part for part in parts if part]
+        country = admin1 = alternative = None
+        while parts:
+            last = parts[-1]
+            if last in COUNTRIES and country in (None, COUNTRIES[last]):
+                country = COUNTRIES[last]
+            elif last in _STATE_CODES and country in (None, "US") and admin1 is None:
+                if country is None and last.upper() in self.countries:
+                    alternative = last.upper()
+                country, admin1 = "US", _STATE_CODES[last]
+            elif last in US_STATES and country in (None, "US") and admin1 is None:
+                country, admin1 = "US", US_STATES[last]
+            elif len(last) == 2 and last.upper() in self.countries and country is None:
+                country = last.upper()
+            else:
+                break
+            parts.pop()
+        return parts, country, admin1, alternative
+
+    def _label(self, number):
+        name, country, admin1, *_ = self.place(number)
+        return f"{name}, {admin1}, {country}" if country == "US" and admin1 else f"{name}, {country}"
+
+    def geocode(self, location, **kwargs):
+        """Resolve a location string offline; returns a CachedLocation or None.
+
+        Accepts geopy's keyword arguments so it can stand in for a geocoder.
+        """
+        match = _coordinates.fullmatch(location)
+        if match:
+            latitude, longitude = float(match.group(1)), float(match.group(2))
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180 and len(self):
+                self.hits += 1
+                return CachedLocation(self._label(self.nearest(latitude, longitude)), latitude, longitude)
+
+        parts, country, admin1, alternative = self._parse(location)
+        candidates = []
+        for number, part in reversed(list(enumerate(parts))):
+            # A name followed by a qualifier that is neither a country nor a
+            # state ("London, ON") is only trusted within a known country;
+            # otherwise the most populous namesake would be a confident wrong
+            # answer, so the location is left to the online geocoder
+            if country is not None or number == len(parts) - 1:
+                candidates.append((part, country, admin1))
+            if alternative:
+                candidates.append((part, alternative, None))
+            # "Berkeley CA" written without a comma
+            head, _, tail = part.rpartition(" ")
+            if head and tail in _STATE_CODES and country in (None, "US"):
+                candidates.append((head, "US", _STATE_CODES[tail]))
+
+        for name, place_country, state in candidates:
+            place = self.exact(name, place_country, state)
+            if place is not None:
+                break
+        else:
+            best = (0.0, None)
+            for name, place_country, state in candidates:
+                best = max(best, self.fuzzy(name, place_country, state), key=lambda result: result[0])
+            place = best[1]
+            if place is None:
+                return None
+            self.fuzzy_hits += 1
+        self.hits += 1
+        _, _, _, latitude, longitude, _ = self.place(place)
+        return CachedLocation(self._label(place), latitude, longitude)
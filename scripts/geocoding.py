@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Persistent, concurrent geocoding for the talk map
+
+Lookups are keyed on a normalized form of the location string and stored as
+JSON lines, so a rebuild where no talk location changed makes no geocoder
+calls at all. Cache misses are first tried against an optional local tier
+(the offline gazetteer in gazetteer.py), and what is left is deduplicated and
+resolved on a small thread pool behind a token bucket, with timeouts retried
+instead of dropped. Any object with a geopy-style geocode(query, timeout=...)
+method can be used as the backend, which keeps all of this usable offline with
+a stub.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Default cache location, next to the generated map. Jekyll skips dotfiles.
+DEFAULT_CACHE_FILE = os.path.join("talkmap", ".geocode-cache.jsonl")
+
+# Successful lookups are kept for 180 days, failed lookups for 7 days
+DEFAULT_TTL = 180 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 7 * 24 * 3600
+
+_whitespace = re.compile(r"\s+")
+_comma_spacing = re.compile(r"\s*,\s*")
+
+
+class CachedLocation(namedtuple("CachedLocation", "address latitude longitude")):
+    """Minimal stand-in for geopy.Location, as consumed by getorg."""
+    __slots__ = ()
+
+    def __str__(self):
+        return self.address
+
+
+def normalize_location(location):
+    """Normalize a location string so trivially different spellings share a key."""
+    key = _whitespace.sub(" ", location.strip().casefold())
+    key = _comma_spacing.sub(", ", key)
+    return key.strip(" ,.")
+
+
+class GeocodeCache:
+    """Wrap a geocoder with an on-disk cache, including negative caching."""
+
+    def __init__(self, geocoder, path=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, clock=time.time):
+        self.geocoder = geocoder
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """Read the cache file; later lines override earlier ones."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Skip a torn line left behind by an interrupted run
+                    continue
+                self.entries[record["key"]] = record
+
+    def save(self):
+        """Rewrite the cache file atomically, sorted for stable diffs."""
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for key in sorted(self.entries):
+                file.write(json.dumps(self.entries[key], ensure_ascii=False, sort_keys=True) + "\n")
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def _is_fresh(self, record):
+        ttl = self.ttl if record.get("latitude") is not None else self.negative_ttl
+        return self.clock() - record.get("fetched", 0) < ttl
+
+    def lookup(self, location):
+        """Return (hit, result) from the cache without touching the geocoder."""
+        record = self.entries.get(normalize_location(location))
+        if record is None or not self._is_fresh(record):
+            return False, None
+        if record.get("latitude") is None:
+            return True, None
+        return True, CachedLocation(record.get("address", ""), record["latitude"], record["longitude"])
+
+    def store(self, location, result):
+        """Record a geocoder result; None is stored as a negative entry."""
+        record = {"key": normalize_location(location), "query": location, "fetched": self.clock()}
+        if result is not None:
+            record["address"] = str(getattr(result, "address", result))
+            record["latitude"] = result.latitude
+            record["longitude"] = result.longitude
+        self.entries[record["key"]] = record
+        self.dirty = True
+        if result is None:
+            return None
+        return CachedLocation(record["address"], result.latitude, result.longitude)
+
+    def geocode(self, location, **kwargs):
+        """Geocode through the cache. Exceptions from the backend are not cached."""
+        hit, result = self.lookup(location)
+        if hit:
+            self.hits += 1
+            return result
+        self.misses += 1
+        return self.store(location, self.geocoder.geocode(location, **kwargs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.save()
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second."""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+def _resolve(geocoder, location, bucket, timeout, retries, backoff, retry_on, sleep):
+    """Geocode one location, retrying timeouts with exponential backoff."""
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        bucket.acquire()
+        try:
+            result = geocoder.geocode(location, timeout=timeout)
+            return result, None, time.perf_counter() - start
+        except retry_on as ex:
+            if attempt >= retries:
+                return None, ex, time.perf_counter() - start
+            sleep(backoff * (2 ** attempt))
+            attempt += 1
+        except Exception as ex:
+            return None, ex, time.perf_counter() - start
+
+
+def geocode_all(cache, locations, rate=1.0, workers=4, timeout=5, retries=3,
+                backoff=1.0, retry_on=(TimeoutError,), sleep=time.sleep, local=None):
+    """Geocode an iterable of location strings through `cache`.
+
+    Identical locations (after normalization) are looked up once, and only
+    cache misses reach the backend, so the cost grows with the number of
+    unique, uncached locations. `local` is an offline geocoder tried before
+    the backend; its results are not cached, since it is as fast as the cache.
+    Returns a dict mapping each input location to a (result, error, latency)
+    tuple; latency is 0.0 for cache hits.
+    """
+    results = {}
+    pending = {}
+    for location in locations:
+        if location in results:
+            continue
+        hit, result = cache.lookup(location)
+        if hit:
+            cache.hits += 1
+            results[location] = (result, None, 0.0)
+        else:
+            pending.setdefault(normalize_location(location), []).append(location)
+
+    if local is not None:
+        for key, spellings in list(pending.items()):
+            start = time.perf_counter()
+            result = local.geocode(spellings[0])
+            if result is not None:
+                for location in spellings:
+                    results[location] = (result, None, time.perf_counter() - start)
+                del pending[key]
+
+    if not pending:
+        return results
+
+    bucket = TokenBucket(rate)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            key: pool.submit(_resolve, cache.geocoder, spellings[0], bucket, timeout,
+                             retries, backoff, retry_on, sleep)
+            for key, spellings in pending.items()
+        }
+        for key, future in futures.items():
+            result, error, latency = future.result()
+            cache.misses += 1
+            if error is None:
+                result = cache.store(pending[key][0], result)
+            for location in pending[key]:
+                results[location] = (result, error, latency)
+    return results
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Opt-in phase timing, counters and profiling for the site data generators
+
+Every entry point calls start() with its name and wraps its steps in phase()
+blocks; library code bumps counters with count(). Nothing is reported unless
+one of these environment variables is set:
+
+  SITE_TIMINGS=1            print phase totals and counters to stderr at exit
+  SITE_TRACE=trace.json     write a Chrome trace (chrome://tracing, Perfetto,
+                            speedscope) of every phase, plus the counters;
+                            "{name}" in the path is replaced by the entry point
+  SITE_PROFILE=cprofile     profile the whole run; the top functions are
+                            printed and the stats saved as a .prof file under
+                            .build-cache/profiles/ for flame-graph viewers
+  SITE_PROFILE=tracemalloc  report the peak Python heap and the largest
+                            allocation sites
+
+When none is set, phase() is a shared no-op context manager and count() a
+dict update, so the calls can stay in hot paths.
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_DIR = os.path.join(REPO_ROOT, ".build-cache", "profiles")
+PROFILERS = ("cprofile", "tracemalloc")
+
+# Counters for the current run, e.g. rows, bytes_written, cache_hits
+counters = {}
+
+_name = None
+_enabled = False
+_origin = 0
+_events = []
+_totals = {}
+_profiler = None
+_null_phase = contextlib.nullcontext()
+
+
+def enabled():
+    return _enabled
+
+
+def count(name, n=1):
+    """Add `n` to a counter."""
+    counters[name] = counters.get(name, 0) + n
+
+
+def record(values):
+    """Add every value of a dict of counters."""
+    for name, n in values.items():
+        count(name, n)
+
+
+class _Phase:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        _totals[self.name] = _totals.get(self.name, 0) + (end - self.start)
+        _events.append((self.name, self.start, end, threading.get_ident(), self.args))
+
+
+def phase(name, **args):
+    """Time a block as a named phase. Keyword arguments are stored with the
+    trace event."""
+    if not _enabled:
+        return _null_phase
+    return _Phase(name, args)
+
+
+def start(name):
+    """Start instrumenting the run of entry point `name`, if any of the
+    environment variables is set. Reports are produced at interpreter exit."""
+    global _name, _enabled, _origin, _profiler
+    _name = name
+    counters.clear()
+    _events.clear()
+    _totals.clear()
+    _enabled = bool(os.environ.get("SITE_TIMINGS") or os.environ.get("SITE_TRACE")
+                    or os.environ.get("SITE_PROFILE"))
+    if not _enabled:
+        return
+    _origin = time.perf_counter_ns()
+
+    profiler = os.environ.get("SITE_PROFILE")
+    if profiler == "cprofile":
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    elif profiler == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start(10)
+        _profiler = tracemalloc
+    elif profiler:
+        print(f"SITE_PROFILE: unknown profiler {profiler!r}, expected one of {', '.join(PROFILERS)}",
+              file=sys.stderr)
+    atexit.register(finish)
+
+
+def _report_cprofile():
+    import pstats
+    _profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{_name}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+    _profiler.dump_stats(path)
+    stats = pstats.Stats(_profiler, stream=sys.stderr)
+    stats.sort_stats("cumulative").print_stats(20)
+    print(f"Profile saved to {path}", file=sys.stderr)
+
+
+def _report_tracemalloc():
+    import tracemalloc
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    print(f"[{_name}] Python heap: peak {peak / 2**20:.1f} MB, {current / 2**20:.1f} MB at exit",
+          file=sys.stderr)
+    for stat in snapshot.statistics("lineno")[:10]:
+        print(f"  {stat}", file=sys.stderr)
+
+
+def write_trace(path):
+    """Write the recorded phases and counters in Chrome trace event format."""
+    pid = os.getpid()
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": _name}}]
+    for name, begin, end, tid, args in _events:
+        events.append({"name": name, "cat": _name, "ph": "X", "pid": pid, "tid": tid,
+                       "ts": (begin - _origin) / 1000, "dur": (end - begin) / 1000,
+                       "args": args})
+    if counters:
+        events.append({"name": "counters", "ph": "C", "pid": pid,
+                       "ts": (time.perf_counter_ns() - _origin) / 1000, "args": dict(counters)})
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                   "otherData": {"entry_point": _name, "counters": counters}}, file)
+    os.replace(tmp_path, path)
+
+
+def summary():
+    """Return the phase totals and counters as printable lines."""
+    lines = [f"[{_name}] {(time.perf_counter_ns() - _origin) / 1e6:.1f} ms total"]
+    for name, total in sorted(_totals.items(), key=lambda item: -item[1]):
+        lines.append(f"  {name:<24} {total / 1e6:10.1f} ms")
+    for name, value in sorted(counters.items()):
+        lines.append(f"  {name:<24} {value:>10}")
+    return "\n".join(lines)
+
+
+def finish():
+    """Stop profiling and produce the requested reports. Runs once, at exit."""
+    global _enabled, _profiler
+    if not _enabled:
+        return
+    if os.environ.get("SITE_PROFILE") == "cprofile" and _profiler is not None:
+        _report_cprofile()
+    elif os.environ.get("SITE_PROFILE") == "tracemalloc" and _profiler is not None:
+        _report_tracemalloc()
+    _profiler = None
+
+    if os.environ.get("SITE_TIMINGS"):
+        print(summary(), file=sys.stderr)
+    trace = os.environ.get("SITE_TRACE")
+    if trace:
+        trace = trace.replace("{name}", _name)
+        write_trace(trace)
+        print(f"[{_name}] trace written to {trace}", file=sys.stderr)
+    _enabled = False
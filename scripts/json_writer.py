@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Streaming JSON output for the site data scripts
+
+Writes a top-level JSON object one section at a time to a temporary file, so
+each section can go to disk as soon as it is produced, then replaces the
+target atomically only if the bytes differ. Uses orjson when it is installed,
+which serializes dates natively; the standard library encoder is the
+fallback. Can also write pre-compressed .gz (and .br, when the brotli module
+is installed) siblings for files that are served as static assets.
+"""
+
+import hashlib
+import json
+import os
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Supported pre-compression formats
+COMPRESSIONS = ("gzip", "brotli")
+
+
+def _isoformat(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def make_encoder(compact=False):
+    """Return a function encoding a value as UTF-8 JSON bytes.
+
+    Indented output uses two spaces per level; compact output has no
+    whitespace at all.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (0 if compact else orjson.OPT_INDENT_2)
+        return lambda value: orjson.dumps(value, option=option)
+    if compact:
+        return lambda value: json.dumps(value, separators=(',', ':'), ensure_ascii=False,
+                                        default=_isoformat).encode('utf-8')
+    # ASCII escapes, as json.dump wrote them before, so an existing file is not
+    # rewritten just because non-ASCII characters are now written raw
+    return lambda value: json.dumps(value, indent=2, default=_isoformat).encode('utf-8')
+
+
+def backend_name():
+    return "orjson" if orjson is not None else "json"
+
+
+class StreamingJSONWriter:
+    """Write a JSON object section by section, replacing the target atomically.
+
+    Usage:
+        with StreamingJSONWriter(path) as writer:
+            writer.write_section("basics", basics)
+            ...
+        writer.changed  # True if the file on disk was replaced
+    """
+
+    def __init__(self, path, compact=False, compress=()):
+        self.path = path
+        self.compact = compact
+        self.compress = tuple(compress)
+        self.encode = make_encoder(compact)
+        self.tmp_path = path + '.tmp'
+        self.digest = hashlib.sha1()
+        self.file = None
+        self.sections = 0
+        self.changed = False
+
+    def _write(self, data):
+        self.file.write(data)
+        self.digest.update(data)
+
+    def open(self):
+        self.file = open(self.tmp_path, 'wb')
+        self._write(b'{')
+        return self
+
+    def write_section(self, key, value):
+        """Append one key of the top-level object and flush it to disk."""
+        encoded = self.encode(value)
+        if self.compact:
+            prefix = b',' if self.sections else b''
+            self._write(prefix + self.encode(key) + b':' + encoded)
+        else:
+            prefix = b',\n  ' if self.sections else b'\n  '
+            # JSON strings cannot contain raw newlines, so this only re-indents
+            self._write(prefix + self.encode(key) + b': ' + encoded.replace(b'\n', b'\n  '))
+        self.file.flush()
+        self.sections += 1
+
+    def close(self):
+        """Finish the object; replace the target if its content changed."""
+        if self.compact or not self.sections:
+            self._write(b'}')
+        else:
+            self._write(b'\n}')
+        self.file.close()
+        self.file = None
+
+        if _file_sha1(self.path) == self.digest.hexdigest():
+            os.remove(self.tmp_path)
+        else:
+            os.replace(self.tmp_path, self.path)
+            self.changed = True
+
+        for kind in self.compress:
+            write_compressed(self.path, kind, force=self.changed)
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _file_sha1(path):
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_compressed(path, kind, force=False):
+    """Write `path`.gz or `path`.br next to `path`. Returns the sibling path, or
+    None if the compressor is not available."""
+    if kind == "gzip":
+        import gzip
+        sibling = path + '.gz'
+
+        def compress(data):
+            # mtime=0 keeps the bytes stable when the content is unchanged
+            return gzip.compress(data, compresslevel=9, mtime=0)
+    elif kind == "brotli":
+        try:
+            import brotli
+        except ImportError:
+            return None
+        sibling = path + '.br'
+
+        def compress(data):
+            return brotli.compress(data, quality=11)
+    else:
+        raise ValueError(f"Unknown compression {kind!r}, expected one of {COMPRESSIONS}")
+
+    if not force and os.path.exists(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(path):
+        return sibling
+    with open(path, 'rb') as file:
+        data = compress(file.read())
+    with open(sibling + '.tmp', 'wb') as file:
+        file.write(data)
+    os.replace(sibling + '.tmp', sibling)
+    return sibling
+
+
+def write_json(data, path, compact=False, compress=()):
+    """Write a dict through StreamingJSONWriter; returns True if the file changed."""
+    with StreamingJSONWriter(path, compact=compact, compress=compress) as writer:
+        for key, value in data.items():
+            writer.write_section(key, value)
+    return writer.changed
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Build-time marker clustering for the talk map
+
+The map page used to load every talk as a marker and cluster them with
+Leaflet.markercluster on each page load. Instead, the clusters for every zoom
+level are computed here once, on the same 80 px radius markercluster used:
+
+* talks at the same coordinates become one place, with one popup listing them;
+* from the highest zoom down, the clusters of the level above are grouped by
+  the cell of an 80 px grid in Web Mercator pixels, whose cells nest from one
+  zoom to the next, and each group becomes a cluster at its talk-weighted
+  centroid;
+* levels are kept down from the first zoom at which every place stands alone,
+  since the levels above it are identical.
+
+Each level is split into 256 px tiles, written as compact JSON under
+talkmap/clusters/{z}/{x}-{y}.json, with an index of the non-empty tiles in
+talkmap/clusters/index.json. map.html loads the index and then only the tiles
+in view at the current zoom, and draws the few markers in them. A cluster is
+[lat, lon, talks, zoom], where zoom is the level at which it splits; a place is
+[lat, lon, [description, ...]].
+
+The index records a fingerprint of the points, so a rebuild with the same
+talks writes nothing, and when they change only tiles whose content differs
+are rewritten.
+"""
+
+import hashlib
+import json
+import math
+import os
+from typing import NamedTuple
+
+DEFAULT_FOLDER = "talkmap"
+
+# Bump when the tile format or the clustering changes
+FORMAT_VERSION = 1
+
+# Cluster radius in screen pixels, as maxClusterRadius on the old markercluster map
+CLUSTER_RADIUS = 80
+TILE_SIZE = 256
+# Highest zoom of the base map
+MAX_ZOOM = 18
+# Decimal places kept for coordinates in the tiles (about a meter)
+PRECISION = 5
+
+_MAX_LATITUDE = 85.0511287798
+
+
+class Node(NamedTuple):
+    x: float          # Web Mercator position in [0, 1)
+    y: float
+    latitude: float
+    longitude: float
+    talks: int
+    places: int
+    children: tuple   # indices into the level one zoom above
+    expansion: int    # zoom at which a cluster splits, -1 for a place
+    descriptions: tuple  # talks at a place, empty for a cluster
+
+
+def project(latitude, longitude):
+    """Web Mercator position of a coordinate, with both axes in [0, 1)."""
+    latitude = max(-_MAX_LATITUDE, min(_MAX_LATITUDE, latitude))
+    sine = math.sin(math.radians(latitude))
+    x = longitude / 360 + 0.5
+    y = 0.5 - math.log((1 + sine) / (1 - sine)) / (4 * math.pi)
+    return min(max(x, 0.0), 1 - 1e-12), min(max(y, 0.0), 1 - 1e-12)
+
+
+def unproject(x, y):
+    """Inverse of project()."""
+    latitude = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return latitude, (x - 0.5) * 360
+
+
+def places(points):
+    """Merge (description, latitude, longitude) points at the same coordinates
+    into place nodes, in a deterministic order."""
+    grouped = {}
+    for description, latitude, longitude in points:
+        grouped.setdefault((round(latitude, 7), round(longitude, 7)), []).append(description)
+    nodes = []
+    for (latitude, longitude), descriptions in sorted(grouped.items()):
+        x, y = project(latitude, longitude)
+        nodes.append(Node(x, y, latitude, longitude, len(descriptions), 1, (), -1,
+                          tuple(sorted(descriptions))))
+    return nodes
+
+
+def build_levels(points, max_zoom=MAX_ZOOM, radius=CLUSTER_RADIUS):
+    """Return the list of cluster levels, indexed by zoom.
+
+    The last level is the first zoom at which no two places are clustered.
+    """
+    levels = {max_zoom: places(points)}
+    for zoom in range(max_zoom - 1, -1, -1):
+        cell = radius / (TILE_SIZE * 2 ** zoom)
+        groups = {}
+        for number, node in enumerate(levels[zoom + 1]):
+            groups.setdefault((int(node.x / cell), int(node.y / cell)), []).append(number)
+        level = []
+        for members in groups.values():
+            nodes = [levels[zoom + 1][number] for number in members]
+            if len(nodes) == 1:
+                level.append(nodes[0]._replace(children=tuple(members)))
+                continue
+            talks = sum(node.talks for node in nodes)
+            x = sum(node.x * node.talks for node in nodes) / talks
+            y = sum(node.y * node.talks for node in nodes) / talks
+            latitude, longitude = unproject(x, y)
+            level.append(Node(x, y, latitude, longitude, talks, sum(node.places for node in nodes),
+                              tuple(members), zoom + 1, ()))
+        levels[zoom] = level
+
+    count = len(levels[max_zoom])
+    top = next(zoom for zoom in range(max_zoom + 1) if len(levels[zoom]) == count)
+    return [levels[zoom] for zoom in range(top + 1)]
+
+
+def _entry(node):
+    latitude, longitude = round(node.latitude, PRECISION), round(node.longitude, PRECISION)
+    if node.places == 1:
+        return [latitude, longitude, list(node.descriptions)]
+    return [latitude, longitude, node.talks, node.expansion]
+
+
+def tiles(levels):
+    """Map each (zoom, x, y) tile to the entries of the nodes in it."""
+    result = {}
+    for zoom, level in enumerate(levels):
+        scale = 2 ** zoom
+        for node in sorted(level, key=lambda node: (node.y, node.x)):
+            key = (zoom, int(node.x * scale), int(node.y * scale))
+            result.setdefault(key, []).append(_entry(node))
+    return result
+
+
+def fingerprint(points, radius=CLUSTER_RADIUS):
+    """Digest of the points and of everything else that shapes the tiles."""
+    digest = hashlib.sha1(f"{FORMAT_VERSION}:{radius}:{MAX_ZOOM}:{PRECISION}".encode("utf-8"))
+    for point in sorted(points):
+        digest.update(json.dumps(point).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _write_if_changed(path, text):
+    """Write `text` to `path` unless it already holds it; returns True if written."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def write_clusters(points, folder=DEFAULT_FOLDER, radius=CLUSTER_RADIUS):
+    """Write the cluster tiles and index for (description, latitude, longitude)
+    points under folder/clusters.
+
+    Returns a dict of counts: tiles written, unchanged and removed, or None if
+    the points are the same as for the existing index.
+    """
+    points = [(description, float(latitude), float(longitude)) for description, latitude, longitude in points]
+    directory = os.path.join(folder, "clusters")
+    index_file = os.path.join(directory, "index.json")
+    key = fingerprint(points, radius)
+    try:
+        with open(index_file, "r", encoding="utf-8") as f:
+            if json.load(f).get("fingerprint") == key:
+                return None
+    except (OSError, ValueError):
+        pass
+
+    levels = build_levels(points, radius=radius)
+    contents = tiles(levels)
+    counts = {"written": 0, "unchanged": 0, "removed": 0}
+    names = set()
+    for (zoom, x, y), entries in contents.items():
+        os.makedirs(os.path.join(directory, str(zoom)), exist_ok=True)
+        path = os.path.join(directory, str(zoom), f"{x}-{y}.json")
+        names.add(os.path.relpath(path, directory))
+        counts["written" if _write_if_changed(path, _dumps(entries) + "\n") else "unchanged"] += 1
+
+    # Drop tiles and zoom levels left over from the previous points
+    for root, dirs, files in os.walk(directory, topdown=False):
+        for name in files:
+            path = os.path.join(root, name)
+            if root != directory and os.path.relpath(path, directory) not in names:
+                os.remove(path)
+                counts["removed"] += 1
+        if root != directory and not os.listdir(root):
+            os.rmdir(root)
+
+    index = {
+        "version": FORMAT_VERSION,
+        "fingerprint": key,
+        "radius": radius,
+        "maxZoom": len(levels) - 1,
+        "talks": len(points),
+        "tiles": [sorted(f"{x}-{y}" for z, x, y in contents if z == zoom) for zoom in range(len(levels))],
+    }
+    os.makedirs(directory, exist_ok=True)
+    # Written last, so an interrupted run is redone on the next one
+    _write_if_changed(index_file, _dumps(index) + "\n")
+    return counts
+
+
+def write_address_points(points, folder=DEFAULT_FOLDER):
+    """Write org-locations.js with one marker per talk, in the format getorg
+    wrote, for pages that still cluster in the browser."""
+    data = [[description, latitude, longitude] for description, latitude, longitude in points]
+    return _write_if_changed(os.path.join(folder, "org-locations.js"),
+                             "var addressPoints = " + json.dumps(data, indent=2) + ";")
+
+
+def write_map_page(folder=DEFAULT_FOLDER):
+    """Write map.html, which draws the precomputed clusters."""
+    return _write_if_changed(os.path.join(folder, "map.html"), MAP_PAGE)
+
+
+MAP_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+	<title>Talk map</title>
+
+	<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.0.0-beta.2/leaflet.css" />
+	<script src="https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.0.0-beta.2/leaflet.js"></script>
+	<meta name="viewport" content="width=device-width, initial-scale=1.0">
+	<link rel="stylesheet" href="leaflet_dist/screen.css" />
+
+	<link rel="stylesheet" href="leaflet_dist/MarkerCluster.css" />
+	<link rel="stylesheet" href="leaflet_dist/MarkerCluster.Default.css" />
+
+</head>
+<body>
+
+	<div id="map"></div>
+	<span>Click a cluster to zoom in on the talks in it</span>
+	<script type="text/javascript">
+		var tiles = L.tileLayer('http://server.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}', {
+			maxZoom: 18,
+			attribution: 'Tiles &copy; Esri &mdash; Source: Esri, DeLorme, NAVTEQ, USGS, Intermap, iPC, NRCAN, Esri Japan, METI, Esri China (Hong Kong), Esri (Thailand), TomTom, 2012'
+			}),
+			latlng = L.latLng(30, 10);
+		var map = L.map('map', {center: latlng, zoom: 0.7, layers: [tiles]});
+
+		// Clusters are precomputed per zoom level by talkmap.py (scripts/mapclusters.py)
+		// and split into 256 px tiles; only the tiles in view are fetched.
+		var markers = L.layerGroup().addTo(map);
+		var index = null, cache = {}, drawn = {}, level = -1, generation = 0;
+
+		function fetchJSON(url, callback) {
+			var request = new XMLHttpRequest();
+			request.onload = function () {
+				if (request.status === 200) callback(JSON.parse(request.responseText));
+			};
+			request.open('GET', url);
+			request.send();
+		}
+
+		function tileOf(latitude, longitude, zoom) {
+			var scale = Math.pow(2, zoom), last = scale - 1;
+			var sine = Math.sin(Math.max(-85.0511, Math.min(85.0511, latitude)) * Math.PI / 180);
+			var x = Math.floor((longitude / 360 + 0.5) * scale);
+			var y = Math.floor((0.5 - Math.log((1 + sine) / (1 - sine)) / (4 * Math.PI)) * scale);
+			return [Math.max(0, Math.min(last, x)), Math.max(0, Math.min(last, y))];
+		}
+
+		function clusterIcon(talks) {
+			var size = talks < 10 ? 'small' : talks < 100 ? 'medium' : 'large';
+			return L.divIcon({html: '<div><span>' + talks + '</span></div>',
+				className: 'marker-cluster marker-cluster-' + size, iconSize: L.point(40, 40)});
+		}
+
+		function draw(entries) {
+			entries.forEach(function (a) {
+				var marker;
+				if (typeof a[2] === 'number') {
+					marker = L.marker([a[0], a[1]], {icon: clusterIcon(a[2])});
+					marker.on('click', function () { map.setView([a[0], a[1]], a[3]); });
+				} else {
+					marker = L.marker([a[0], a[1]], {title: a[2].join('\\n')});
+					marker.bindPopup(a[2].join('<hr />'));
+				}
+				markers.addLayer(marker);
+			});
+		}
+
+		function update() {
+			if (!index) return;
+			var zoom = Math.max(0, Math.min(index.maxZoom, Math.floor(map.getZoom())));
+			if (zoom !== level) {
+				markers.clearLayers();
+				drawn = {};
+				level = zoom;
+				generation++;
+			}
+			var available = {};
+			index.tiles[zoom].forEach(function (name) { available[name] = true; });
+			var bounds = map.getBounds();
+			var low = tileOf(bounds.getNorth(), bounds.getWest(), zoom);
+			var high = tileOf(bounds.getSouth(), bounds.getEast(), zoom);
+			for (var x = low[0] - 1; x <= high[0] + 1; x++) {
+				for (var y = low[1] - 1; y <= high[1] + 1; y++) {
+					var name = x + '-' + y, key = zoom + '/' + name;
+					if (!available[name] || drawn[key]) continue;
+					drawn[key] = true;
+					load(key, generation);
+				}
+			}
+		}
+
+		function load(key, current) {
+			if (cache[key]) return draw(cache[key]);
+			fetchJSON('clusters/' + key + '.json', function (entries) {
+				cache[key] = entries;
+				// Skip tiles that arrive after the map moved to another zoom level
+				if (current === generation) draw(entries);
+			});
+		}
+
+		map.on('moveend', update);
+		fetchJSON('clusters/index.json', function (data) { index = data; update(); });
+		map.zoomIn();
+	</script>
+</body>
+</html>
+"""
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Content-based related posts, precomputed into _data/related.json
+
+Jekyll's own related posts are just the most recent ones unless LSI is
+enabled, and its LSI is far too slow to turn on. This script finds, for every
+document in _posts, _portfolio and _publications, the documents whose text is
+most similar by TF-IDF cosine similarity:
+
+* each document's title, tags and body are tokenized into term counts, which
+  are cached per file in .build-cache/related-terms.pickle, keyed by
+  (mtime, size), so a rebuild only reads and tokenizes new or changed files;
+* the counts are weighted with sublinear TF and smoothed IDF, and every row is
+  normalized to unit length. Terms found in a single document still count
+  towards its length but cannot make two documents similar, so they are
+  dropped from the matrix, which keeps it small;
+* neighbours are found a block of rows at a time, with one matrix product of
+  the block against the whole matrix and argpartition for the top k. SciPy's
+  sparse matrices are used when SciPy is installed, a dense NumPy matrix over
+  the shared terms otherwise, and a pure-Python inverted index when NumPy is
+  not installed either.
+
+The output maps each document's path to its neighbours, best first, with the
+fields _includes/archive-single.html shows (url, title, excerpt, date, venue,
+word count and so on), and is only rewritten when an entry changes.
+_layouts/single.html shows them instead of site.related_posts when they are
+there, without looking the documents up in site.documents.
+"""
+
+import argparse
+import math
+import os
+import pickle
+import re
+from collections import Counter
+
+import instrumentation
+import yaml_loader
+from archive_index import document_url, front_matter_defaults, post_date
+from json_writer import write_json
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLLECTIONS = ("_posts", "_portfolio", "_publications")
+DEFAULT_OUTPUT = os.path.join("_data", "related.json")
+DEFAULT_CACHE_FILE = os.path.join(".build-cache", "related-terms.pickle")
+
+# Bump when tokenization or the cached fields change, to discard the cache
+CACHE_VERSION = 2
+
+# Neighbours kept per document; single.html shows four
+TOP = 4
+# Documents less similar than this are not listed at all
+MIN_SCORE = 0.05
+# Rows multiplied against the whole matrix at a time
+BLOCK_ROWS = 256
+# Title and tag words count as this many occurrences in the body
+TITLE_WEIGHT = 3
+# Front matter copied into the output for archive-single.html, and needed for the URL
+CARD_FIELDS = ("title", "excerpt", "date", "venue", "type", "link", "header", "read_time",
+               "citation", "paperurl", "slidesurl", "bibtexurl",
+               "permalink", "slug", "category", "categories")
+
+STOP_WORDS = frozenset("""
+about above after again against all also and any are because been before being below between
+both but can could did does doing down during each few for from further had has have having
+her here hers him his how into its just more most not now off once only other our ours out
+over own same she should some such than that the their theirs them then there these they
+this those through too under until very was were what when where which while who whom why
+will with would you your yours one two may might must use used using via per new get got
+""".split())
+
+_markup = re.compile(r"```.*?```|\{%.*?%\}|\{\{.*?\}\}|<[^>]*>|\]\([^)]*\)|https?://\S+", re.DOTALL)
+_word = re.compile(r"[a-z][a-z0-9]+")
+_tags = re.compile(r"<[^>]*>")
+_liquid = re.compile(r"\{%.*?%\}|\{\{.*?\}\}", re.DOTALL)
+
+
+def read_document(path):
+    """Return the (front matter, body) of a Markdown file."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.startswith("---"):
+        parts = re.split(r"^---\s*$", text, maxsplit=2, flags=re.MULTILINE)
+        if len(parts) == 3:
+            front_matter = yaml_loader.load(parts[1])
+            return (front_matter if isinstance(front_matter, dict) else {}), parts[2]
+    return {}, text
+
+
+def strip_markup(text):
+    """Text without code blocks, Liquid tags, HTML tags, link targets and URLs."""
+    return _markup.sub(" ", text)
+
+
+def tokenize(text):
+    """Lowercased words of three or more characters, without markup or stop words."""
+    return [word for word in _word.findall(strip_markup(text.lower()))
+            if len(word) > 2 and word not in STOP_WORDS]
+
+
+def document_terms(front_matter, body):
+    """Term counts of a document, with its title and tags weighted up."""
+    counts = Counter(tokenize(body))
+    tags = front_matter.get("tags") or []
+    heading = " ".join([str(front_matter.get("title") or "")] +
+                       [str(tag) for tag in (tags.split() if isinstance(tags, str) else tags)])
+    for word in tokenize(heading):
+        counts[word] += TITLE_WEIGHT
+    return counts
+
+
+def card(front_matter, body):
+    """The front matter archive-single.html shows, with the word count that
+    read-time.html needs and Jekyll's default excerpt, the first paragraph."""
+    fields = {field: front_matter[field] for field in CARD_FIELDS if front_matter.get(field) is not None}
+    if "excerpt" not in fields:
+        paragraph = _liquid.sub("", body).strip().split("\n\n")[0].strip()
+        if paragraph:
+            fields["excerpt"] = paragraph
+    fields["words"] = len(_tags.sub(" ", body).split())
+    return fields
+
+
+def analyze(front_matter, body):
+    """What TermCache keeps for related posts: (published, term counts, card)."""
+    return (front_matter.get("published") is not False, dict(document_terms(front_matter, body)),
+            card(front_matter, body))
+
+
+class TermCache:
+    """Per-file results of `analyze(front_matter, body)`, cached on disk.
+
+    The default analysis is the term counts used here; search_index.py passes
+    its own, with its own cache file and version.
+    """
+
+    def __init__(self, cache_file=None, analyze=analyze, version=CACHE_VERSION):
+        self.cache_file = cache_file
+        self.analyze = analyze
+        self.version = version
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == self.version:
+                    self.entries = data["entries"]
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError):
+                self.entries = {}
+
+    def terms(self, path):
+        """Return the analysis of `path`, from the cache if the file is unchanged."""
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self.entries.get(key)
+        if cached is not None and cached[0] == signature:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        front_matter, body = read_document(path)
+        value = self.analyze(front_matter, body)
+        self.entries[key] = (signature, value)
+        self.dirty = True
+        return value
+
+    def prune(self, keep):
+        """Forget every file not in `keep`."""
+        keep = {os.path.abspath(path) for path in keep}
+        for key in [key for key in self.entries if key not in keep]:
+            del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        """Write the cache atomically if anything changed."""
+        if not self.cache_file or not self.dirty:
+            return
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_file + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": self.version, "entries": self.entries}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.cache_file)
+        self.dirty = False
+
+
+def collect(root, cache, collections=COLLECTIONS, cards=None):
+    """(path relative to root, term counts) of every published document, by path.
+
+    If `cards` is a dict, the card of each document is stored in it by path.
+    """
+    documents = []
+    seen = []
+    for collection in collections:
+        directory = os.path.join(root, collection)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".md"):
+                continue
+            path = os.path.join(directory, name)
+            seen.append(path)
+            published, counts, fields = cache.terms(path)
+            if published and counts:
+                documents.append((f"{collection}/{name}", counts))
+                if cards is not None:
+                    cards[f"{collection}/{name}"] = fields
+    cache.prune(seen)
+    return documents
+
+
+def tfidf_rows(documents):
+    """Unit-length TF-IDF rows of the documents, over the terms they share.
+
+    Returns the number of shared terms and, per document, a list of
+    (term number, weight) pairs sorted by term number.
+    """
+    frequency = Counter()
+    for _, counts in documents:
+        frequency.update(counts.keys())
+    count = len(documents)
+    idf = {term: math.log((1 + count) / (1 + df)) + 1 for term, df in frequency.items()}
+    shared = sorted(term for term, df in frequency.items() if df > 1)
+    numbers = {term: number for number, term in enumerate(shared)}
+
+    rows = []
+    for _, counts in documents:
+        weights = {term: (1 + math.log(tf)) * idf[term] for term, tf in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        rows.append(sorted((numbers[term], weight / norm) for term, weight in weights.items()
+                           if term in numbers))
+    return len(shared), rows
+
+
+def _ranked(candidates, top, min_score):
+    """The best `top` (score, number) pairs, with ties broken by number."""
+    ranked = sorted(((round(score, 6), number) for score, number in candidates if score >= min_score),
+                    key=lambda item: (-item[0], item[1]))
+    return [number for _, number in ranked[:top]]
+
+
+def neighbours_python(rows, top=TOP, min_score=MIN_SCORE):
+    """Top neighbours of each row with an inverted index; no NumPy needed."""
+    postings = {}
+    for number, row in enumerate(rows):
+        for term, weight in row:
+            postings.setdefault(term, []).append((number, weight))
+    result = []
+    for number, row in enumerate(rows):
+        scores = {}
+        for term, weight in row:
+            for other, other_weight in postings[term]:
+                if other != number:
+                    scores[other] = scores.get(other, 0.0) + weight * other_weight
+        result.append(_ranked(((score, other) for other, score in scores.items()), top, min_score))
+    return result
+
+
+def neighbours_numpy(rows, terms, top=TOP, min_score=MIN_SCORE, block_rows=BLOCK_ROWS):
+    """Top neighbours of each row with batched matrix products."""
+    import numpy
+
+    count = len(rows)
+    lengths = numpy.fromiter((len(row) for row in rows), dtype=numpy.int64, count=count)
+    indptr = numpy.zeros(count + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=indptr[1:])
+    indices = numpy.fromiter((term for row in rows for term, _ in row), dtype=numpy.int64,
+                             count=int(indptr[-1]))
+    data = numpy.fromiter((weight for row in rows for _, weight in row), dtype=numpy.float64,
+                          count=int(indptr[-1]))
+    try:
+        from scipy.sparse import csr_matrix
+        matrix = csr_matrix((data, indices, indptr), shape=(count, terms))
+    except ImportError:
+        matrix = numpy.zeros((count, terms), dtype=numpy.float64)
+        matrix[numpy.repeat(numpy.arange(count), lengths), indices] = data
+    transposed = matrix.T
+
+    result = []
+    keep = min(top, count - 1)
+    for start in range(0, count, block_rows):
+        end = min(start + block_rows, count)
+        scores = matrix[start:end] @ transposed
+        scores = scores.toarray() if hasattr(scores, "toarray") else numpy.asarray(scores)
+        # A document is not its own neighbour
+        scores[numpy.arange(end - start), numpy.arange(start, end)] = -1.0
+        if keep <= 0:
+            result.extend([] for _ in range(end - start))
+            continue
+        best = numpy.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        # Ties at the cut are broken by document order, as in neighbours_python()
+        for offset, candidates in enumerate(best):
+            row = scores[offset]
+            cutoff = max(row[candidates].min(), min_score) - 1e-6
+            tied = numpy.flatnonzero(row >= cutoff)
+            result.append(_ranked(((float(row[other]), int(other)) for other in tied), top, min_score))
+    return result
+
+
+def related(documents, top=TOP, min_score=MIN_SCORE):
+    """Map each document's path to the paths of its most similar documents."""
+    terms, rows = tfidf_rows(documents)
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        lists = neighbours_python(rows, top, min_score)
+    else:
+        lists = neighbours_numpy(rows, terms, top, min_score)
+    paths = [path for path, _ in documents]
+    return {path: [paths[number] for number in numbers] for path, numbers in zip(paths, lists)}
+
+
+def _plain(value):
+    """A front matter value as JSON can hold it; dates become ISO strings."""
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def entry(root, path, fields, config):
+    """What single.html passes to archive-single.html for the document at `path`.
+
+    Card fields set by the `defaults:` of _config.yml, like `read_time` for
+    posts, are filled in where the front matter does not set them.
+    """
+    collection = path.split("/", 1)[0]
+    defaults = front_matter_defaults(config, path, collection)
+    fields = dict({key: value for key, value in defaults.items() if key in CARD_FIELDS}, **fields)
+    url = document_url(root, collection, os.path.join(root, path), fields, config)
+    result = {key: _plain(value) for key, value in fields.items()
+              if key not in ("permalink", "slug", "category", "categories")}
+    result.update({"path": path, "url": url, "id": url, "collection": collection[1:]})
+    when = post_date(path, fields)
+    if when is not None:
+        result["date"] = when.strftime("%Y-%m-%d %H:%M:%S")
+    return result
+
+
+def write_related(root=REPO_ROOT, output=None, cache=None, top=TOP):
+    """Rebuild _data/related.json; returns True if it changed."""
+    output = output or os.path.join(root, DEFAULT_OUTPUT)
+    cache = cache or TermCache(os.path.join(root, DEFAULT_CACHE_FILE))
+    config_file = os.path.join(root, "_config.yml")
+    config = {}
+    if os.path.exists(config_file):
+        with open(config_file, "r", encoding="utf-8") as f:
+            config = yaml_loader.load(f.read()) or {}
+    cards = {}
+    with instrumentation.phase("terms"):
+        documents = collect(root, cache, cards=cards)
+    with instrumentation.phase("neighbours"):
+        lists = related(documents, top)
+    with instrumentation.phase("write"):
+        entries = {path: entry(root, path, fields, config) for path, fields in cards.items()}
+        changed = write_json({path: [entries[other] for other in others]
+                              for path, others in lists.items()}, output)
+    cache.save()
+    instrumentation.record({"documents": len(documents), "term_cache_hits": cache.hits,
+                            "documents_tokenized": cache.misses})
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute content-based related posts')
+    parser.add_argument('--root', '-r', default=REPO_ROOT, help='Repository root')
+    parser.add_argument('--output', '-o', help=f'Output JSON file (default: ROOT/{DEFAULT_OUTPUT})')
+    parser.add_argument('--top', '-k', type=int, default=TOP, help='Neighbours per document')
+    args = parser.parse_args()
+
+    instrumentation.start("related_posts")
+    cache = TermCache(os.path.join(args.root, DEFAULT_CACHE_FILE))
+    changed = write_related(args.root, args.output, cache, args.top)
+    output = args.output or os.path.join(args.root, DEFAULT_OUTPUT)
+    print(f"{output} {'updated' if changed else 'is already up to date'} "
+          f"({cache.hits} documents unchanged, {cache.misses} tokenized)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Sharded client-side search index for the site collections
+
+Builds an inverted index over the titles, excerpts and bodies of _posts,
+_publications, _talks, _teaching and _portfolio, split into small static files
+under assets/search/ so that the search page (_pages/search.html, with
+assets/js/search.js) only downloads what a query needs:
+
+  manifest.json       document count, tokenizer settings and the shard list
+  terms/<prefix>.json terms starting with the prefix: {"term": "<postings>", ...}
+  docs/<n>.json       documents n * DOCS_PER_SHARD onwards:
+                      [path, url, title, collection, date, snippet] or null
+
+Terms are sharded by their first letter, and a shard larger than SHARD_BYTES
+is split by the next letter, up to MAX_PREFIX_LENGTH letters, so a small site
+has a few dozen shards and a large one keeps each shard small. A term lives in
+the shard with the longest prefix of it. Its postings are its (document id,
+weight) pairs sorted by id, delta encoded, and written as unsigned
+variable-length integers in base64 digits: five bits per character, with a
+sixth bit marking that more follow. Most gaps and weights fit in one character.
+
+Documents keep their ids from one build to the next (they are read back from
+the existing docs shards), so adding or editing a post only changes the term
+shards of the words it contains and one docs shard. Front matter comes from
+the shared front matter index and the body terms from a per-file cache in
+.build-cache/, so only new or changed files are read and tokenized, and shard
+files are only rewritten when their content changes.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import instrumentation
+import yaml_loader
+from archive_index import POST_NAME, document_url
+from frontmatter_index import COLLECTIONS, DEFAULT_INDEX_FILE, FrontMatterIndex
+from related_posts import TermCache, strip_markup
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join("assets", "search")
+DEFAULT_CACHE_FILE = os.path.join(".build-cache", "search-terms.pickle")
+
+# Bump when tokenization or the file format changes
+FORMAT_VERSION = 1
+
+# Term shards are split by one more letter while they are larger than this
+SHARD_BYTES = 8192
+MAX_PREFIX_LENGTH = 3
+DOCS_PER_SHARD = 128
+# Occurrences in the title, and in the excerpt or tags, count this many times
+TITLE_WEIGHT = 5
+EXCERPT_WEIGHT = 3
+SNIPPET_WORDS = 30
+
+# Shared with search.js through the manifest, so queries are tokenized the same way
+STOP_WORDS = sorted("""
+a an and are as at be but by for from has have in is it its of on or that the this to was
+were will with
+""".split())
+
+_STOP_WORDS = frozenset(STOP_WORDS)
+# Combining accents, the range search.js strips after NFKD normalization
+_accents = re.compile("[\u0300-\u036f]")
+_word = re.compile(r"[a-z0-9]+")
+
+_BASE64 = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+
+def tokenize(text):
+    """Lowercase ASCII words of two or more characters, without stop words.
+
+    Accents are stripped ("Sao Paulo" for "São Paulo"); words in other scripts
+    are dropped.
+    """
+    text = _accents.sub("", unicodedata.normalize("NFKD", text.lower()))
+    return [word for word in _word.findall(text) if len(word) > 1 and word not in _STOP_WORDS]
+
+
+def _text(value):
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return str(value) if value is not None else ""
+
+
+def analyze(front_matter, body):
+    """What the term cache keeps per file: weighted term counts and a snippet."""
+    body = strip_markup(body)
+    counts = Counter(tokenize(body))
+    for word in tokenize(_text(front_matter.get("title"))):
+        counts[word] += TITLE_WEIGHT
+    for field in ("excerpt", "tags", "venue"):
+        for word in tokenize(_text(front_matter.get(field))):
+            counts[word] += EXCERPT_WEIGHT
+    excerpt = front_matter.get("excerpt")
+    words = (_text(excerpt) if excerpt else re.sub(r"[#*_>`|\[\]]", " ", body)).split()
+    snippet = " ".join(words[:SNIPPET_WORDS]) + (" ..." if len(words) > SNIPPET_WORDS else "")
+    return {term: round(10 * (1 + math.log(count))) for term, count in counts.items()}, snippet
+
+
+def encode_numbers(numbers):
+    """Unsigned variable-length integers in base64 digits, five bits per digit."""
+    out = []
+    for number in numbers:
+        while True:
+            digit = number & 31
+            number >>= 5
+            if number:
+                out.append(_BASE64[digit | 32])
+            else:
+                out.append(_BASE64[digit])
+                break
+    return "".join(out)
+
+
+def decode_numbers(text):
+    """Inverse of encode_numbers()."""
+    numbers = []
+    number = shift = 0
+    for char in text:
+        digit = _BASE64.index(char)
+        number |= (digit & 31) << shift
+        if digit & 32:
+            shift += 5
+        else:
+            numbers.append(number)
+            number = shift = 0
+    return numbers
+
+
+def encode_postings(postings):
+    """Delta-encode (document id, weight) pairs sorted by id."""
+    numbers = []
+    previous = 0
+    for document, weight in postings:
+        numbers.append(document - previous)
+        numbers.append(weight)
+        previous = document
+    return encode_numbers(numbers)
+
+
+def decode_postings(text):
+    """Inverse of encode_postings()."""
+    numbers = decode_numbers(text)
+    postings = []
+    document = 0
+    for position in range(0, len(numbers), 2):
+        document += numbers[position]
+        postings.append((document, numbers[position + 1]))
+    return postings
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def previous_ids(output):
+    """Map each document path to its id in the existing index."""
+    ids = {}
+    directory = os.path.join(output, "docs")
+    if not os.path.isdir(directory):
+        return ids
+    for name in os.listdir(directory):
+        stem = name[:-len(".json")]
+        if not name.endswith(".json") or not stem.isdigit():
+            continue
+        entries = _read_json(os.path.join(directory, name)) or []
+        for offset, entry in enumerate(entries):
+            if entry:
+                ids[entry[0]] = int(stem) * DOCS_PER_SHARD + offset
+    return ids
+
+
+def assign_ids(paths, previous):
+    """Keep the ids of known paths; give new paths the lowest free ids."""
+    ids = {path: previous[path] for path in paths if path in previous}
+    taken = set(ids.values())
+    free = (number for number in range(len(paths) + len(taken) + 1) if number not in taken)
+    for path in paths:
+        if path not in ids:
+            ids[path] = next(free)
+    return ids
+
+
+def _write_if_changed(path, text):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, sort_keys=True) + "\n"
+
+
+def collect(root, index, cache, config):
+    """Return {path: (document entry, term weights)} for every published document."""
+    index.scan([os.path.join(root, name) for name in COLLECTIONS])
+    documents = {}
+    seen = []
+    for collection in COLLECTIONS:
+        for path, front_matter in index.collection(os.path.join(root, collection)):
+            seen.append(path)
+            if not isinstance(front_matter, dict) or front_matter.get("published") is False:
+                continue
+            if collection == "_posts" and not POST_NAME.match(os.path.basename(path)):
+                continue
+            terms, snippet = cache.terms(path)
+            relative = os.path.relpath(path, root).replace(os.sep, "/")
+            date = front_matter.get("date")
+            date = date.isoformat()[:10] if hasattr(date, "isoformat") else str(date or "")
+            documents[relative] = ([relative, document_url(root, collection, path, front_matter, config),
+                                    _text(front_matter.get("title")), collection[1:],
+                                    date, snippet], terms)
+    cache.prune(seen)
+    return documents
+
+
+def _split(prefix, terms, shards):
+    """Add `terms` to `shards` under `prefix`, or under longer prefixes if
+    they do not fit in SHARD_BYTES."""
+    size = sum(len(term) + len(postings) + 6 for term, postings in terms.items())
+    if size <= SHARD_BYTES or len(prefix) >= MAX_PREFIX_LENGTH:
+        shards[prefix] = terms
+        return
+    groups = {}
+    for term, postings in terms.items():
+        groups.setdefault(term[:len(prefix) + 1], {})[term] = postings
+    for longer, group in groups.items():
+        if longer == prefix:
+            # The term that is the prefix itself cannot be split further
+            shards[prefix] = group
+        else:
+            _split(longer, group, shards)
+
+
+def build_shards(documents, ids):
+    """Return ({prefix: {term: postings}}, {shard number: entries})."""
+    postings = {}
+    for path, (_, terms) in documents.items():
+        for term, weight in terms.items():
+            postings.setdefault(term, []).append((ids[path], weight))
+    by_letter = {}
+    for term, pairs in postings.items():
+        pairs.sort()
+        by_letter.setdefault(term[0], {})[term] = encode_postings(pairs)
+    term_shards = {}
+    for letter, terms in by_letter.items():
+        _split(letter, terms, term_shards)
+
+    doc_shards = {}
+    for path, (entry, _) in documents.items():
+        shard, offset = divmod(ids[path], DOCS_PER_SHARD)
+        entries = doc_shards.setdefault(shard, [])
+        entries.extend([None] * (offset + 1 - len(entries)))
+        entries[offset] = entry
+    return term_shards, doc_shards
+
+
+def _sync(directory, files, counts):
+    """Write {name: text} under `directory` and remove any other .json file."""
+    for name, text in files.items():
+        counts["written" if _write_if_changed(os.path.join(directory, name), text) else "unchanged"] += 1
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name not in files:
+                os.remove(os.path.join(directory, name))
+                counts["removed"] += 1
+
+
+def write_search_index(root=REPO_ROOT, output=None, index=None, cache=None):
+    """Rebuild the search index under `output`; returns counts of shard files
+    written, unchanged and removed."""
+    output = output or os.path.join(root, DEFAULT_OUTPUT)
+    config_file = os.path.join(root, "_config.yml")
+    config = {}
+    if os.path.exists(config_file):
+        with open(config_file, "r", encoding="utf-8") as f:
+            config = yaml_loader.load(f.read()) or {}
+    index = index or FrontMatterIndex(os.path.join(root, DEFAULT_INDEX_FILE))
+    cache = cache or TermCache(os.path.join(root, DEFAULT_CACHE_FILE), analyze, FORMAT_VERSION)
+
+    with instrumentation.phase("scan"):
+        documents = collect(root, index, cache, config)
+    with instrumentation.phase("shard"):
+        ids = assign_ids(sorted(documents), previous_ids(output))
+        term_shards, doc_shards = build_shards(documents, ids)
+    counts = {"written": 0, "unchanged": 0, "removed": 0}
+    with instrumentation.phase("write"):
+        _sync(os.path.join(output, "terms"),
+              {f"{prefix}.json": _dumps(terms) for prefix, terms in term_shards.items()}, counts)
+        _sync(os.path.join(output, "docs"),
+              {f"{shard}.json": _dumps(entries) for shard, entries in doc_shards.items()}, counts)
+        manifest = {
+            "version": FORMAT_VERSION,
+            "documents": len(documents),
+            "docsPerShard": DOCS_PER_SHARD,
+            "stopWords": STOP_WORDS,
+            "shards": sorted(term_shards),
+        }
+        # Written last, so it never lists shards that are not there yet
+        _write_if_changed(os.path.join(output, "manifest.json"), _dumps(manifest))
+
+    index.prune()
+    index.save()
+    cache.save()
+    instrumentation.record({"documents": len(documents), "terms": sum(len(terms) for terms in term_shards.values()),
+                            "shards_written": counts["written"], "documents_tokenized": cache.misses})
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the sharded client-side search index')
+    parser.add_argument('--root', '-r', default=REPO_ROOT, help='Repository root')
+    parser.add_argument('--output', '-o', help=f'Output directory (default: ROOT/{DEFAULT_OUTPUT})')
+    args = parser.parse_args()
+
+    instrumentation.start("search_index")
+    cache = TermCache(os.path.join(args.root, DEFAULT_CACHE_FILE), analyze, FORMAT_VERSION)
+    counts = write_search_index(args.root, args.output, cache=cache)
+    print(f"Search index: {counts['written']} shards written, {counts['unchanged']} unchanged, "
+          f"{counts['removed']} removed ({cache.hits} files unchanged, {cache.misses} tokenized)")
+
+
+if __name__ == '__main__':
+    main()
@@ -24,6 +24,13 @@ if [ ! -f "$CV_MARKDOWN" ]; then
   exit 1
 fi
 
+# With --watch, keep the CV JSON file up to date as the inputs change
+if [ "$1" == "--watch" ]; then
+  echo "Watching for changes to the CV sources..."
+  python3 "$PYTHON_SCRIPT" --input "$CV_MARKDOWN" --output "$CV_JSON" --config "$CONFIG_FILE" --watch
+  exit $?
+fi
+
 # Run the Python script to convert markdown to JSON
 echo "Converting markdown CV to JSON..."
 python3 "$PYTHON_SCRIPT" --input "$CV_MARKDOWN" --output "$CV_JSON" --config "$CONFIG_FILE"
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+YAML loading layer for the site data scripts
+
+Uses libyaml's CSafeLoader when PyYAML was built with it, falling back to the
+pure-Python SafeLoader otherwise (or when CV_YAML_PURE=1 is set, for
+comparison). PyYAML itself is only imported on the first load. Together with
+the front matter index for collection files and load_file_cached() for
+_config.yml, this means runs where nothing changed never import it. Time
+spent reading files and parsing YAML is accumulated in `stats`.
+"""
+
+import os
+import pickle
+import time
+
+# Accumulated timings in seconds, and the number of documents parsed
+stats = {"io": 0.0, "yaml": 0.0, "documents": 0}
+
+_loader = None
+
+
+def loader():
+    """Return the fastest available safe loader class, importing PyYAML on first use."""
+    global _loader
+    if _loader is None:
+        import yaml
+        if os.environ.get("CV_YAML_PURE") == "1":
+            _loader = yaml.SafeLoader
+        else:
+            _loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return _loader
+
+
+def load(text):
+    """Parse a YAML document with the safe loader."""
+    import yaml
+    start = time.perf_counter()
+    data = yaml.load(text, Loader=loader())
+    stats["yaml"] += time.perf_counter() - start
+    stats["documents"] += 1
+    return data
+
+
+def read_text(path):
+    """Read a whole text file, counting the time as I/O."""
+    start = time.perf_counter()
+    with open(path, 'r', encoding='utf-8') as file:
+        text = file.read()
+    stats["io"] += time.perf_counter() - start
+    return text
+
+
+def load_file(path):
+    """Read and parse a YAML file."""
+    return load(read_text(path))
+
+
+def load_file_cached(path, cache_file):
+    """Read and parse a YAML file, reusing the result stored in `cache_file`
+    while the file's path, mtime and size are unchanged."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    try:
+        with open(cache_file, 'rb') as file:
+            cached = pickle.load(file)
+        if cached.get('key') == key:
+            return cached['data']
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError):
+        pass
+    data = load_file(path)
+    directory = os.path.dirname(cache_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = cache_file + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        pickle.dump({'key': key, 'data': data}, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_file)
+    return data
+
+
+def report():
+    """Return a one-line summary of the accumulated timings."""
+    name = _loader.__name__ if _loader is not None else "not loaded"
+    return (f"YAML ({name}): {stats['documents']} documents in {stats['yaml'] * 1000:.1f} ms, "
+            f"file I/O: {stats['io'] * 1000:.1f} ms")
@@ -2,55 +2,116 @@
 #
 # Run this from the _talks/ directory, which contains .md files of all your
 # talks. This scrapes the location YAML field from each .md file, geolocates it
-# with geopy/Nominatim, and uses the getorg library to output data, HTML, and
-# Javascript for a standalone cluster map. This is functionally the same as the
-# #talkmap Jupyter notebook.
+# with geopy/Nominatim, and writes the data, HTML, and Javascript for a
+# standalone cluster map. The #talkmap Jupyter notebook does the same with the
+# getorg library, but clusters the markers in the browser on every page load.
+#
+# Geocoder results are cached in talkmap/.geocode-cache.jsonl, so rebuilding the
+# map without changing any talk locations makes no calls to Nominatim. If a
+# GeoNames-style place-name file is present at talkmap/gazetteer.tsv (or at
+# $TALKMAP_GAZETTEER), uncached locations are resolved offline from it first;
+# see scripts/gazetteer.py. Only the remaining unique locations are geocoded
+# with Nominatim, concurrently, limited to RATE requests per second, and
+# timeouts are retried with backoff rather than dropped.
+#
+# Markers are clustered here, once per zoom level, and written as small JSON
+# tiles under talkmap/clusters/ that map.html fetches as the map is panned and
+# zoomed; see scripts/mapclusters.py. Tiles are only rewritten when the geocoded
+# talks change.
+#
+# Set SITE_TIMINGS=1, SITE_TRACE or SITE_PROFILE to time or profile the run; see
+# scripts/instrumentation.py.
 import frontmatter
 import glob
-import getorg
+import os
+import sys
 from geopy import Nominatim
 from geopy.exc import GeocoderTimedOut
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from gazetteer import Gazetteer
+from geocoding import GeocodeCache, geocode_all
+import instrumentation
+from mapclusters import write_address_points, write_clusters, write_map_page
+
+instrumentation.start("talkmap")
+
 # Set the default timeout, in seconds
 TIMEOUT = 5
 
+# Nominatim's usage policy allows at most one request per second
+RATE = float(os.environ.get("TALKMAP_RATE", "1"))
+WORKERS = int(os.environ.get("TALKMAP_WORKERS", "4"))
+RETRIES = 3
+
 # Collect the Markdown files
 g = glob.glob("_talks/*.md")
 
 # Prepare to geolocate
-geocoder = Nominatim(user_agent="academicpages.github.io")
+geocoder = GeocodeCache(Nominatim(user_agent="academicpages.github.io"))
+with instrumentation.phase("gazetteer"):
+    gazetteer = Gazetteer.open()
+if gazetteer is None:
+    print("No gazetteer at talkmap/gazetteer.tsv; every uncached location goes to Nominatim")
 location_dict = {}
-location = ""
-permalink = ""
-title = ""
-
-# Perform geolocation
-for file in g:
-    # Read the file
-    data = frontmatter.load(file)
-    data = data.to_dict()
-
-    # Press on if the location is not present
-    if 'location' not in data:
-        continue
-
-    # Prepare the description
-    title = data['title'].strip()
-    venue = data['venue'].strip()
-    location = data['location'].strip()
-    description = f"{title}<br />{venue}; {location}"
-
-    # Geocode the location and report the status
-    try:
-        location_dict[description] = geocoder.geocode(location, timeout=TIMEOUT)
-        print(description, location_dict[description])
-    except ValueError as ex:
-        print(f"Error: geocode failed on input {location} with message {ex}")
-    except GeocoderTimedOut as ex:
-        print(f"Error: geocode timed out on input {location} with message {ex}")
-    except Exception as ex:
-        print(f"An unhandled exception occurred while processing input {location} with message {ex}")
+talks = []
+
+# Collect the talk locations
+with instrumentation.phase("collect"):
+    for file in g:
+        # Read the file
+        data = frontmatter.load(file)
+        data = data.to_dict()
+
+        # Press on if the location is not present
+        if 'location' not in data:
+            continue
+
+        # Prepare the description
+        title = data['title'].strip()
+        venue = data['venue'].strip()
+        location = data['location'].strip()
+        description = f"{title}<br />{venue}; {location}"
+        talks.append((description, location))
+instrumentation.count("talks", len(talks))
+
+# Perform geolocation, once per unique location
+with instrumentation.phase("geocode"):
+    results = geocode_all(geocoder, [location for _, location in talks], rate=RATE,
+                          workers=WORKERS, timeout=TIMEOUT, retries=RETRIES,
+                          retry_on=(GeocoderTimedOut,), local=gazetteer)
+
+# Report the status of each talk
+for description, location in talks:
+    result, error, latency = results[location]
+    if error is None:
+        location_dict[description] = result
+        print(description, result, f"({latency:.2f}s)")
+    elif isinstance(error, ValueError):
+        print(f"Error: geocode failed on input {location} with message {error}")
+    elif isinstance(error, GeocoderTimedOut):
+        print(f"Error: geocode timed out on input {location} after {RETRIES} retries with message {error}")
+    else:
+        print(f"An unhandled exception occurred while processing input {location} with message {error}")
+
+# Persist the geocoder results for the next run
+geocoder.save()
+offline = gazetteer.hits if gazetteer is not None else 0
+print(f"Geocode cache: {geocoder.hits} hits, {offline} resolved offline, {geocoder.misses} lookups")
+instrumentation.record({"geocode_cache_hits": geocoder.hits, "gazetteer_hits": offline,
+                        "geocoder_calls": geocoder.misses,
+                        "geocode_errors": sum(1 for _, location in talks if results[location][1] is not None)})
 
 # Save the map
-m = getorg.orgmap.create_map_obj()
-getorg.orgmap.output_html_cluster_map(location_dict, folder_name="talkmap", hashed_usernames=False)
+points = [(description, location.latitude, location.longitude)
+          for description, location in location_dict.items() if location is not None]
+with instrumentation.phase("map"):
+    write_address_points(points)
+    write_map_page()
+    tiles = write_clusters(points)
+if tiles is None:
+    print("Map clusters unchanged")
+else:
+    print(f"Map clusters: {tiles['written']} tiles written, {tiles['unchanged']} unchanged, "
+          f"{tiles['removed']} removed")
+    instrumentation.record({"tiles_" + name: count for name, count in tiles.items()})
@@ -0,0 +1,14 @@
+"""
+Shared setup for the tests: the scripts and generators import their sibling
+modules by name, as they do when run from their own directories.
+"""
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for directory in ("scripts", "markdown_generator"):
+    path = os.path.join(REPO_ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
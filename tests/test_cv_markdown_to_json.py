@@ -0,0 +1,16 @@
+"""Tests for scripts/cv_markdown_to_json.py."""
+
+import cv_markdown_to_json as cv
+
+
+def test_trailing_bare_bullet_is_not_an_entry():
+    sections = cv.tokenize_cv("Work experience\n======\n* Engineer, Acme, 2015 - 2016\n* \n")
+    assert cv.parse_work_experience(sections["Work experience"]) == [{
+        "company": "Acme", "position": "Engineer", "website": "", "startDate": "2015",
+        "endDate": "2016", "summary": "", "highlights": [],
+    }]
+
+
+def test_trailing_bare_bullet_in_raw_section_text():
+    assert cv.parse_education("* \n") == []
+    assert len(cv.parse_work_experience("* Engineer, Acme\n  * Shipped it\n* \n\n")) == 1
@@ -0,0 +1,99 @@
+"""Tests for scripts/cv_watch.py, driven by the polling backend."""
+
+import json
+import os
+import shutil
+
+import pytest
+
+import cv_markdown_to_json as cv
+from conftest import REPO_ROOT
+from cv_watch import CVWatcher, PollingBackend
+from frontmatter_index import FrontMatterIndex
+
+
+def write_document(path, mtime, body="", **fields):
+    front_matter = "".join(f"{key}: {json.dumps(value)}\n" for key, value in fields.items())
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"---\n{front_matter}---\n{body}")
+    # Explicit mtimes, so every edit is seen however coarse the file system clock is
+    os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.fixture
+def site(tmp_path):
+    for directory in ("_pages", "_talks", "_publications", "_data"):
+        os.makedirs(tmp_path / directory)
+    shutil.copy(os.path.join(REPO_ROOT, "_pages", "cv.md"), tmp_path / "_pages" / "cv.md")
+    shutil.copy(os.path.join(REPO_ROOT, "_config.yml"), tmp_path / "_config.yml")
+    write_document(tmp_path / "_talks" / "a.md", 10**18, title="Talk A", venue="Conf A")
+    write_document(tmp_path / "_talks" / "b.md", 10**18, title="Talk B", venue="Conf B")
+    write_document(tmp_path / "_publications" / "p.md", 10**18, title="Paper", venue="Journal")
+    return tmp_path
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Names of the CV and config parsers called, in order."""
+    calls = []
+    for name in ("parse_markdown_cv", "parse_config"):
+        original = getattr(cv, name)
+        monkeypatch.setattr(cv, name, lambda path, original=original, name=name:
+                            calls.append(name) or original(path))
+    return calls
+
+
+def make_watcher(site):
+    watcher = CVWatcher(site / "_pages" / "cv.md", site / "_config.yml", str(site),
+                        str(site / "_data" / "cv.json"), index=FrontMatterIndex())
+    return watcher, PollingBackend(watcher.files, watcher.directories)
+
+
+def test_collection_edit_reparses_only_that_file_and_section(site, parsed):
+    watcher, backend = make_watcher(site)
+    assert watcher.write() is True
+    parsed.clear()
+    publications = watcher.cv_json["publications"]
+    misses = watcher.index.misses
+
+    talk = site / "_talks" / "a.md"
+    write_document(talk, 2 * 10**18, title="Talk A, revised", venue="Conf A")
+    changed = backend.poll()
+    assert changed == {str(talk)}
+    assert watcher.apply(changed) == ["presentations"]
+
+    assert watcher.index.misses == misses + 1
+    assert parsed == []
+    assert watcher.cv_json["publications"] is publications
+    assert [entry["name"] for entry in watcher.cv_json["presentations"]] == ["Talk A, revised", "Talk B"]
+    assert watcher.write() is True
+    with open(site / "_data" / "cv.json", encoding="utf-8") as f:
+        assert json.load(f)["presentations"][0]["name"] == "Talk A, revised"
+
+
+def test_output_is_rewritten_only_when_it_changes(site, parsed):
+    watcher, backend = make_watcher(site)
+    output = site / "_data" / "cv.json"
+    assert watcher.write() is True
+    os.utime(output, ns=(10**18, 10**18))
+
+    # A body edit changes the file but none of the fields the CV uses
+    write_document(site / "_talks" / "b.md", 2 * 10**18, body="More notes.\n", title="Talk B", venue="Conf B")
+    assert watcher.apply(backend.poll()) == ["presentations"]
+    assert watcher.write() is False
+    assert os.stat(output).st_mtime_ns == 10**18
+
+
+def test_markdown_cv_and_deleted_files(site, parsed):
+    watcher, backend = make_watcher(site)
+    watcher.write()
+    parsed.clear()
+    misses = watcher.index.misses
+
+    os.utime(site / "_pages" / "cv.md", ns=(2 * 10**18, 2 * 10**18))
+    os.remove(site / "_publications" / "p.md")
+    assert sorted(watcher.apply(backend.poll())) == ["publications", "work/education/skills"]
+    assert parsed == ["parse_markdown_cv"]
+    assert watcher.index.misses == misses
+    assert watcher.cv_json["publications"] == []
+    assert backend.poll() == set()
@@ -0,0 +1,118 @@
+"""Tests for scripts/gazetteer.py, on a small GeoNames-style file."""
+
+import math
+import os
+
+import pytest
+
+from gazetteer import Gazetteer
+
+# name, alternate names, latitude, longitude, country, admin1, population
+PLACES = [
+    ("London", "Londres", 51.50853, -0.12574, "GB", "ENG", 8961989),
+    ("London", "", 42.98339, -81.23304, "CA", "08", 346765),
+    ("Berkeley", "", 37.87159, -122.27275, "US", "CA", 120972),
+    ("San Francisco", "SF", 37.77493, -122.41942, "US", "CA", 864816),
+    ("Paris", "Paname", 48.85341, 2.3488, "FR", "11", 2138551),
+    ("Paris", "", 33.66094, -95.55551, "US", "TX", 24782),
+    ("São Paulo", "Sao Paulo", -23.5475, -46.63611, "BR", "27", 10021295),
+    ("Berlin", "", 52.52437, 13.41053, "DE", "16", 3426354),
+    ("Dover", "", 39.15817, -75.52437, "US", "DE", 38079),
+]
+
+
+def write_places(path, places):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# geonameid\tname\tasciiname\n")
+        for number, (name, alternates, latitude, longitude, country, admin1, population) in enumerate(places):
+            f.write("\t".join([
+                str(number), name, name, alternates, str(latitude), str(longitude), "P", "PPL",
+                country, "", admin1, "", "", "", str(population), "", "0", "UTC", "2024-01-01",
+            ]) + "\n")
+
+
+@pytest.fixture
+def paths(tmp_path):
+    source = str(tmp_path / "gazetteer.tsv")
+    write_places(source, PLACES)
+    return source, str(tmp_path / "gazetteer.idx")
+
+
+@pytest.fixture
+def gazetteer(paths):
+    gazetteer = Gazetteer.open(*paths)
+    yield gazetteer
+    gazetteer.close()
+
+
+def label(result):
+    return result.address if result is not None else None
+
+
+@pytest.mark.parametrize("location, expected", [
+    ("Berkeley, CA, USA", "Berkeley, CA, US"),
+    ("Berkeley CA, USA", "Berkeley, CA, US"),
+    ("UC Berkeley, Department of Testing, Berkeley, California", "Berkeley, CA, US"),
+    ("Paris", "Paris, FR"),
+    ("Paris, France", "Paris, FR"),
+    ("Paris, TX", "Paris, TX, US"),
+    ("Paname", "Paris, FR"),
+    ("sao paulo, Brazil", "São Paulo, BR"),
+    ("Berlin, DE", "Berlin, DE"),
+    ("Dover, DE", "Dover, DE, US"),
+    ("London, ON, Canada", "London, CA"),
+    ("London, UK", "London, GB"),
+])
+def test_exact_names_with_qualifiers(gazetteer, location, expected):
+    assert label(gazetteer.geocode(location)) == expected
+
+
+@pytest.mark.parametrize("location, expected", [
+    ("Berkley, California", "Berkeley, CA, US"),
+    ("San Francisc, CA", "San Francisco, CA, US"),
+    ("Sao Paolo, Brazil", "São Paulo, BR"),
+])
+def test_misspelled_and_prefix_names(gazetteer, location, expected):
+    assert label(gazetteer.geocode(location)) == expected
+    assert gazetteer.fuzzy_hits > 0
+
+
+@pytest.mark.parametrize("location", ["London, ON", "Paris, Île-de-France", "Atlantis", "Pa"])
+def test_unknown_names_and_qualifiers_are_left_to_the_online_geocoder(gazetteer, location):
+    assert gazetteer.geocode(location) is None
+
+
+def test_coordinates_resolve_to_the_nearest_place(gazetteer):
+    result = gazetteer.geocode("37.80, -122.30")
+    assert (result.address, result.latitude, result.longitude) == ("Berkeley, CA, US", 37.80, -122.30)
+
+
+def test_nearest_matches_a_linear_scan(gazetteer):
+    def distance(place, latitude, longitude):
+        lat1, lon1, lat2, lon2 = map(math.radians, (place[2], place[3], latitude, longitude))
+        return math.acos(min(1.0, math.sin(lat1) * math.sin(lat2)
+                             + math.cos(lat1) * math.cos(lat2) * math.cos(lon1 - lon2)))
+
+    for latitude, longitude in [(0, 0), (45, -100), (-30, -50), (50, 10), (38, -122.3), (89, 179)]:
+        expected = min(PLACES, key=lambda place: distance(place, latitude, longitude))
+        name, country, *_ = gazetteer.place(gazetteer.nearest(latitude, longitude))
+        assert (name, country) == (expected[0], expected[4])
+
+
+def test_index_is_reused_until_the_source_changes(paths):
+    source, index_file = paths
+    assert Gazetteer.open(source + ".missing", index_file) is None
+
+    Gazetteer.open(source, index_file).close()
+    built = os.stat(index_file).st_mtime_ns
+    reopened = Gazetteer.open(source, index_file)
+    assert os.stat(index_file).st_mtime_ns == built
+    assert reopened.geocode("Springfield, IL") is None
+    reopened.close()
+
+    write_places(source, PLACES + [("Springfield", "", 39.80172, -89.64371, "US", "IL", 114394)])
+    os.utime(source, ns=(built + 10**9, built + 10**9))
+    rebuilt = Gazetteer.open(source, index_file)
+    assert len(rebuilt) == len(PLACES) + 1
+    assert label(rebuilt.geocode("Springfield, IL")) == "Springfield, IL, US"
+    rebuilt.close()
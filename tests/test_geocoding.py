@@ -0,0 +1,129 @@
+"""Tests for scripts/geocoding.py, with a local fake in place of Nominatim."""
+
+import threading
+
+import pytest
+
+from geocoding import CachedLocation, GeocodeCache, TokenBucket, geocode_all
+
+
+class FakeGeocoder:
+    """Answers from a dict of query -> (latitude, longitude), or None, and
+    raises TimeoutError for the first `timeouts[query]` calls of a query."""
+
+    def __init__(self, places, timeouts=None):
+        self.places = places
+        self.timeouts = dict(timeouts or {})
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def geocode(self, query, timeout=None):
+        with self.lock:
+            self.calls.append(query)
+            if self.timeouts.get(query, 0) > 0:
+                self.timeouts[query] -= 1
+                raise TimeoutError(query)
+        coordinates = self.places.get(query)
+        return CachedLocation(query, *coordinates) if coordinates else None
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / "geocode-cache.jsonl")
+
+
+def test_cache_hit_and_miss(cache_file):
+    geocoder = FakeGeocoder({"Austin, TX": (30.27, -97.74)})
+    clock = FakeClock()
+    with GeocodeCache(geocoder, cache_file, clock=clock) as cache:
+        assert cache.geocode("Austin, TX").latitude == 30.27
+        # Same key after normalization
+        assert cache.geocode("  austin ,TX. ").longitude == -97.74
+        assert (cache.misses, cache.hits) == (1, 1)
+    assert geocoder.calls == ["Austin, TX"]
+
+    reloaded = GeocodeCache(geocoder, cache_file, clock=clock)
+    assert reloaded.geocode("Austin, TX") == CachedLocation("Austin, TX", 30.27, -97.74)
+    assert geocoder.calls == ["Austin, TX"]
+
+
+def test_negative_entries_expire_after_their_ttl(cache_file):
+    geocoder = FakeGeocoder({"Austin, TX": (30.27, -97.74)})
+    clock = FakeClock()
+    cache = GeocodeCache(geocoder, cache_file, ttl=100, negative_ttl=10, clock=clock)
+    assert cache.geocode("Nowhere") is None
+    cache.geocode("Austin, TX")
+
+    clock.now += 5
+    assert cache.geocode("Nowhere") is None
+    assert geocoder.calls == ["Nowhere", "Austin, TX"]
+
+    clock.now += 10
+    assert cache.geocode("Nowhere") is None
+    cache.geocode("Austin, TX")
+    assert geocoder.calls == ["Nowhere", "Austin, TX", "Nowhere"]
+
+
+def test_timeouts_are_retried_with_backoff(cache_file):
+    geocoder = FakeGeocoder({"Austin, TX": (30.27, -97.74)}, timeouts={"Austin, TX": 2, "Paris": 5})
+    sleeps = []
+    cache = GeocodeCache(geocoder, cache_file, clock=FakeClock())
+    results = geocode_all(cache, ["Austin, TX", "Paris"], rate=0, workers=1, retries=3,
+                          backoff=0.5, sleep=sleeps.append)
+
+    result, error, _ = results["Austin, TX"]
+    assert error is None and result.latitude == 30.27
+    result, error, _ = results["Paris"]
+    assert result is None and isinstance(error, TimeoutError)
+    assert geocoder.calls.count("Austin, TX") == 3
+    assert geocoder.calls.count("Paris") == 4
+    assert sorted(sleeps) == sorted([0.5, 1.0] + [0.5, 1.0, 2.0])
+    # Failures are not cached, so the next run tries again
+    assert cache.lookup("Paris") == (False, None)
+
+
+def test_one_backend_call_per_unique_location(cache_file):
+    geocoder = FakeGeocoder({"Austin, TX": (30.27, -97.74), "Paris, France": (48.86, 2.35)})
+    cache = GeocodeCache(geocoder, cache_file, clock=FakeClock())
+    locations = ["Austin, TX", "austin,  tx", "Paris, France", "Austin, TX", "PARIS, FRANCE "]
+    results = geocode_all(cache, locations, rate=0, workers=4)
+
+    assert sorted(geocoder.calls) == ["Austin, TX", "Paris, France"]
+    assert set(results) == set(locations)
+    assert results["austin,  tx"][0].latitude == 30.27
+    assert results["PARIS, FRANCE "][0].longitude == 2.35
+
+    again = geocode_all(cache, locations, rate=0, workers=4)
+    assert len(geocoder.calls) == 2
+    assert all(latency == 0.0 for _, _, latency in again.values())
+
+
+def test_local_tier_answers_before_the_backend(cache_file):
+    local = FakeGeocoder({"Austin, TX": (30.27, -97.74)})
+    geocoder = FakeGeocoder({"Paris, France": (48.86, 2.35)})
+    cache = GeocodeCache(geocoder, cache_file, clock=FakeClock())
+    results = geocode_all(cache, ["Austin, TX", "Paris, France"], rate=0, local=local)
+
+    assert results["Austin, TX"][0].latitude == 30.27
+    assert geocoder.calls == ["Paris, France"]
+
+
+def test_token_bucket_paces_requests():
+    clock = FakeClock(0.0)
+    bucket = TokenBucket(rate=2, burst=1, clock=clock, sleep=clock.sleep)
+    times = []
+    for _ in range(5):
+        bucket.acquire()
+        times.append(clock.now)
+    assert times == pytest.approx([0.0, 0.5, 1.0, 1.5, 2.0])
@@ -0,0 +1,75 @@
+"""Tests for markdown_generator/permalinks.py, across the site collections."""
+
+import os
+
+import pytest
+
+from incremental import IncrementalWriter
+from permalinks import PermalinkCollision, PermalinkIndex
+
+
+def page(permalink, title="Page"):
+    return f"---\ntitle: \"{title}\"\ncollection: talks\npermalink: {permalink}\n---\nBody.\n"
+
+
+def write_page(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def site(tmp_path):
+    for directory in ("_talks", "_teaching", "_portfolio", "_publications"):
+        os.makedirs(tmp_path / directory)
+    write_page(tmp_path / "_teaching" / "course.md", page("/talks/2024-01-01-keynote"))
+    # No permalink: Jekyll serves it at /portfolio/project/
+    write_page(tmp_path / "_portfolio" / "project.md", "---\ntitle: \"Project\"\n---\n")
+    write_page(tmp_path / "_talks" / "2023-05-01-hand-written.md", page("/talks/2023-05-01-hand-written"))
+    return tmp_path
+
+
+def test_collisions_across_collections_are_renamed_in_input_order(site):
+    index = PermalinkIndex(str(site), str(site / "_talks"))
+
+    # Same permalink as a teaching page, compared case-insensitively
+    assert index.claim("2024-01-01-keynote.md", page("/Talks/2024-01-01-Keynote/")) == (
+        "2024-01-01-keynote-2.md", page("/Talks/2024-01-01-Keynote-2/"))
+    # A second page of the same name in this run takes the next suffix
+    assert index.claim("2024-01-01-keynote.md", page("/talks/2024-01-01-keynote")) == (
+        "2024-01-01-keynote-3.md", page("/talks/2024-01-01-keynote-3"))
+    # The default permalink of a portfolio page without one
+    assert index.claim("project.md", page("/portfolio/project/"))[1] == page("/portfolio/project-2/")
+    # A hand-written file in the output folder holds its file name
+    assert index.claim("2023-05-01-hand-written.md", page("/talks/other"))[0] == "2023-05-01-hand-written-2.md"
+    assert index.claim("2024-02-02-free.md", page("/talks/2024-02-02-free")) == (
+        "2024-02-02-free.md", page("/talks/2024-02-02-free"))
+    assert index.renamed == 4
+
+
+def test_owned_and_adoptable_files_do_not_collide_with_their_replacement(site):
+    write_page(site / "_talks" / "2024-03-03-old.md", page("/talks/2024-03-03-old"))
+    index = PermalinkIndex(str(site), str(site / "_talks"), owned=["2024-03-03-old.md"],
+                           adoptable=["2023-05-01-hand-written.md"])
+    assert index.claim("2024-03-03-old.md", page("/talks/2024-03-03-old"))[0] == "2024-03-03-old.md"
+    assert index.claim("2023-05-01-hand-written.md", page("/talks/2023-05-01-hand-written"))[0] == (
+        "2023-05-01-hand-written.md")
+    assert index.renamed == 0
+
+
+def test_fail_mode_stops_before_any_file_is_written(site):
+    before = sorted(os.listdir(site / "_talks"))
+    with pytest.raises(PermalinkCollision, match="_teaching/course.md"):
+        with IncrementalWriter(str(site / "_talks"), "talks", collisions="fail", io_workers=1) as writer:
+            writer.write("2024-02-02-free.md", page("/talks/2024-02-02-free"))
+            writer.write("2024-01-01-keynote.md", page("/talks/2024-01-01-keynote"))
+    assert sorted(os.listdir(site / "_talks")) == before
+
+
+def test_rename_mode_writes_every_page(site):
+    with IncrementalWriter(str(site / "_talks"), "talks", collisions="rename", io_workers=1) as writer:
+        writer.write("2024-01-01-keynote.md", page("/talks/2024-01-01-keynote", "First"))
+        writer.write("2024-01-01-keynote.md", page("/talks/2024-01-01-keynote", "Second"))
+    with open(site / "_talks" / "2024-01-01-keynote-3.md", encoding="utf-8") as f:
+        assert f.read() == page("/talks/2024-01-01-keynote-3", "Second")
+    assert os.path.exists(site / "_talks" / "2024-01-01-keynote-2.md")
+    assert not os.path.exists(site / "_talks" / "2024-01-01-keynote.md")
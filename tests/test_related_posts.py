@@ -0,0 +1,32 @@
+"""Tests for scripts/related_posts.py."""
+
+import datetime
+
+import related_posts
+
+
+def test_entry_has_what_archive_single_shows():
+    fields = related_posts.card({"title": "Chatbot", "date": datetime.date(2025, 4, 17), "tags": ["nlp"],
+                                 "categories": ["ml"]}, "First paragraph.\n\nSecond <b>one</b>.")
+    entry = related_posts.entry("/site", "_posts/2025-04-17-chatbot.md", fields,
+                                {"permalink": "/:categories/:title/"})
+    assert entry == {"title": "Chatbot", "excerpt": "First paragraph.", "date": "2025-04-17 00:00:00",
+                     "words": 5, "path": "_posts/2025-04-17-chatbot.md", "url": "/ml/chatbot/",
+                     "id": "/ml/chatbot/", "collection": "posts"}
+
+
+def test_entry_takes_card_fields_from_config_defaults():
+    config = {"defaults": [
+        {"scope": {"path": "", "type": "posts"}, "values": {"layout": "single", "read_time": True}},
+        {"scope": {"path": "_posts/drafts"}, "values": {"read_time": False}},
+        {"scope": {"path": "", "type": "portfolio"}, "values": {"share": True}},
+    ]}
+    fields = related_posts.card({"title": "Post"}, "Body.")
+    post = related_posts.entry("/site", "_posts/2025-04-17-post.md", fields, config)
+    assert post["read_time"] is True and "layout" not in post
+    draft = related_posts.entry("/site", "_posts/drafts/2025-04-17-post.md", fields, config)
+    assert draft["read_time"] is False
+    portfolio = related_posts.entry("/site", "_portfolio/project.md", fields, config)
+    assert "read_time" not in portfolio
+    explicit = related_posts.card({"title": "Post", "read_time": False}, "Body.")
+    assert related_posts.entry("/site", "_posts/2025-04-17-post.md", explicit, config)["read_time"] is False
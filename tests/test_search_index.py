@@ -0,0 +1,22 @@
+"""Tests for scripts/search_index.py."""
+
+import search_index
+
+
+def test_split_keeps_shards_under_limit():
+    terms = {f"c{letter}{n}": "A" * 100 for letter in "ab" for n in range(60)}
+    shards = {}
+    search_index._split("c", terms, shards)
+    assert sorted(shards) == ["ca", "cb"]
+    assert sum(len(shard) for shard in shards.values()) == len(terms)
+
+
+def test_split_stores_term_equal_to_prefix_in_its_own_shard():
+    shards = {}
+    search_index._split("c", {"ca": "A" * 9000, "cab": "B"}, shards)
+    assert shards == {"ca": {"ca": "A" * 9000}, "cab": {"cab": "B"}}
+
+
+def test_postings_round_trip():
+    postings = [(0, 10), (3, 1), (40, 250), (10000, 17)]
+    assert search_index.decode_postings(search_index.encode_postings(postings)) == postings
@@ -0,0 +1,97 @@
+"""Tests for markdown_generator/templates.py: the layouts still render the
+pages the original talks.py and publications.py loops wrote."""
+
+import os
+
+import pytest
+
+from conftest import REPO_ROOT
+from ingest import publication_record, talk_record
+from templates import render
+from tsvstream import read_rows
+
+GENERATORS = os.path.join(REPO_ROOT, "markdown_generator")
+
+
+def baseline_html_escape(text):
+    return "".join({"&": "&amp;", '"': "&quot;", "'": "&apos;"}.get(c, c) for c in text)
+
+
+def baseline_talk(item):
+    """The page the original talks.py wrote for one row."""
+    html_filename = str(item["date"]) + "-" + item["url_slug"]
+    md = "---\ntitle: \"" + item["title"] + '"\n'
+    md += "collection: talks" + "\n"
+    if len(str(item["type"])) > 3:
+        md += 'type: "' + item["type"] + '"\n'
+    else:
+        md += 'type: "Talk"\n'
+    md += "permalink: /talks/" + html_filename + "\n"
+    if len(str(item["venue"])) > 3:
+        md += 'venue: "' + item["venue"] + '"\n'
+    if len(str(item["date"])) > 3:
+        md += "date: " + str(item["date"]) + "\n"
+    if len(str(item["location"])) > 3:
+        md += 'location: "' + str(item["location"]) + '"\n'
+    md += "---\n"
+    if len(str(item["talk_url"])) > 3:
+        md += "\n[More information here](" + item["talk_url"] + ")\n"
+    if len(str(item["description"])) > 3:
+        md += "\n" + baseline_html_escape(item["description"]) + "\n"
+    return html_filename + ".md", md
+
+
+def baseline_publication(item):
+    """The page the original publications.py wrote for one row."""
+    html_filename = str(item["pub_date"]) + "-" + item["url_slug"]
+    md = "---\ntitle: \"" + item["title"] + '"\n'
+    md += """collection: manuscripts"""
+    md += """\npermalink: /publication/""" + html_filename
+    if len(str(item["excerpt"])) > 5:
+        md += "\nexcerpt: '" + baseline_html_escape(item["excerpt"]) + "'"
+    md += "\ndate: " + str(item["pub_date"])
+    md += "\nvenue: '" + baseline_html_escape(item["venue"]) + "'"
+    if len(str(item["paper_url"])) > 5:
+        md += "\npaperurl: '" + item["paper_url"] + "'"
+    md += "\ncitation: '" + baseline_html_escape(item["citation"]) + "'"
+    md += "\n---"
+    if len(str(item["paper_url"])) > 5:
+        md += "\n\n<a href='" + item["paper_url"] + "'>Download paper here</a>\n"
+    if len(str(item["excerpt"])) > 5:
+        md += "\n" + baseline_html_escape(item["excerpt"]) + "\n"
+    md += "\nRecommended citation: " + item["citation"]
+    return html_filename + ".md", md
+
+
+TALK_ROWS = list(read_rows(os.path.join(GENERATORS, "talks.tsv"))) + [
+    {"title": "Sparse", "type": "", "url_slug": "sparse", "venue": "", "date": "2020-01-01",
+     "location": "", "talk_url": "", "description": ""},
+    {"title": "Short fields", "type": "Lab", "url_slug": "short", "venue": "ACM", "date": "2020-01-02",
+     "location": "NYC", "talk_url": "x", "description": "Q&A with \"Bob\" & Alice's team"},
+]
+
+PUBLICATION_ROWS = list(read_rows(os.path.join(GENERATORS, "publications.tsv"))) + [
+    {"pub_date": "2020-01-01", "title": "Sparse", "venue": "Journal of {Braces} & Co", "excerpt": "short",
+     "citation": "Doe, J. (2020). \"Sparse.\" <i>Journal</i>.", "url_slug": "sparse", "paper_url": "http:"},
+]
+
+
+@pytest.mark.parametrize("row", TALK_ROWS, ids=lambda row: row["url_slug"])
+def test_talk_layout_matches_the_original_generator(row):
+    assert render(talk_record(row), "talk") == baseline_talk(row)
+
+
+@pytest.mark.parametrize("row", PUBLICATION_ROWS, ids=lambda row: row["url_slug"])
+def test_manuscript_layout_matches_the_original_generator(row):
+    assert render(publication_record(row), "manuscript") == baseline_publication(row)
+
+
+def test_constants_and_the_otherwise_branch():
+    record = publication_record(PUBLICATION_ROWS[-1])
+    assert render(record, "publication", collection="papers", permalink="/papers/") == (
+        "2020-01-01-sparse.md",
+        '---\ntitle: "Sparse"\ncollection: papers\npermalink: /papers/2020-01-01-sparse'
+        "\ndate: 2020-01-01\nvenue: 'Journal of {Braces} &amp; Co'"
+        "\ncitation: 'Doe, J. (2020). &quot;Sparse.&quot; <i>Journal</i>.'\n---"
+        "\nUse [Google Scholar](https://scholar.google.com/scholar?q=Sparse)"
+        '{:target="_blank"} for full citation')
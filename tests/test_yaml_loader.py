@@ -0,0 +1,23 @@
+"""Tests for scripts/yaml_loader.py."""
+
+import os
+
+import yaml_loader
+
+
+def test_load_file_cached_reparses_only_changed_files(tmp_path, monkeypatch):
+    config = tmp_path / "_config.yml"
+    cache_file = str(tmp_path / ".build-cache" / "config.pickle")
+    config.write_text("title: Site\n", encoding="utf-8")
+    os.utime(config, ns=(10**18, 10**18))
+    assert yaml_loader.load_file_cached(str(config), cache_file) == {"title": "Site"}
+
+    def fail(text):
+        raise AssertionError("parsed again")
+    monkeypatch.setattr(yaml_loader, "load", fail)
+    assert yaml_loader.load_file_cached(str(config), cache_file) == {"title": "Site"}
+
+    monkeypatch.undo()
+    config.write_text("title: Renamed\n", encoding="utf-8")
+    os.utime(config, ns=(2 * 10**18, 2 * 10**18))
+    assert yaml_loader.load_file_cached(str(config), cache_file) == {"title": "Renamed"}